@@ -4,7 +4,8 @@ from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from database import Database
 from solana_handler import SolanaHandler
-import csv
+import asyncio
+from csv_export import GzipCsvSpool, EXPORT_CHUNK_ROWS, export_filename
 from datetime import datetime
 
 class AdminCommands:
@@ -71,51 +72,53 @@ class AdminCommands:
         if not self.is_admin(update.effective_user.id):
             return
         
-        # Get all users from database
-        import sqlite3
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT u.telegram_id, u.username, u.wallet_address, u.registration_date, 
-                   u.tokens_claimed, u.referral_count,
-                   t.transaction_hash, t.token_amount, t.status
-            FROM users u
-            LEFT JOIN transactions t ON u.telegram_id = t.telegram_id
-        ''')
-        
-        users = cursor.fetchall()
-        conn.close()
-        
-        if not users:
-            await update.message.reply_text("📝 No users found.")
-            return
+        export_file, row_count = await asyncio.get_running_loop().run_in_executor(None, self._export_users_csv)
         
-        # Create CSV file
-        filename = f"mochidrop_users_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        filepath = os.path.join(os.getcwd(), filename)
-        
-        with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
-                'Telegram ID', 'Username', 'Wallet Address', 'Registration Date',
-                'Tokens Claimed', 'Referral Count', 'Transaction Hash', 
-                'Token Amount', 'Status'
-            ])
+        try:
+            if not row_count:
+                await update.message.reply_text("📝 No users found.")
+                return
             
-            for user in users:
-                writer.writerow(user)
-        
-        # Send file to admin
-        with open(filepath, 'rb') as file:
+            # Send compressed CSV to admin
             await update.message.reply_document(
-                document=file,
-                filename=filename,
-                caption=f"📊 **User Export Complete**\n\nTotal Users: {len(users)}"
+                document=export_file,
+                filename=export_filename('mochidrop_users'),
+                caption=f"📊 **User Export Complete**\n\nTotal Rows: {row_count}"
             )
-        
-        # Clean up file
-        os.remove(filepath)
+        finally:
+            export_file.close()
+    
+    def _export_users_csv(self):
+        """Stream the users/transactions join into a gzip CSV spool (runs in an executor)"""
+        import sqlite3
+        conn = sqlite3.connect(self.db.db_path)
+        spool = GzipCsvSpool([
+            'Telegram ID', 'Username', 'Wallet Address', 'Registration Date',
+            'Tokens Claimed', 'Referral Count', 'Transaction Hash', 
+            'Token Amount', 'Status'
+        ])
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.telegram_id, u.username, u.wallet_address, u.registration_date, 
+                       u.tokens_claimed, u.referral_count,
+                       t.transaction_hash, t.token_amount, t.status
+                FROM users u
+                LEFT JOIN transactions t ON u.telegram_id = t.telegram_id
+            ''')
+            
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                spool.write_rows(rows)
+            
+            return spool.finish(), spool.rows
+        except BaseException:
+            spool.close()
+            raise
+        finally:
+            conn.close()
     
     async def set_tokens_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /set_tokens command - Set tokens per user"""
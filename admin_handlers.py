@@ -1,10 +1,14 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from auth_middleware import require_admin, require_authenticated_admin, AdminAuth
-from database_new import db
+from database_new import db, DatabaseBusyError
 from solana_handler_simple import SolanaHandler
+from solana_wallet_manager import solana_wallet_manager
+from allowlist import load_allowlist_file, format_report
+import os
 import logging
 import re
+import tempfile
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -21,6 +25,15 @@ WAITING_FOR_MAX_CLAIMS = 8
 WAITING_FOR_PRIVATE_KEY = 9
 WAITING_FOR_WALLET_NAME = 10
 
+# Bot API limit for file downloads
+TELEGRAM_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+ALLOWLIST_SPOOL_MAX_MEMORY = int(os.getenv('ALLOWLIST_SPOOL_MAX_MEMORY', str(8 * 1024 * 1024)))
+
+# /slowqueries output limits (Telegram messages are capped at 4096 characters)
+SLOW_QUERY_METHOD_ROWS = 15
+SLOW_QUERY_SQL_CHARS = 1000
+SLOW_QUERY_PLAN_CHARS = 2500
+
 class AdminHandlers:
     """Handlers for admin commands"""
     
@@ -49,6 +62,8 @@ class AdminHandlers:
                 except:
                     pass  # Ignore if can't delete
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in admin login: {e}")
             await update.message.reply_text("❌ Login error. Please try again.")
@@ -64,11 +79,11 @@ class AdminHandlers:
         try:
             user = context.user_data.get('user_info', {})
             
-            # Get admin statistics
-            total_users = len(await db.pool.fetch("SELECT id FROM users WHERE role = 'receiver'"))
-            total_airdrops = len(await db.pool.fetch("SELECT id FROM airdrops"))
-            active_airdrops = len(await db.pool.fetch("SELECT id FROM airdrops WHERE status = 'active'"))
-            total_claims = len(await db.pool.fetch("SELECT id FROM claims"))
+            # Get admin statistics (shared, cached snapshot)
+            stats = await db.get_stats_snapshot()
+            if not stats:
+                await update.message.reply_text("❌ Error loading dashboard.")
+                return
             
             keyboard = [
                 [
@@ -89,16 +104,18 @@ class AdminHandlers:
                 f"🔧 **Admin Dashboard**\n\n"
                 f"👋 **Welcome, {user.get('first_name', 'Admin')}!**\n\n"
                 f"📊 **Quick Stats:**\n"
-                f"• **Users:** {total_users}\n"
-                f"• **Total Airdrops:** {total_airdrops}\n"
-                f"• **Active Airdrops:** {active_airdrops}\n"
-                f"• **Total Claims:** {total_claims}\n\n"
+                f"• **Users:** {stats['total_users']}\n"
+                f"• **Total Airdrops:** {stats['total_airdrops']}\n"
+                f"• **Active Airdrops:** {stats['active_airdrops']}\n"
+                f"• **Total Claims:** {stats['total_claims']}\n\n"
                 f"🛠️ **Admin Tools:**\n"
                 f"Select an option below to manage your airdrops and users.",
                 reply_markup=reply_markup,
                 parse_mode='Markdown'
             )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in admin dashboard: {e}")
             await update.message.reply_text("❌ Error loading dashboard.")
@@ -120,6 +137,8 @@ class AdminHandlers:
             
             return WAITING_FOR_AIRDROP_NAME
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error starting airdrop creation: {e}")
             await update.message.reply_text("❌ Error starting airdrop creation.")
@@ -148,6 +167,8 @@ class AdminHandlers:
             
             return WAITING_FOR_AIRDROP_DESCRIPTION
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving airdrop name: {e}")
             return WAITING_FOR_AIRDROP_NAME
@@ -178,6 +199,8 @@ class AdminHandlers:
             
             return WAITING_FOR_TOKEN_MINT
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving airdrop description: {e}")
             return WAITING_FOR_AIRDROP_DESCRIPTION
@@ -188,7 +211,7 @@ class AdminHandlers:
             token_mint = update.message.text.strip()
             
             # Validate mint address format (basic validation)
-            if not self.solana_handler.validate_wallet_address(token_mint):
+            if not await self.solana_handler.validate_wallet_address(token_mint):
                 await update.message.reply_text(
                     "❌ **Invalid Mint Address**\n\n"
                     "Please provide a valid Solana token mint address.\n"
@@ -208,6 +231,8 @@ class AdminHandlers:
             
             return WAITING_FOR_TOKEN_SYMBOL
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving token mint: {e}")
             return WAITING_FOR_TOKEN_MINT
@@ -237,6 +262,8 @@ class AdminHandlers:
             
             return WAITING_FOR_TOTAL_AMOUNT
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving token symbol: {e}")
             return WAITING_FOR_TOKEN_SYMBOL
@@ -270,6 +297,8 @@ class AdminHandlers:
             
             return WAITING_FOR_AMOUNT_PER_CLAIM
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving total amount: {e}")
             return WAITING_FOR_TOTAL_AMOUNT
@@ -309,6 +338,8 @@ class AdminHandlers:
             
             return WAITING_FOR_MAX_CLAIMS
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving amount per claim: {e}")
             return WAITING_FOR_AMOUNT_PER_CLAIM
@@ -333,13 +364,17 @@ class AdminHandlers:
                     )
                     return WAITING_FOR_MAX_CLAIMS
             
-            # Get admin wallet (for now, use a placeholder)
-            admin_wallet = "AdminWalletPlaceholder123456789"  # TODO: Get from admin's connected wallets
-            
             # Create airdrop in database
             airdrop_data = context.user_data['creating_airdrop']
             telegram_id = update.effective_user.id
             
+            # Fund from the admin's first connected wallet with a valid address (can be set later)
+            admin_wallet = None
+            for wallet in await db.get_admin_wallets(telegram_id):
+                if await self.solana_handler.validate_wallet_address(wallet['wallet_address']):
+                    admin_wallet = wallet['wallet_address']
+                    break
+            
             airdrop_id = await db.create_airdrop(
                 name=airdrop_data['name'],
                 description=airdrop_data['description'],
@@ -391,6 +426,8 @@ class AdminHandlers:
                 )
                 return ConversationHandler.END
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving max claims: {e}")
             await update.message.reply_text("❌ Error creating airdrop.")
@@ -414,6 +451,8 @@ class AdminHandlers:
             
             return WAITING_FOR_WALLET_NAME
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in wallet connect: {e}")
             await update.message.reply_text("❌ Error starting wallet connection.")
@@ -447,6 +486,8 @@ class AdminHandlers:
             
             return WAITING_FOR_PRIVATE_KEY
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving wallet name: {e}")
             return WAITING_FOR_WALLET_NAME
@@ -462,8 +503,9 @@ class AdminHandlers:
             except:
                 pass
             
-            # Basic validation of private key format
-            if len(private_key) < 32 or len(private_key) > 88:
+            # Derive the wallet address from the private key (validates its format)
+            wallet_address = solana_wallet_manager.address_from_private_key(private_key)
+            if not wallet_address:
                 await update.effective_chat.send_message(
                     "❌ **Invalid Private Key Format**\n\n"
                     "Please check your private key and try again.\n"
@@ -471,9 +513,6 @@ class AdminHandlers:
                 )
                 return ConversationHandler.END
             
-            # Generate wallet address from private key (simulated)
-            wallet_address = f"Generated_Address_From_Key_{len(private_key)}"  # TODO: Implement actual key derivation
-            
             # Store encrypted wallet
             telegram_id = update.effective_user.id
             wallet_name = context.user_data['connecting_wallet']['name']
@@ -504,6 +543,8 @@ class AdminHandlers:
             del context.user_data['connecting_wallet']
             return ConversationHandler.END
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving private key: {e}")
             await update.effective_chat.send_message("❌ Error processing wallet connection.")
@@ -513,31 +554,16 @@ class AdminHandlers:
     async def admin_stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /admin stats command"""
         try:
-            # Get comprehensive statistics
-            async with db.pool.acquire() as conn:
-                # User stats
-                total_users = await conn.fetchval("SELECT COUNT(*) FROM users WHERE role = 'receiver'")
-                users_with_wallets = await conn.fetchval("SELECT COUNT(*) FROM users WHERE wallet_address IS NOT NULL AND role = 'receiver'")
-                
-                # Airdrop stats
-                total_airdrops = await conn.fetchval("SELECT COUNT(*) FROM airdrops")
-                active_airdrops = await conn.fetchval("SELECT COUNT(*) FROM airdrops WHERE status = 'active'")
-                draft_airdrops = await conn.fetchval("SELECT COUNT(*) FROM airdrops WHERE status = 'draft'")
-                
-                # Claim stats
-                total_claims = await conn.fetchval("SELECT COUNT(*) FROM claims")
-                completed_claims = await conn.fetchval("SELECT COUNT(*) FROM claims WHERE status = 'completed'")
-                pending_claims = await conn.fetchval("SELECT COUNT(*) FROM claims WHERE status = 'pending'")
-                
-                # Recent activity (last 24 hours)
-                recent_users = await conn.fetchval("""
-                    SELECT COUNT(*) FROM users 
-                    WHERE created_at > NOW() - INTERVAL '24 hours' AND role = 'receiver'
-                """)
-                recent_claims = await conn.fetchval("""
-                    SELECT COUNT(*) FROM claims 
-                    WHERE claimed_at > NOW() - INTERVAL '24 hours'
-                """)
+            # Get comprehensive statistics (shared, cached snapshot)
+            stats = await db.get_stats_snapshot()
+            if not stats:
+                await update.message.reply_text("❌ Error loading statistics.")
+                return
+            
+            total_users = stats['total_users']
+            users_with_wallets = stats['users_with_wallets']
+            total_claims = stats['total_claims']
+            completed_claims = stats['completed_claims']
             
             # Calculate percentages
             wallet_percentage = (users_with_wallets / total_users * 100) if total_users > 0 else 0
@@ -548,27 +574,122 @@ class AdminHandlers:
                 f"👥 **Users:**\n"
                 f"• Total Users: {total_users:,}\n"
                 f"• With Wallets: {users_with_wallets:,} ({wallet_percentage:.1f}%)\n"
-                f"• New (24h): {recent_users:,}\n\n"
+                f"• New (24h): {stats['recent_users']:,}\n\n"
                 f"🎯 **Airdrops:**\n"
-                f"• Total Created: {total_airdrops:,}\n"
-                f"• Currently Active: {active_airdrops:,}\n"
-                f"• In Draft: {draft_airdrops:,}\n\n"
+                f"• Total Created: {stats['total_airdrops']:,}\n"
+                f"• Currently Active: {stats['active_airdrops']:,}\n"
+                f"• In Draft: {stats['draft_airdrops']:,}\n\n"
                 f"🎁 **Claims:**\n"
                 f"• Total Claims: {total_claims:,}\n"
                 f"• Completed: {completed_claims:,} ({claim_success_rate:.1f}%)\n"
-                f"• Pending: {pending_claims:,}\n"
-                f"• Recent (24h): {recent_claims:,}\n\n"
+                f"• Pending: {stats['pending_claims']:,}\n"
+                f"• Recent (24h): {stats['recent_claims']:,}\n\n"
                 f"📈 **Performance:**\n"
                 f"• Success Rate: {claim_success_rate:.1f}%\n"
                 f"• Wallet Adoption: {wallet_percentage:.1f}%\n\n"
-                f"🕒 **Last Updated:** {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}",
+                f"🕒 **Last Updated:** {stats['generated_at'].strftime('%Y-%m-%d %H:%M UTC')}",
                 parse_mode='Markdown'
             )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in admin stats: {e}")
             await update.message.reply_text("❌ Error loading statistics.")
     
+    async def receive_allowlist_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Receive an allowlist CSV after the admin picked "Upload Allowlist" on an airdrop"""
+        # Other documents (from anyone) are ignored
+        if not context.user_data.get('allowlist_airdrop_id'):
+            return
+        await self._load_allowlist_upload(update, context)
+    
+    @require_authenticated_admin
+    async def _load_allowlist_upload(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Download the uploaded allowlist and load it"""
+        try:
+            airdrop_id = context.user_data['allowlist_airdrop_id']
+            document = update.message.document
+            if document.file_size and document.file_size > TELEGRAM_DOWNLOAD_LIMIT:
+                await update.message.reply_text(
+                    "❌ **File Too Large**\n\n"
+                    "Bots can only download files up to 20 MB.\n"
+                    f"Compress it (`.csv.gz`) or run `python allowlist.py {airdrop_id} <file>` on the server.",
+                    parse_mode='Markdown'
+                )
+                return
+            
+            airdrop = await db.get_airdrop(airdrop_id)
+            if not airdrop:
+                context.user_data.pop('allowlist_airdrop_id', None)
+                await update.message.reply_text("❌ Airdrop not found.")
+                return
+            
+            await update.message.reply_text("⏳ Loading allowlist...")
+            
+            # Small files stay in memory; larger ones spill to a temp file
+            with tempfile.SpooledTemporaryFile(max_size=ALLOWLIST_SPOOL_MAX_MEMORY) as spool:
+                telegram_file = await document.get_file()
+                await telegram_file.download_to_memory(out=spool)
+                spool.seek(0)
+                size, reader = await load_allowlist_file(airdrop_id, spool, airdrop['token_decimals'])
+            
+            if size is not None:
+                context.user_data.pop('allowlist_airdrop_id', None)
+            
+            keyboard = [[InlineKeyboardButton("📊 View Airdrop", callback_data=f"view_airdrop_{airdrop_id}")]]
+            await update.message.reply_text(
+                f"🍡 **{airdrop['name']}**\n\n" + format_report(size, reader),
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown'
+            )
+        
+        except DatabaseBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error receiving allowlist file: {e}")
+            await update.message.reply_text("❌ Error loading allowlist. Please check the file and try again.")
+    
+    @require_authenticated_admin
+    async def admin_slowqueries_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /slowqueries [n] - method latencies and the last n slow queries with plans"""
+        try:
+            try:
+                limit = min(max(int(context.args[0]), 1), 10) if context.args else 3
+            except ValueError:
+                await update.message.reply_text("❌ Usage: `/slowqueries [count]`", parse_mode='Markdown')
+                return
+            
+            stats = db.get_query_stats()
+            rows = [
+                f"{name[:28]:<28} {method['calls']:>7} {method['p50_ms']:>6.0f} {method['p95_ms']:>6.0f} {method['max_ms']:>7.0f}"
+                for name, method in list(stats['methods'].items())[:SLOW_QUERY_METHOD_ROWS]
+            ]
+            table = '\n'.join([f"{'method':<28} {'calls':>7} {'p50':>6} {'p95':>6} {'max':>7}"] + rows)
+            
+            await update.message.reply_text(
+                f"🐢 **Query Latency** (ms, slowest p95 first)\n\n"
+                f"```\n{table}\n```\n"
+                f"🔎 **Slow Queries:** {stats['slow_total']:,} over {stats['threshold_ms']:.0f} ms since startup",
+                parse_mode='Markdown'
+            )
+            
+            for entry in stats['slow_queries'][:limit]:
+                plan = entry['plan'] or '(plan not captured)'
+                await update.message.reply_text(
+                    f"⏱️ **{entry['elapsed_ms']:,.0f} ms** at {entry['at'].strftime('%Y-%m-%d %H:%M:%S UTC')}\n"
+                    f"**Params:** {', '.join(entry['params']) or 'none'}\n\n"
+                    f"```\n{entry['sql'][:SLOW_QUERY_SQL_CHARS]}\n```\n"
+                    f"```\n{plan[:SLOW_QUERY_PLAN_CHARS]}\n```",
+                    parse_mode='Markdown'
+                )
+        
+        except DatabaseBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in slow queries command: {e}")
+            await update.message.reply_text("❌ Error loading query stats.")
+    
     async def cancel_admin_conversation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Cancel any ongoing admin conversation"""
         # Clear any sensitive data
@@ -0,0 +1,117 @@
+"""
+Active airdrop catalog for MochiDrop
+Keeps the active airdrops in memory and applies their start/end window on a timer
+"""
+
+import asyncio
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ActiveAirdropCatalog:
+    """In-memory catalog of active airdrops.
+
+    The loader returns every airdrop with status 'active' that hasn't ended yet,
+    including ones whose start_date is still in the future. The catalog keeps
+    the subset that is currently inside its date window and schedules a timer
+    for the next start_date/end_date boundary, so requests never re-run the
+    window filter against the database. Claim counts are merged in from the
+    counts loader, which is cached for a short TTL.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[List[Dict[str, Any]]]],
+                 counts_loader: Callable[[List[int]], Awaitable[Dict[int, int]]],
+                 ttl: float = 300.0, counts_ttl: float = 2.0):
+        self._loader = loader
+        self._counts_loader = counts_loader
+        self.ttl = ttl
+        self.counts_ttl = counts_ttl
+        self._airdrops: Optional[List[Dict[str, Any]]] = None
+        self._visible: List[Dict[str, Any]] = []
+        self._loaded_at = 0.0
+        self._counts: Dict[int, int] = {}
+        self._counts_loaded_at = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Drop the catalog so the next read reloads it"""
+        self._airdrops = None
+        self._counts_loaded_at = 0.0
+        self._cancel_timer()
+
+    async def get(self) -> List[Dict[str, Any]]:
+        """Return the airdrops currently inside their date window, newest first"""
+        if self._airdrops is None or time.monotonic() - self._loaded_at > self.ttl:
+            async with self._lock:
+                if self._airdrops is None or time.monotonic() - self._loaded_at > self.ttl:
+                    await self._reload()
+
+        visible = self._visible
+        counts = await self._live_counts(visible)
+        return [
+            dict(airdrop, current_claims=counts.get(airdrop['id'], airdrop['current_claims']))
+            for airdrop in visible
+        ]
+
+    async def _reload(self):
+        """Load the catalog from the database and re-apply the date window"""
+        self._airdrops = await self._loader()
+        self._loaded_at = time.monotonic()
+        self._counts_loaded_at = 0.0
+        self._apply_window()
+        logger.info(f"Airdrop catalog loaded: {len(self._airdrops)} active, {len(self._visible)} open")
+
+    async def _live_counts(self, airdrops: List[Dict[str, Any]]) -> Dict[int, int]:
+        """Return claim counts for the visible airdrops, refreshed at most every counts_ttl"""
+        if not airdrops:
+            return {}
+        if time.monotonic() - self._counts_loaded_at > self.counts_ttl:
+            try:
+                self._counts = await self._counts_loader([airdrop['id'] for airdrop in airdrops])
+                self._counts_loaded_at = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error loading live claim counts: {e}")
+        return self._counts
+
+    def _apply_window(self):
+        """Recompute the visible subset and schedule the next boundary"""
+        self._cancel_timer()
+        if self._airdrops is None:
+            return
+
+        now = datetime.utcnow()
+        visible = []
+        next_boundary = None
+
+        for airdrop in self._airdrops:
+            start_date = airdrop.get('start_date')
+            end_date = airdrop.get('end_date')
+
+            if end_date is not None and end_date < now:
+                continue
+
+            if start_date is not None and start_date > now:
+                boundary = start_date
+            else:
+                visible.append(airdrop)
+                # end_date is inclusive, so the airdrop closes just after it
+                boundary = end_date + timedelta(milliseconds=1) if end_date is not None else None
+
+            if boundary is not None and (next_boundary is None or boundary < next_boundary):
+                next_boundary = boundary
+
+        self._visible = visible
+
+        if next_boundary is not None:
+            delay = max((next_boundary - now).total_seconds(), 0.0)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._apply_window)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,163 @@
+"""
+Airdrop allowlists for MochiDrop
+Stream-parses allowlist CSVs and bulk-loads them with COPY
+
+The file has one wallet per line, optionally followed by a per-wallet amount in
+whole tokens ("address[,amount]"); a header line is skipped and gzip-compressed
+files are detected automatically. Lists too large for a Telegram upload can be
+loaded from the command line:
+
+    python allowlist.py <airdrop_id> <file> [--append]
+"""
+
+import io
+import os
+import csv
+import sys
+import gzip
+import asyncio
+import argparse
+import logging
+from decimal import Decimal, InvalidOperation
+from typing import AsyncIterator, BinaryIO, List, Optional, Tuple
+
+from database_new import db, encode_address
+
+logger = logging.getLogger(__name__)
+
+ALLOWLIST_BATCH_ROWS = int(os.getenv('ALLOWLIST_BATCH_ROWS', '5000'))
+MAX_REPORTED_ERRORS = 5
+
+GZIP_MAGIC = b'\x1f\x8b'
+HEADER_NAMES = ('wallet', 'wallet_address', 'address')
+
+
+class AllowlistReader:
+    """Reads an allowlist file in batches of validated (address bytes, amount) records.
+
+    Rows are decoded a batch at a time, so only one batch is held in memory.
+    Invalid rows are skipped and counted; the first few are kept (with their
+    line numbers) for the admin's report.
+    """
+
+    def __init__(self, fileobj: BinaryIO, token_decimals: int, batch_rows: int = ALLOWLIST_BATCH_ROWS):
+        if fileobj.read(2) == GZIP_MAGIC:
+            fileobj.seek(0)
+            fileobj = gzip.GzipFile(fileobj=fileobj, mode='rb')
+        else:
+            fileobj.seek(0)
+        self._rows = csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+        self.token_decimals = token_decimals
+        self.batch_rows = batch_rows
+        self.accepted = 0
+        self.rejected = 0
+        self.errors: List[str] = []
+
+    def _reject(self, line: int, message: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {message}")
+
+    def _parse_amount(self, value: str) -> Optional[int]:
+        if not value:
+            return None
+        amount = Decimal(value) * (10 ** self.token_decimals)
+        if amount <= 0 or amount != amount.to_integral_value():
+            raise InvalidOperation(value)
+        return int(amount)
+
+    def read_batch(self) -> List[Tuple[bytes, Optional[int]]]:
+        """Read and validate the next batch (blocking); empty when the file is done"""
+        batch = []
+        for row in self._rows:
+            line = self._rows.line_num
+            cells = [cell.strip() for cell in row]
+            if not cells or not cells[0]:
+                continue
+            if line == 1 and cells[0].lower() in HEADER_NAMES:
+                continue
+            try:
+                address = encode_address(cells[0])
+            except ValueError:
+                self._reject(line, f"invalid wallet address `{cells[0][:44]}`")
+                continue
+            try:
+                amount = self._parse_amount(cells[1] if len(cells) > 1 else '')
+            except InvalidOperation:
+                self._reject(line, f"invalid amount `{cells[1][:20]}`")
+                continue
+            batch.append((address, amount))
+            self.accepted += 1
+            if len(batch) >= self.batch_rows:
+                break
+        return batch
+
+    async def batches(self, first: List[Tuple[bytes, Optional[int]]]) -> AsyncIterator[List[Tuple[bytes, Optional[int]]]]:
+        """Yield batches, starting with one already read, parsing the rest in the executor"""
+        loop = asyncio.get_running_loop()
+        batch = first
+        while batch:
+            yield batch
+            batch = await loop.run_in_executor(None, self.read_batch)
+
+
+async def load_allowlist_file(airdrop_id: int, fileobj: BinaryIO, token_decimals: int,
+                              replace: bool = True) -> Tuple[Optional[int], AllowlistReader]:
+    """Parse an allowlist file and load it for an airdrop.
+
+    Returns (list size, reader); the size is None if the load failed. A file
+    with no valid rows is not loaded, so a bad upload can't lock everyone out.
+    """
+    loop = asyncio.get_running_loop()
+    reader = await loop.run_in_executor(None, AllowlistReader, fileobj, token_decimals)
+    first = await loop.run_in_executor(None, reader.read_batch)
+    if not first:
+        return None, reader
+    size = await db.load_allowlist(airdrop_id, reader.batches(first), replace=replace)
+    return size, reader
+
+
+def format_report(size: Optional[int], reader: AllowlistReader) -> str:
+    """Summarize an allowlist load for the admin"""
+    if size is None:
+        status = "❌ **Allowlist Not Loaded**" if reader.accepted else "❌ **No Valid Wallets Found**"
+    else:
+        status = f"✅ **Allowlist Loaded:** {size:,} wallets"
+    lines = [status, "", f"• Valid rows: {reader.accepted:,}", f"• Rejected rows: {reader.rejected:,}"]
+    if reader.errors:
+        lines += ["", "⚠️ **First problems:**"] + [f"• {error}" for error in reader.errors]
+    return '\n'.join(lines)
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Load an airdrop allowlist from a CSV file')
+    parser.add_argument('airdrop_id', type=int)
+    parser.add_argument('file', help='CSV of address[,amount] rows (may be gzip-compressed)')
+    parser.add_argument('--append', action='store_true', help='add to the existing list instead of replacing it')
+    args = parser.parse_args()
+
+    async def run() -> int:
+        await db.initialize()
+        try:
+            airdrop = await db.get_airdrop(args.airdrop_id)
+            if not airdrop:
+                print(f"Airdrop {args.airdrop_id} not found")
+                return 1
+            with open(args.file, 'rb') as fileobj:
+                size, reader = await load_allowlist_file(
+                    args.airdrop_id, fileobj, airdrop['token_decimals'], replace=not args.append
+                )
+            print(format_report(size, reader).replace('**', ''))
+            return 0 if size is not None else 1
+        finally:
+            await db.close()
+
+    return asyncio.run(run())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
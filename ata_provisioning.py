@@ -0,0 +1,176 @@
+"""
+Token account pre-provisioning for MochiDrop
+Creates recipients' associated token accounts in the background before an airdrop goes live
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import base58
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+
+from database_new import db
+from solana_wallet_manager import solana_wallet_manager
+from transaction_pipeline import TransactionPipeline
+from transfer_packing import TransferPacker, ata_creation
+
+logger = logging.getLogger(__name__)
+
+PROVISION_PAGE_SIZE = int(os.getenv('ATA_PROVISION_PAGE_SIZE', '1000'))
+PROVISION_TX_PER_SECOND = float(os.getenv('ATA_PROVISION_TX_PER_SECOND', '2'))
+PROVISION_MAX_IN_FLIGHT = int(os.getenv('ATA_PROVISION_MAX_IN_FLIGHT', '2'))
+
+# Rent-exempt balance of a token account (165 bytes), paid by the funding wallet per account created
+TOKEN_ACCOUNT_RENT_LAMPORTS = 2_039_280
+
+
+def estimate_rent_sol(accounts: int) -> float:
+    """SOL locked as rent if accounts token accounts are created"""
+    return accounts * TOKEN_ACCOUNT_RENT_LAMPORTS / 1_000_000_000
+
+
+class ProvisioningJob:
+    """Progress of one airdrop's pre-provisioning run"""
+
+    def __init__(self, airdrop_id: int, token_mint: str, allowlist_only: bool):
+        self.airdrop_id = airdrop_id
+        self.token_mint = token_mint
+        self.allowlist_only = allowlist_only
+        self.status = 'running'
+        self.scanned = 0
+        self.missing = 0
+        self.created = 0
+        self.failed = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.status == 'running'
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'airdrop_id': self.airdrop_id,
+            'status': self.status,
+            'source': 'allowlist' if self.allowlist_only else 'registered wallets',
+            'scanned': self.scanned,
+            'missing': self.missing,
+            'created': self.created,
+            'failed': self.failed,
+            'error': self.error,
+            'elapsed': round((self.finished_at or time.time()) - self.started_at)
+        }
+
+
+class AtaProvisioner:
+    """Runs one background pre-provisioning job per airdrop.
+
+    A job pages through the wallets that can claim the airdrop, finds the
+    ones without a token account for its mint with the shared AtaRegistry's
+    batched lookups, and creates those accounts with packed create-only
+    transactions paid by the airdrop's admin wallet. Creation goes through a
+    TransactionPipeline limited to tx_per_second and max_in_flight, so a
+    large drop doesn't flood the RPC node or crowd out live transfers.
+    Creates are idempotent, so a job may overlap claims or be rerun safely.
+    """
+
+    def __init__(self, page_size: int = PROVISION_PAGE_SIZE, tx_per_second: float = PROVISION_TX_PER_SECOND,
+                 max_in_flight: int = PROVISION_MAX_IN_FLIGHT):
+        self.page_size = page_size
+        self.tx_per_second = tx_per_second
+        self.max_in_flight = max_in_flight
+        self.jobs: Dict[int, ProvisioningJob] = {}
+
+    def start(self, airdrop: Dict[str, Any], payer_private_key: str) -> ProvisioningJob:
+        """Start provisioning for an airdrop, or return its job if one is already running"""
+        job = self.jobs.get(airdrop['id'])
+        if job and job.running:
+            return job
+        job = ProvisioningJob(airdrop['id'], airdrop['token_mint'], airdrop['allowlist_only'])
+        job.task = asyncio.create_task(self._run(job, payer_private_key))
+        self.jobs[job.airdrop_id] = job
+        return job
+
+    def get_job(self, airdrop_id: int) -> Optional[ProvisioningJob]:
+        return self.jobs.get(airdrop_id)
+
+    async def _run(self, job: ProvisioningJob, payer_private_key: str):
+        registry = solana_wallet_manager.ata_registry
+
+        async def record(packed, signature, error):
+            if signature:
+                job.created += 1
+            else:
+                job.failed += 1
+
+        try:
+            # Inside the try so a bad stored key or mint fails the job instead of the caller
+            try:
+                payer = Keypair.from_bytes(base58.b58decode(payer_private_key))
+            except Exception as e:
+                raise ValueError(f"Funding wallet key is not a valid Solana keypair ({e})")
+            mint = Pubkey.from_string(job.token_mint)
+            packer = TransferPacker(payer.pubkey())
+
+            logger.info(f"Provisioning token accounts for airdrop {job.airdrop_id}")
+            after = b''
+            while True:
+                page = await db.get_airdrop_recipient_page(
+                    job.airdrop_id, job.allowlist_only, after, self.page_size
+                )
+                if not page:
+                    break
+                after = page[-1]
+                job.scanned += len(page)
+
+                missing = await registry.find_missing([Pubkey.from_bytes(address) for address in page], mint)
+                if not missing:
+                    continue
+                job.missing += len(missing)
+
+                pipeline = TransactionPipeline(
+                    solana_wallet_manager.client, payer, packer, solana_wallet_manager.blockhashes,
+                    on_result=record, max_in_flight=self.max_in_flight,
+                    min_interval=1 / self.tx_per_second if self.tx_per_second else 0.0
+                )
+                results = await pipeline.run([
+                    ata_creation(payer.pubkey(), {'address': str(owner)}, mint) for owner in missing
+                ])
+                registry.mark_existing(
+                    ata for owner, ata in missing.items() if results.get(str(owner), "FAILED") != "FAILED"
+                )
+
+            job.status = 'completed'
+            logger.info(
+                f"Provisioned token accounts for airdrop {job.airdrop_id}: "
+                f"{job.scanned:,} scanned, {job.created:,} created, {job.failed:,} failed"
+            )
+        except asyncio.CancelledError:
+            job.status = 'cancelled'
+            raise
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            logger.error(f"Error provisioning token accounts for airdrop {job.airdrop_id}: {e}")
+        finally:
+            job.finished_at = time.time()
+
+    async def close(self):
+        """Cancel running jobs"""
+        for job in self.jobs.values():
+            if job.task and not job.task.done():
+                job.task.cancel()
+                try:
+                    await job.task
+                except asyncio.CancelledError:
+                    pass
+
+
+# Create global instance
+ata_provisioner = AtaProvisioner()
@@ -0,0 +1,118 @@
+"""
+Associated token account registry for MochiDrop
+Finds missing recipient token accounts with batched lookups and remembers the ones that exist
+"""
+
+import os
+import logging
+from typing import Any, Dict, Iterable
+
+from solders.pubkey import Pubkey
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Confirmed
+from solana.rpc.types import DataSliceOpts
+from spl.token.instructions import get_associated_token_address
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# getMultipleAccounts accepts at most this many addresses per call
+MULTIPLE_ACCOUNTS_BATCH = 100
+
+ATA_CACHE_SIZE = int(os.getenv('ATA_CACHE_SIZE', '200000'))
+ATA_CACHE_TTL = float(os.getenv('ATA_CACHE_TTL', '3600'))
+
+
+class AtaRegistry:
+    """Existence cache for associated token accounts on one RPC endpoint.
+
+    find_missing() derives each owner's ATA for a mint and looks up the ones
+    not already known to exist with getMultipleAccounts, 100 addresses per
+    call and no account data returned. Accounts found, or created by a
+    transaction that landed, are remembered for ttl seconds; the expiry
+    covers owners closing their accounts. A batch whose lookup fails counts
+    as missing: the create instruction callers add is idempotent, so that
+    only costs compute units.
+    """
+
+    def __init__(self, rpc_url: str, max_size: int = ATA_CACHE_SIZE, ttl: float = ATA_CACHE_TTL):
+        self.rpc_url = rpc_url
+        self.client = AsyncClient(rpc_url)
+        self._existing = TTLCache(max_size=max_size, ttl=ttl)
+        self.lookups = 0
+        self.lookup_failures = 0
+
+    async def find_missing(self, owners: Iterable[Pubkey], mint: Pubkey) -> Dict[Pubkey, Pubkey]:
+        """Return {owner: ata} for the owners with no token account for mint"""
+        unknown: Dict[Pubkey, Pubkey] = {}
+        for owner in owners:
+            ata = get_associated_token_address(owner, mint)
+            if not self._existing.get(ata):
+                unknown[ata] = owner
+
+        missing: Dict[Pubkey, Pubkey] = {}
+        atas = list(unknown)
+        for start in range(0, len(atas), MULTIPLE_ACCOUNTS_BATCH):
+            batch = atas[start:start + MULTIPLE_ACCOUNTS_BATCH]
+            self.lookups += 1
+            try:
+                response = await self.client.get_multiple_accounts(
+                    batch, commitment=Confirmed, encoding='base64',
+                    data_slice=DataSliceOpts(offset=0, length=0)
+                )
+                accounts = response.value
+            except Exception as e:
+                self.lookup_failures += 1
+                logger.warning(f"Error looking up {len(batch)} token accounts: {e}")
+                accounts = [None] * len(batch)
+            for ata, account in zip(batch, accounts):
+                if account is None:
+                    missing[unknown[ata]] = ata
+                else:
+                    self._existing.set(ata, True)
+        return missing
+
+    def mark_existing(self, atas: Iterable[Pubkey]):
+        """Remember accounts a landed transaction created (or transferred into)"""
+        for ata in atas:
+            self._existing.set(ata, True)
+
+    def forget(self, ata: Pubkey):
+        """Drop an account, e.g. after a transfer into it failed"""
+        self._existing.invalidate(ata)
+
+    async def close(self):
+        """Close the RPC client"""
+        try:
+            await self.client.close()
+        except Exception as e:
+            logger.error(f"Error closing token account registry client: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache and lookup counters"""
+        return {
+            'rpc_url': self.rpc_url,
+            'known_accounts': len(self._existing),
+            'lookups': self.lookups,
+            'lookup_failures': self.lookup_failures,
+            'cache': self._existing.stats()
+        }
+
+
+_registries: Dict[str, AtaRegistry] = {}
+
+
+def ata_registry_for(rpc_url: str) -> AtaRegistry:
+    """Return the shared registry for an RPC endpoint, creating it on first use"""
+    registry = _registries.get(rpc_url)
+    if registry is None:
+        registry = _registries[rpc_url] = AtaRegistry(rpc_url)
+    return registry
+
+
+async def close_ata_registries():
+    """Close every shared registry"""
+    for registry in list(_registries.values()):
+        await registry.close()
+    _registries.clear()
@@ -0,0 +1,151 @@
+"""
+Transaction audit log for MochiDrop
+Buffers transfer events in memory and writes them to transaction_logs in COPY batches
+"""
+
+import os
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from database_new import db, encode_address, encode_signature
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_LOG_COLUMNS = (
+    'airdrop_id', 'claim_id', 'from_wallet', 'to_wallet', 'amount',
+    'transaction_signature', 'status', 'error_message', 'created_at'
+)
+
+
+def _encode(encoder, value: Optional[str]) -> Optional[bytes]:
+    """Encode an address/signature, keeping the event (with NULL) if it isn't valid base58"""
+    try:
+        return encoder(value)
+    except ValueError as e:
+        logger.warning(f"Audit log value not stored: {e}")
+        return None
+
+
+class TransactionLogWriter:
+    """Batched writer for the transaction_logs audit trail.
+
+    log_transfer only appends to an in-memory buffer, so it adds no database
+    round trip to the transfer path. A background task flushes the buffer with
+    COPY when it reaches batch_size or every flush_interval seconds. The
+    buffer holds at most max_buffer events; beyond that new events are dropped
+    and counted. A failed flush puts its batch back at the front of the buffer.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 2.0, max_buffer: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: deque = deque()
+        self._flush_needed = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def log_transfer(self, from_wallet: Optional[str], to_wallet: Optional[str], amount: Optional[int],
+                     status: str, transaction_signature: Optional[str] = None,
+                     error_message: Optional[str] = None, airdrop_id: Optional[int] = None,
+                     claim_id: Optional[int] = None) -> bool:
+        """Queue a transfer event; returns False if the buffer is full and the event was dropped"""
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            logger.warning(f"Audit log buffer full ({self.max_buffer}), dropped event for {to_wallet}")
+            return False
+
+        self._buffer.append((
+            airdrop_id,
+            claim_id,
+            _encode(encode_address, from_wallet),
+            _encode(encode_address, to_wallet),
+            amount,
+            _encode(encode_signature, transaction_signature),
+            status,
+            error_message,
+            datetime.utcnow()
+        ))
+        if len(self._buffer) >= self.batch_size:
+            self._flush_needed.set()
+        return True
+
+    async def start(self):
+        """Start the background flush task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the background task and write everything still buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                logger.error(f"Audit log shutdown: {len(self._buffer)} events could not be written")
+                break
+
+    async def flush(self) -> bool:
+        """Write up to batch_size buffered events; returns False if the write failed"""
+        async with self._flush_lock:
+            if not self._buffer:
+                return True
+
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                async with db.acquire() as conn:
+                    await conn.copy_records_to_table(
+                        'transaction_logs', records=batch, columns=TRANSACTION_LOG_COLUMNS
+                    )
+                self.written += len(batch)
+                return True
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.error(f"Error writing {len(batch)} audit log events: {e}")
+                # Put the batch back in order, as far as the bound allows
+                room = self.max_buffer - len(self._buffer)
+                if room < len(batch):
+                    self.dropped += len(batch) - room
+                self._buffer.extendleft(reversed(batch[:max(room, 0)]))
+                return False
+
+    async def _flush_loop(self):
+        """Flush on the batch_size signal or every flush_interval seconds"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            while self._buffer:
+                if not await self.flush():
+                    break
+                if len(self._buffer) < self.batch_size:
+                    break
+
+    def stats(self) -> Dict[str, Any]:
+        """Return buffer size and write counters"""
+        return {
+            'buffered': len(self._buffer),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed_flushes': self.failed_flushes
+        }
+
+
+# Global audit log writer
+transaction_log_writer = TransactionLogWriter(
+    batch_size=int(os.getenv('AUDIT_LOG_BATCH_SIZE', '500')),
+    flush_interval=float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', '2')),
+    max_buffer=int(os.getenv('AUDIT_LOG_MAX_BUFFER', '10000'))
+)
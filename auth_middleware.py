@@ -1,10 +1,10 @@
 import os
 import hashlib
 from functools import wraps
-from typing import List, Callable, Any
+from typing import List, Callable, Any, Optional, Dict, Union
 from telegram import Update
 from telegram.ext import ContextTypes
-from database_new import db
+from database_new import db, DatabaseBusyError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,6 +13,18 @@ logger = logging.getLogger(__name__)
 ADMIN_IDS = [int(id.strip()) for id in os.getenv('ADMIN_TELEGRAM_IDS', '').split(',') if id.strip()]
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'mochi_admin_2024')
 
+BUSY_MESSAGE = "⏳ MochiDrop is very busy right now. Please try again in a few seconds."
+
+async def reply_busy(update: Update):
+    """Tell the user the database is saturated instead of leaving the request hanging"""
+    try:
+        if update.callback_query:
+            await update.callback_query.answer(BUSY_MESSAGE, show_alert=True)
+        elif update.effective_chat:
+            await update.effective_chat.send_message(BUSY_MESSAGE)
+    except Exception as e:
+        logger.error(f"Failed to send busy reply: {e}")
+
 class AuthMiddleware:
     """Role-based authentication middleware for MochiDrop bot"""
     
@@ -27,8 +39,8 @@ class AuthMiddleware:
         return hashlib.sha256(password.encode()).hexdigest() == hashed
     
     @staticmethod
-    async def ensure_user_exists(update: Update) -> bool:
-        """Ensure user exists in database, create if not"""
+    async def ensure_user_exists(update: Update) -> Optional[Dict[str, Any]]:
+        """Ensure user exists in database, create if not; returns the user record"""
         try:
             user = update.effective_user
             telegram_id = user.id
@@ -51,56 +63,57 @@ class AuthMiddleware:
                 
                 if success:
                     logger.info(f"Created new user: {telegram_id} with role: {role}")
-                    return True
+                    return await db.get_user(telegram_id)
                 else:
                     logger.error(f"Failed to create user: {telegram_id}")
-                    return False
+                    return None
             
-            return True
+            return existing_user
             
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error ensuring user exists: {e}")
-            return False
+            return None
 
-def require_role(allowed_roles: List[str]):
-    """Decorator to require specific roles for command access"""
+def require_role(allowed_roles: Union[str, List[str]]):
+    """Decorator to require specific roles for a handler method (one role or a list)"""
+    if isinstance(allowed_roles, str):
+        allowed_roles = [allowed_roles]
+    
     def decorator(func: Callable) -> Callable:
         @wraps(func)
-        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
             try:
-                # Ensure user exists in database
-                if not await AuthMiddleware.ensure_user_exists(update):
-                    await update.message.reply_text("❌ Authentication error. Please try again.")
-                    return
-                
-                telegram_id = update.effective_user.id
-                user = await db.get_user(telegram_id)
-                
+                # Ensure user exists in database (one cached lookup)
+                user = await AuthMiddleware.ensure_user_exists(update)
                 if not user:
-                    await update.message.reply_text("❌ User not found. Please contact support.")
+                    await update.effective_message.reply_text("❌ Authentication error. Please try again.")
                     return
                 
                 # Check if user has required role
                 if user['role'] not in allowed_roles:
                     if 'admin' in allowed_roles:
-                        await update.message.reply_text(
+                        await update.effective_message.reply_text(
                             "🔒 **Admin Access Required**\n\n"
                             "This command is restricted to administrators only.\n"
                             "Use `/admin login <password>` to authenticate as admin."
                         )
                     else:
-                        await update.message.reply_text("❌ Insufficient permissions.")
+                        await update.effective_message.reply_text("❌ Insufficient permissions.")
                     return
                 
                 # Store user info in context for use in handler
                 context.user_data['user_info'] = user
                 
                 # Call the original function
-                return await func(update, context, *args, **kwargs)
+                return await func(self, update, context, *args, **kwargs)
                 
+            except DatabaseBusyError:
+                await reply_busy(update)
             except Exception as e:
                 logger.error(f"Error in role middleware: {e}")
-                await update.message.reply_text("❌ An error occurred. Please try again.")
+                await update.effective_message.reply_text("❌ An error occurred. Please try again.")
         
         return wrapper
     return decorator
@@ -110,16 +123,16 @@ def require_admin(func: Callable) -> Callable:
     return require_role(['admin'])(func)
 
 def require_authenticated_admin(func: Callable) -> Callable:
-    """Decorator to require authenticated admin (with session)"""
+    """Decorator to require authenticated admin (with session) for a handler method"""
     @wraps(func)
-    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+    async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         try:
             telegram_id = update.effective_user.id
             
             # First check if user is admin
             user = await db.get_user(telegram_id)
             if not user or user['role'] != 'admin':
-                await update.message.reply_text(
+                await update.effective_message.reply_text(
                     "🔒 **Admin Access Required**\n\n"
                     "This command requires admin authentication.\n"
                     "Use `/admin login <password>` first."
@@ -129,7 +142,7 @@ def require_authenticated_admin(func: Callable) -> Callable:
             # Check if admin has active session
             session_token = context.user_data.get('admin_session_token')
             if not session_token or not await db.validate_admin_session(telegram_id, session_token):
-                await update.message.reply_text(
+                await update.effective_message.reply_text(
                     "🔐 **Session Expired**\n\n"
                     "Your admin session has expired.\n"
                     "Please login again with `/admin login <password>`"
@@ -140,11 +153,13 @@ def require_authenticated_admin(func: Callable) -> Callable:
             context.user_data['user_info'] = user
             
             # Call the original function
-            return await func(update, context, *args, **kwargs)
+            return await func(self, update, context, *args, **kwargs)
             
+        except DatabaseBusyError:
+            await reply_busy(update)
         except Exception as e:
             logger.error(f"Error in authenticated admin middleware: {e}")
-            await update.message.reply_text("❌ Authentication error. Please try again.")
+            await update.effective_message.reply_text("❌ Authentication error. Please try again.")
     
     return wrapper
 
@@ -202,6 +217,9 @@ class AdminAuth:
                 await update.message.reply_text("❌ Failed to create admin session.")
                 return False
                 
+        except DatabaseBusyError:
+            await reply_busy(update)
+            return False
         except Exception as e:
             logger.error(f"Error in admin login: {e}")
             await update.message.reply_text("❌ Login error. Please try again.")
@@ -0,0 +1,167 @@
+"""
+Blockhash cache for MochiDrop
+Keeps a recent blockhash refreshed in the background so signers don't fetch one per transaction
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from solders.hash import Hash
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Confirmed
+
+logger = logging.getLogger(__name__)
+
+# Blocks a blockhash stays usable for; getLatestBlockhash reports
+# last_valid_block_height as the blockhash's block height plus this
+MAX_PROCESSING_AGE = 150
+
+REFRESH_INTERVAL = int(os.getenv('SOLANA_BLOCKHASH_REFRESH_MS', '400')) / 1000
+MAX_AGE = float(os.getenv('SOLANA_BLOCKHASH_MAX_AGE', '2'))
+IDLE_TIMEOUT = float(os.getenv('SOLANA_BLOCKHASH_IDLE_TIMEOUT', '60'))
+
+
+class RecentBlockhash:
+    """A blockhash and the last block height a transaction signed with it can land in"""
+
+    __slots__ = ('blockhash', 'last_valid_block_height', 'fetched_at')
+
+    def __init__(self, blockhash: Hash, last_valid_block_height: int, fetched_at: float):
+        self.blockhash = blockhash
+        self.last_valid_block_height = last_valid_block_height
+        self.fetched_at = fetched_at
+
+
+class BlockhashCache:
+    """Shared recent blockhash for one RPC endpoint.
+
+    The first get() starts a background task that refetches the blockhash
+    every refresh_interval seconds, so signing normally costs no RPC call.
+    If the cached one is older than max_age (the task is behind or has just
+    started) get() fetches it directly. The task stops after idle_timeout
+    seconds without use and restarts on the next call.
+
+    The current block height is derived from the same response, so
+    is_expired() can tell a signer that a transaction which hasn't landed
+    never will, and must be re-signed, without another RPC call.
+    """
+
+    def __init__(self, rpc_url: str, refresh_interval: float = REFRESH_INTERVAL,
+                 max_age: float = MAX_AGE, idle_timeout: float = IDLE_TIMEOUT):
+        self.rpc_url = rpc_url
+        self.client = AsyncClient(rpc_url)
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.idle_timeout = idle_timeout
+        self._current: Optional[RecentBlockhash] = None
+        self._block_height: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._last_used = 0.0
+        self.refreshes = 0
+        self.failures = 0
+        self.served = 0
+
+    def _touch(self):
+        self._last_used = time.monotonic()
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def get(self) -> RecentBlockhash:
+        """Return a recent blockhash, fetching one only if the cached one is stale"""
+        self._touch()
+        current = self._current
+        if current is None or time.monotonic() - current.fetched_at > self.max_age:
+            async with self._lock:
+                current = self._current
+                if current is None or time.monotonic() - current.fetched_at > self.max_age:
+                    current = await self._refresh()
+        self.served += 1
+        return current
+
+    @property
+    def block_height(self) -> Optional[int]:
+        """Block height as of the latest fetch (None until the first one)"""
+        self._touch()
+        return self._block_height
+
+    def is_expired(self, last_valid_block_height: int, block_height: Optional[int] = None) -> bool:
+        """True once the chain is past last_valid_block_height (False while the height is unknown).
+
+        A caller about to decide from a signature status should read
+        block_height before fetching the status and pass it here: the
+        background refresh may move the cached height on in between, and a
+        transaction that landed in its last valid block would then look expired.
+        """
+        if block_height is None:
+            block_height = self.block_height
+        return block_height is not None and block_height > last_valid_block_height
+
+    async def _refresh(self) -> RecentBlockhash:
+        response = await self.client.get_latest_blockhash(commitment=Confirmed)
+        value = response.value
+        self._current = RecentBlockhash(value.blockhash, value.last_valid_block_height, time.monotonic())
+        self._block_height = value.last_valid_block_height - MAX_PROCESSING_AGE
+        self.refreshes += 1
+        return self._current
+
+    async def _refresh_loop(self):
+        try:
+            while time.monotonic() - self._last_used < self.idle_timeout:
+                try:
+                    async with self._lock:
+                        await self._refresh()
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning(f"Error refreshing blockhash from {self.rpc_url}: {e}")
+                await asyncio.sleep(self.refresh_interval)
+        finally:
+            self._task = None
+
+    async def close(self):
+        """Stop the refresh task and close the RPC client"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.client.close()
+        except Exception as e:
+            logger.error(f"Error closing blockhash client: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the cached blockhash age and refresh counters"""
+        current = self._current
+        return {
+            'rpc_url': self.rpc_url,
+            'refreshing': self._task is not None,
+            'age_ms': round((time.monotonic() - current.fetched_at) * 1000) if current else None,
+            'block_height': self._block_height,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'served': self.served
+        }
+
+
+_caches: Dict[str, BlockhashCache] = {}
+
+
+def blockhash_cache_for(rpc_url: str) -> BlockhashCache:
+    """Return the shared cache for an RPC endpoint, creating it on first use"""
+    cache = _caches.get(rpc_url)
+    if cache is None:
+        cache = _caches[rpc_url] = BlockhashCache(rpc_url)
+    return cache
+
+
+async def close_blockhash_caches():
+    """Close every shared cache"""
+    for cache in list(_caches.values()):
+        await cache.close()
+    _caches.clear()
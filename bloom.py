@@ -0,0 +1,112 @@
+"""
+Bloom filters for MochiDrop
+In-memory membership pre-checks in front of duplicate-claim and wallet-reuse queries
+"""
+
+import math
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over byte keys.
+
+    might_contain never returns False for a key that was added; it returns True
+    for an absent key with probability about error_rate while no more than
+    capacity keys have been added. Bit positions come from one blake2b digest
+    split into two 64-bit hashes (Kirsch-Mitzenmacher double hashing).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.num_bits = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.num_hashes = max(round(self.num_bits / self.capacity * math.log(2)), 1)
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: bytes):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, key: bytes) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def saturated(self) -> bool:
+        """True once more keys were added than the filter was sized for"""
+        return self.count > self.capacity
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'capacity': self.capacity,
+            'bytes': len(self._bits),
+            'hashes': self.num_hashes
+        }
+
+
+class MembershipFilter:
+    """A Bloom filter that is rebuilt from the database while writes keep landing in it.
+
+    Until the first build finishes, might_contain answers True ("maybe"), so
+    callers fall through to the authoritative query. During a rebuild, add()
+    writes to both the live filter and the one being built, so keys written
+    after the build's snapshot started aren't lost when the new filter is
+    swapped in. Keys are never removed; a stale key only costs a DB lookup.
+    """
+
+    def __init__(self, name: str, error_rate: float = 0.01):
+        self.name = name
+        self.error_rate = error_rate
+        self._filter: Optional[BloomFilter] = None
+        self._building: Optional[BloomFilter] = None
+        self.skipped = 0
+        self.maybes = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def add(self, key: bytes):
+        if self._filter is not None:
+            self._filter.add(key)
+        if self._building is not None:
+            self._building.add(key)
+
+    def might_contain(self, key: bytes) -> bool:
+        if self._filter is None:
+            return True
+        if self._filter.might_contain(key):
+            self.maybes += 1
+            return True
+        self.skipped += 1
+        return False
+
+    async def rebuild(self, capacity: int, loader: Callable[[BloomFilter], Awaitable[None]]):
+        """Build a new filter with loader (which adds every current key) and swap it in"""
+        building = BloomFilter(capacity, self.error_rate)
+        self._building = building
+        try:
+            await loader(building)
+        finally:
+            self._building = None
+        self._filter = building
+        logger.info(f"Bloom filter {self.name} rebuilt: {building.count:,} keys, {building.stats()['bytes']:,} bytes")
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self._filter.stats() if self._filter else {'count': 0, 'capacity': 0, 'bytes': 0, 'hashes': 0},
+            ready=self.ready, skipped=self.skipped, maybes=self.maybes
+        )
@@ -15,12 +15,16 @@ from telegram.ext import (
 from dotenv import load_dotenv
 
 # Import our modules
-from database_new import db
-from auth_middleware import auth_middleware
+from database_new import db, DatabaseBusyError
+from auth_middleware import auth_middleware, reply_busy
 from user_handlers import user_handlers, WAITING_FOR_WALLET_ADDRESS, WAITING_FOR_NEW_WALLET_ADDRESS
 from admin_handlers import admin_handlers, WAITING_FOR_ADMIN_PASSWORD, WAITING_FOR_AIRDROP_NAME, WAITING_FOR_AIRDROP_DESCRIPTION, WAITING_FOR_TOKEN_DETAILS, WAITING_FOR_AIRDROP_AMOUNTS, WAITING_FOR_MAX_CLAIMS, WAITING_FOR_PRIVATE_KEY
 from callback_handlers import callback_handlers
 from solana_wallet_manager import solana_wallet_manager
+from audit_log import transaction_log_writer
+from blockhash_cache import close_blockhash_caches
+from ata_registry import close_ata_registries
+from ata_provisioning import ata_provisioner
 
 # Load environment variables
 load_dotenv()
@@ -139,6 +143,7 @@ class MochiDropBot:
         
         # User command handlers
         self.application.add_handler(CommandHandler('airdrops', user_handlers.airdrops_command))
+        self.application.add_handler(CommandHandler('claim', user_handlers.claim_command))
         self.application.add_handler(CommandHandler('mywallet', user_handlers.mywallet_command))
         self.application.add_handler(CommandHandler('myclaims', user_handlers.myclaims_command))
         self.application.add_handler(CommandHandler('help', user_handlers.help_command))
@@ -150,8 +155,17 @@ class MochiDropBot:
         self.application.add_handler(CommandHandler('connect_wallet', admin_handlers.connect_wallet_command))
         self.application.add_handler(CommandHandler('stats', admin_handlers.admin_stats_command))
         self.application.add_handler(CommandHandler('logout', admin_handlers.admin_logout_command))
+        self.application.add_handler(CommandHandler('slowqueries', admin_handlers.admin_slowqueries_command))
+        
+        # Allowlist CSV uploads (after "Upload Allowlist" on an airdrop)
+        self.application.add_handler(MessageHandler(filters.Document.ALL, admin_handlers.receive_allowlist_file))
         
         # Callback query handlers for inline keyboards
+        self.application.add_handler(CallbackQueryHandler(user_handlers.myclaims_page_callback, pattern='^myclaims:'))
+        self.application.add_handler(CallbackQueryHandler(callback_handlers.handle_export_users_callback, pattern='^export_users$'))
+        self.application.add_handler(CallbackQueryHandler(callback_handlers.handle_upload_allowlist_callback, pattern=r'^upload_allowlist_\d+$'))
+        self.application.add_handler(CallbackQueryHandler(callback_handlers.handle_provision_atas_callback, pattern=r'^provision_atas_\d+$'))
+        self.application.add_handler(CallbackQueryHandler(callback_handlers.handle_provision_atas_start_callback, pattern=r'^provision_atas_start_\d+$'))
         self.application.add_handler(CallbackQueryHandler(callback_handlers.handle_callback))
         
         # Error handler
@@ -161,6 +175,12 @@ class MochiDropBot:
     
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors that occur during bot operation"""
+        if isinstance(context.error, DatabaseBusyError):
+            logger.warning(f"Database busy while handling an update: {context.error}")
+            if isinstance(update, Update):
+                await reply_busy(update)
+            return
+        
         logger.error(f"Exception while handling an update: {context.error}")
         
         # Try to send error message to user
@@ -176,6 +196,8 @@ class MochiDropBot:
         """Initialize database connection and create tables if needed"""
         try:
             await db.initialize()
+            await db.repair_admin_wallet_addresses(solana_wallet_manager.address_from_private_key)
+            await transaction_log_writer.start()
             logger.info("Database initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
@@ -184,6 +206,11 @@ class MochiDropBot:
     async def cleanup(self):
         """Cleanup resources when bot shuts down"""
         try:
+            await ata_provisioner.close()
+            await close_blockhash_caches()
+            await close_ata_registries()
+            # Write buffered audit log events while the pool is still open
+            await transaction_log_writer.close()
             await db.close()
             logger.info("Database connection closed")
         except Exception as e:
@@ -1,12 +1,33 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from auth_middleware import require_authenticated_admin, require_role
-from database_new import db
+from auth_middleware import require_authenticated_admin, require_receiver
+from database_new import db, DatabaseBusyError, CLAIM_ALREADY_CLAIMED, CLAIM_ERROR
+from user_handlers import CLAIM_REJECTION_MESSAGES, submit_claim
+from csv_export import export_users_csv, export_filename
+from ata_provisioning import ata_provisioner, estimate_rent_sol
+from solana_wallet_manager import solana_wallet_manager
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+DUPLICATE_TAP_NOTICE = "ℹ️ Already submitted - see the message above."
+
+
+def provisioning_summary(airdrop_id: int) -> str:
+    """One-line token account pre-provisioning status for an airdrop ('' if never run)"""
+    job = ata_provisioner.get_job(airdrop_id)
+    if not job:
+        return ''
+    if job.running:
+        return (f"⏳ Running - {job.scanned:,} wallets scanned, "
+                f"{job.created:,}/{job.missing:,} accounts created")
+    if job.status == 'completed':
+        failed = f", {job.failed:,} failed" if job.failed else ''
+        return f"✅ Done - {job.created:,} accounts created{failed}"
+    reason = f": `{job.error.replace('`', '')}`" if job.error else ''
+    return f"❌ {job.status.title()} after {job.created:,} accounts created{reason}"
+
 class CallbackHandlers:
     """Handlers for inline keyboard callbacks"""
     
@@ -19,12 +40,11 @@ class CallbackHandlers:
             
             user = context.user_data.get('user_info', {})
             
-            # Get admin statistics
-            async with db.pool.acquire() as conn:
-                total_users = await conn.fetchval("SELECT COUNT(*) FROM users WHERE role = 'receiver'")
-                total_airdrops = await conn.fetchval("SELECT COUNT(*) FROM airdrops")
-                active_airdrops = await conn.fetchval("SELECT COUNT(*) FROM airdrops WHERE status = 'active'")
-                total_claims = await conn.fetchval("SELECT COUNT(*) FROM claims")
+            # Get admin statistics (shared, cached snapshot)
+            stats = await db.get_stats_snapshot()
+            if not stats:
+                await query.answer("❌ Error loading dashboard.", show_alert=True)
+                return
             
             keyboard = [
                 [
@@ -45,16 +65,18 @@ class CallbackHandlers:
                 f"🔧 **Admin Dashboard**\n\n"
                 f"👋 **Welcome, {user.get('first_name', 'Admin')}!**\n\n"
                 f"📊 **Quick Stats:**\n"
-                f"• **Users:** {total_users}\n"
-                f"• **Total Airdrops:** {total_airdrops}\n"
-                f"• **Active Airdrops:** {active_airdrops}\n"
-                f"• **Total Claims:** {total_claims}\n\n"
+                f"• **Users:** {stats['total_users']}\n"
+                f"• **Total Airdrops:** {stats['total_airdrops']}\n"
+                f"• **Active Airdrops:** {stats['active_airdrops']}\n"
+                f"• **Total Claims:** {stats['total_claims']}\n\n"
                 f"🛠️ **Admin Tools:**\n"
                 f"Select an option below to manage your airdrops and users.",
                 reply_markup=reply_markup,
                 parse_mode='Markdown'
             )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in admin dashboard callback: {e}")
             await query.answer("❌ Error loading dashboard.", show_alert=True)
@@ -66,31 +88,16 @@ class CallbackHandlers:
             query = update.callback_query
             await query.answer()
             
-            # Get comprehensive statistics
-            async with db.pool.acquire() as conn:
-                # User stats
-                total_users = await conn.fetchval("SELECT COUNT(*) FROM users WHERE role = 'receiver'")
-                users_with_wallets = await conn.fetchval("SELECT COUNT(*) FROM users WHERE wallet_address IS NOT NULL AND role = 'receiver'")
-                
-                # Airdrop stats
-                total_airdrops = await conn.fetchval("SELECT COUNT(*) FROM airdrops")
-                active_airdrops = await conn.fetchval("SELECT COUNT(*) FROM airdrops WHERE status = 'active'")
-                draft_airdrops = await conn.fetchval("SELECT COUNT(*) FROM airdrops WHERE status = 'draft'")
-                
-                # Claim stats
-                total_claims = await conn.fetchval("SELECT COUNT(*) FROM claims")
-                completed_claims = await conn.fetchval("SELECT COUNT(*) FROM claims WHERE status = 'completed'")
-                pending_claims = await conn.fetchval("SELECT COUNT(*) FROM claims WHERE status = 'pending'")
-                
-                # Recent activity (last 24 hours)
-                recent_users = await conn.fetchval("""
-                    SELECT COUNT(*) FROM users 
-                    WHERE created_at > NOW() - INTERVAL '24 hours' AND role = 'receiver'
-                """)
-                recent_claims = await conn.fetchval("""
-                    SELECT COUNT(*) FROM claims 
-                    WHERE claimed_at > NOW() - INTERVAL '24 hours'
-                """)
+            # Get comprehensive statistics (shared, cached snapshot)
+            stats = await db.get_stats_snapshot()
+            if not stats:
+                await query.answer("❌ Error loading statistics.", show_alert=True)
+                return
+            
+            total_users = stats['total_users']
+            users_with_wallets = stats['users_with_wallets']
+            total_claims = stats['total_claims']
+            completed_claims = stats['completed_claims']
             
             # Calculate percentages
             wallet_percentage = (users_with_wallets / total_users * 100) if total_users > 0 else 0
@@ -106,24 +113,26 @@ class CallbackHandlers:
                 f"👥 **Users:**\n"
                 f"• Total Users: {total_users:,}\n"
                 f"• With Wallets: {users_with_wallets:,} ({wallet_percentage:.1f}%)\n"
-                f"• New (24h): {recent_users:,}\n\n"
+                f"• New (24h): {stats['recent_users']:,}\n\n"
                 f"🎯 **Airdrops:**\n"
-                f"• Total Created: {total_airdrops:,}\n"
-                f"• Currently Active: {active_airdrops:,}\n"
-                f"• In Draft: {draft_airdrops:,}\n\n"
+                f"• Total Created: {stats['total_airdrops']:,}\n"
+                f"• Currently Active: {stats['active_airdrops']:,}\n"
+                f"• In Draft: {stats['draft_airdrops']:,}\n\n"
                 f"🎁 **Claims:**\n"
                 f"• Total Claims: {total_claims:,}\n"
                 f"• Completed: {completed_claims:,} ({claim_success_rate:.1f}%)\n"
-                f"• Pending: {pending_claims:,}\n"
-                f"• Recent (24h): {recent_claims:,}\n\n"
+                f"• Pending: {stats['pending_claims']:,}\n"
+                f"• Recent (24h): {stats['recent_claims']:,}\n\n"
                 f"📈 **Performance:**\n"
                 f"• Success Rate: {claim_success_rate:.1f}%\n"
                 f"• Wallet Adoption: {wallet_percentage:.1f}%\n\n"
-                f"🕒 **Last Updated:** {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}",
+                f"🕒 **Last Updated:** {stats['generated_at'].strftime('%Y-%m-%d %H:%M UTC')}",
                 reply_markup=reply_markup,
                 parse_mode='Markdown'
             )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in admin stats callback: {e}")
             await query.answer("❌ Error loading statistics.", show_alert=True)
@@ -185,6 +194,8 @@ class CallbackHandlers:
                     parse_mode='Markdown'
                 )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in admin wallets callback: {e}")
             await query.answer("❌ Error loading wallets.", show_alert=True)
@@ -196,19 +207,16 @@ class CallbackHandlers:
             query = update.callback_query
             await query.answer()
             
-            # Get user statistics and recent users
-            async with db.pool.acquire() as conn:
-                total_users = await conn.fetchval("SELECT COUNT(*) FROM users WHERE role = 'receiver'")
-                users_with_wallets = await conn.fetchval("SELECT COUNT(*) FROM users WHERE wallet_address IS NOT NULL AND role = 'receiver'")
-                
-                # Get recent users (last 10)
-                recent_users = await conn.fetch("""
-                    SELECT telegram_id, first_name, username, wallet_address, created_at
-                    FROM users 
-                    WHERE role = 'receiver'
-                    ORDER BY created_at DESC 
-                    LIMIT 10
-                """)
+            # Get user statistics (shared, cached snapshot) and recent users
+            stats = await db.get_stats_snapshot()
+            if not stats:
+                await query.answer("❌ Error loading users.", show_alert=True)
+                return
+            total_users = stats['total_users']
+            users_with_wallets = stats['users_with_wallets']
+            
+            # Get recent users (last 10)
+            recent_users = await db.get_recent_users(10)
             
             user_list = ""
             if recent_users:
@@ -242,10 +250,36 @@ class CallbackHandlers:
                 parse_mode='Markdown'
             )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in admin users callback: {e}")
             await query.answer("❌ Error loading users.", show_alert=True)
     
+    @require_authenticated_admin
+    async def handle_export_users_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle export users callback - send all users as a compressed CSV"""
+        try:
+            query = update.callback_query
+            await query.answer("📊 Preparing export...")
+            
+            export_file, row_count = await export_users_csv()
+            try:
+                await query.message.reply_document(
+                    document=export_file,
+                    filename=export_filename('mochidrop_users'),
+                    caption=f"📊 **User Export Complete**\n\nTotal Users: {row_count:,}",
+                    parse_mode='Markdown'
+                )
+            finally:
+                export_file.close()
+        
+        except DatabaseBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in export users callback: {e}")
+            await query.answer("❌ Error exporting users.", show_alert=True)
+    
     async def handle_activate_airdrop_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle activate airdrop callback"""
         try:
@@ -257,6 +291,12 @@ class CallbackHandlers:
             
             # Update airdrop status to active
             success = await db.update_airdrop_status(airdrop_id, 'active')
+            job = ata_provisioner.get_job(airdrop_id)
+            provisioning_note = (
+                f"⚠️ **Token accounts:** {provisioning_summary(airdrop_id)}\n"
+                f"Claims to wallets not reached yet create their account in the transfer.\n\n"
+                if job and job.running else ""
+            )
             
             if success:
                 # Get airdrop details
@@ -273,6 +313,7 @@ class CallbackHandlers:
                     f"🍡 **{airdrop['name']}** is now live and accepting claims!\n\n"
                     f"📢 **Share with your community:**\n"
                     f"Users can now use `/airdrops` to see and claim from this airdrop.\n\n"
+                    f"{provisioning_note}"
                     f"🎯 **Airdrop ID:** `{airdrop_id}`\n"
                     f"📊 **Status:** Active ✅",
                     reply_markup=reply_markup,
@@ -281,6 +322,8 @@ class CallbackHandlers:
             else:
                 await query.answer("❌ Failed to activate airdrop.", show_alert=True)
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error activating airdrop: {e}")
             await query.answer("❌ Error activating airdrop.", show_alert=True)
@@ -301,25 +344,39 @@ class CallbackHandlers:
                 await query.answer("❌ Airdrop not found.", show_alert=True)
                 return
             
-            # Get claim statistics
-            async with db.pool.acquire() as conn:
-                total_claims = await conn.fetchval("SELECT COUNT(*) FROM claims WHERE airdrop_id = $1", airdrop_id)
-                completed_claims = await conn.fetchval("SELECT COUNT(*) FROM claims WHERE airdrop_id = $1 AND status = 'completed'", airdrop_id)
-                pending_claims = await conn.fetchval("SELECT COUNT(*) FROM claims WHERE airdrop_id = $1 AND status = 'pending'", airdrop_id)
+            # Get claim statistics (rollup rows, independent of claims table size)
+            stats = await db.get_airdrop_stats(airdrop_id)
+            total_claims = stats.get('total_claims', 0)
+            completed_claims = stats.get('completed_claims', 0)
+            pending_claims = stats.get('pending_claims', 0)
             
             # Calculate display amounts
             total_display = airdrop['total_amount'] / (10 ** airdrop['token_decimals'])
             per_claim_display = airdrop['amount_per_claim'] / (10 ** airdrop['token_decimals'])
             distributed = completed_claims * per_claim_display
             remaining = total_display - distributed
+            remaining_slots = (
+                f"{max(airdrop['max_claims'] - airdrop['current_claims'], 0):,}"
+                if airdrop['max_claims'] else 'Unlimited'
+            )
+            
+            allowlist_info = (
+                f"{await db.get_allowlist_size(airdrop_id):,} wallets"
+                if airdrop['allowlist_only'] else 'Open to all'
+            )
+            
+            provisioning = provisioning_summary(airdrop_id)
+            provisioning_info = f"• **Token Accounts:** {provisioning}\n" if provisioning else ""
             
             status_emoji = "✅" if airdrop['status'] == 'active' else "📝" if airdrop['status'] == 'draft' else "❌"
             
             keyboard = []
             if airdrop['status'] == 'draft':
+                keyboard.append([InlineKeyboardButton("🧾 Pre-create Token Accounts", callback_data=f"provision_atas_{airdrop_id}")])
                 keyboard.append([InlineKeyboardButton("🚀 Activate Airdrop", callback_data=f"activate_airdrop_{airdrop_id}")])
             elif airdrop['status'] == 'active':
                 keyboard.append([InlineKeyboardButton("⏸️ Pause Airdrop", callback_data=f"pause_airdrop_{airdrop_id}")])
+            keyboard.append([InlineKeyboardButton("📋 Upload Allowlist", callback_data=f"upload_allowlist_{airdrop_id}")])
             
             keyboard.append([InlineKeyboardButton("🏠 Back to Dashboard", callback_data="admin_dashboard")])
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -336,11 +393,14 @@ class CallbackHandlers:
                 f"📊 **Distribution:**\n"
                 f"• **Total Pool:** {total_display:,.0f} {airdrop['token_symbol']}\n"
                 f"• **Per Claim:** {per_claim_display:,.0f} {airdrop['token_symbol']}\n"
-                f"• **Max Claims:** {airdrop['max_claims'] if airdrop['max_claims'] else 'Unlimited'}\n\n"
+                f"• **Max Claims:** {airdrop['max_claims'] if airdrop['max_claims'] else 'Unlimited'}\n"
+                f"• **Allowlist:** {allowlist_info}\n"
+                f"{provisioning_info}\n"
                 f"📈 **Progress:**\n"
                 f"• **Total Claims:** {total_claims:,}\n"
                 f"• **Completed:** {completed_claims:,}\n"
                 f"• **Pending:** {pending_claims:,}\n"
+                f"• **Slots Left:** {remaining_slots}\n"
                 f"• **Distributed:** {distributed:,.0f} {airdrop['token_symbol']}\n"
                 f"• **Remaining:** {remaining:,.0f} {airdrop['token_symbol']}\n\n"
                 f"📅 **Created:** {airdrop['created_at'].strftime('%Y-%m-%d %H:%M UTC')}",
@@ -348,24 +408,170 @@ class CallbackHandlers:
                 parse_mode='Markdown'
             )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error viewing airdrop: {e}")
             await query.answer("❌ Error loading airdrop details.", show_alert=True)
     
-    @require_role('receiver')
+    @require_authenticated_admin
+    async def handle_upload_allowlist_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle upload allowlist callback - wait for the admin's CSV file"""
+        try:
+            query = update.callback_query
+            await query.answer()
+            
+            airdrop_id = int(query.data.split('_')[-1])
+            airdrop = await db.get_airdrop(airdrop_id)
+            if not airdrop:
+                await query.answer("❌ Airdrop not found.", show_alert=True)
+                return
+            
+            context.user_data['allowlist_airdrop_id'] = airdrop_id
+            
+            await query.edit_message_text(
+                f"📋 **Upload Allowlist for {airdrop['name']}**\n\n"
+                f"Send a CSV file with one wallet per line, optionally followed by "
+                f"that wallet's amount in {airdrop['token_symbol']}:\n"
+                f"`address[,amount]`\n\n"
+                f"• The upload replaces the current list\n"
+                f"• Only listed wallets will be able to claim\n"
+                f"• Files may be gzip-compressed (`.csv.gz`)\n"
+                f"• For files over 20 MB use `python allowlist.py {airdrop_id} <file>`",
+                parse_mode='Markdown'
+            )
+        
+        except DatabaseBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in upload allowlist callback: {e}")
+            await query.answer("❌ Error starting allowlist upload.", show_alert=True)
+    
+    async def _provisioning_target(self, update: Update):
+        """Airdrop and funding wallet key for a provisioning callback, or (None, None) after answering why not"""
+        query = update.callback_query
+        airdrop = await db.get_airdrop(int(query.data.split('_')[-1]))
+        if not airdrop:
+            await query.answer("❌ Airdrop not found.", show_alert=True)
+            return None, None
+        if airdrop['status'] != 'draft':
+            await query.answer("❌ Token accounts can only be pre-created for draft airdrops.", show_alert=True)
+            return None, None
+        if not airdrop['admin_wallet']:
+            await query.answer("❌ This airdrop has no funding wallet.", show_alert=True)
+            return None, None
+        
+        private_key = await db.get_admin_wallet_key(update.effective_user.id, airdrop['admin_wallet'])
+        if not private_key:
+            await query.answer("❌ The funding wallet isn't one of your connected wallets.", show_alert=True)
+            return None, None
+        return airdrop, private_key
+    
+    @require_authenticated_admin
+    async def handle_provision_atas_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle pre-create token accounts callback - show the wallet count and rent cost before starting"""
+        try:
+            query = update.callback_query
+            
+            airdrop, _ = await self._provisioning_target(update)
+            if not airdrop:
+                return
+            airdrop_id = airdrop['id']
+            await query.answer()
+            
+            if airdrop['allowlist_only']:
+                source = "Allowlist"
+                wallets = await db.get_allowlist_size(airdrop_id)
+            else:
+                source = "All registered wallets"
+                wallets = await db.count_registered_wallets()
+            max_rent = estimate_rent_sol(wallets)
+            balance = await solana_wallet_manager.get_sol_balance(airdrop['admin_wallet'])
+            
+            warnings = ""
+            if not airdrop['allowlist_only'] and airdrop['max_claims'] and airdrop['max_claims'] < wallets:
+                warnings += (
+                    f"⚠️ Only {airdrop['max_claims']:,} of these wallets can claim. "
+                    f"Upload an allowlist first to pay rent only for eligible wallets.\n\n"
+                )
+            if balance < max_rent:
+                warnings += f"⚠️ The funding wallet holds {balance:,.4f} SOL, less than the maximum rent.\n\n"
+            
+            keyboard = [
+                [InlineKeyboardButton("✅ Create Accounts", callback_data=f"provision_atas_start_{airdrop_id}")],
+                [InlineKeyboardButton("❌ Cancel", callback_data=f"view_airdrop_{airdrop_id}")]
+            ]
+            
+            await query.edit_message_text(
+                f"🧾 **Pre-create Token Accounts?**\n\n"
+                f"🍡 **Airdrop:** {airdrop['name']}\n"
+                f"👥 **Wallets:** {source} ({wallets:,})\n"
+                f"💸 **Rent:** up to {max_rent:,.4f} SOL (about 0.002 SOL per account; "
+                f"wallets that already hold {airdrop['token_symbol']} cost nothing)\n"
+                f"💼 **Funding Wallet:** `{airdrop['admin_wallet'][:8]}...` ({balance:,.4f} SOL)\n\n"
+                f"{warnings}"
+                f"Accounts are created in the background, paid by the funding wallet.",
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown'
+            )
+        
+        except DatabaseBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error preparing token account provisioning: {e}")
+            await query.answer("❌ Error preparing token account provisioning.", show_alert=True)
+    
+    @require_authenticated_admin
+    async def handle_provision_atas_start_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle confirmed pre-create token accounts callback - start background provisioning"""
+        try:
+            query = update.callback_query
+            
+            airdrop, private_key = await self._provisioning_target(update)
+            if not airdrop:
+                return
+            airdrop_id = airdrop['id']
+            
+            job = ata_provisioner.start(airdrop, private_key)
+            await query.answer()
+            
+            keyboard = [
+                [InlineKeyboardButton("🔄 Refresh", callback_data=f"view_airdrop_{airdrop_id}")],
+                [InlineKeyboardButton("🏠 Back to Dashboard", callback_data="admin_dashboard")]
+            ]
+            
+            await query.edit_message_text(
+                f"🧾 **Pre-creating Token Accounts**\n\n"
+                f"🍡 **Airdrop:** {airdrop['name']}\n"
+                f"👥 **Wallets:** {job.as_dict()['source'].title()}\n"
+                f"📊 **Progress:** {provisioning_summary(airdrop_id)}\n\n"
+                f"Activate the airdrop once this is done so early claimers "
+                f"don't wait on account creation.",
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown'
+            )
+        
+        except DatabaseBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error starting token account provisioning: {e}")
+            await query.answer("❌ Error starting token account provisioning.", show_alert=True)
+    
+    @require_receiver
     async def handle_claim_airdrop_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle claim airdrop callback"""
         try:
             query = update.callback_query
-            await query.answer()
             
             # Extract airdrop ID from callback data
             airdrop_id = int(query.data.split('_')[-1])
             telegram_id = update.effective_user.id
             
             # Check if user has a wallet
-            user = await db.get_user(telegram_id)
+            # Set by require_role; falls back to the (cached) lookup
+            user = context.user_data.get('user_info') or await db.get_user(telegram_id)
             if not user or not user['wallet_address']:
+                await query.answer()
                 await query.edit_message_text(
                     "❌ **Wallet Required**\n\n"
                     "You need to register a Solana wallet address before claiming airdrops.\n\n"
@@ -374,53 +580,33 @@ class CallbackHandlers:
                 )
                 return
             
-            # Check if user already claimed this airdrop
-            existing_claim = await db.get_user_claim(telegram_id, airdrop_id)
-            if existing_claim:
-                status_text = "✅ Completed" if existing_claim['status'] == 'completed' else "⏳ Processing"
-                await query.edit_message_text(
-                    f"ℹ️ **Already Claimed**\n\n"
-                    f"You have already claimed this airdrop.\n\n"
-                    f"**Status:** {status_text}\n"
-                    f"**Claimed:** {existing_claim['claimed_at'].strftime('%Y-%m-%d %H:%M UTC')}\n\n"
-                    f"Use `/myclaims` to view all your claims.",
-                    parse_mode='Markdown'
-                )
-                return
-            
-            # Get airdrop details
-            airdrop = await db.get_airdrop(airdrop_id)
-            if not airdrop or airdrop['status'] != 'active':
-                await query.edit_message_text(
-                    "❌ **Airdrop Unavailable**\n\n"
-                    "This airdrop is no longer active or doesn't exist.",
-                    parse_mode='Markdown'
-                )
+            outcome, duplicate = await submit_claim(telegram_id, airdrop_id)
+            if duplicate:
+                # The first tap already updated this message
+                await query.answer(DUPLICATE_TAP_NOTICE)
                 return
+            await query.answer()
+            claim_id, reason = outcome['claim_id'], outcome['reason']
             
-            # Check if airdrop has reached max claims
-            if airdrop['max_claims']:
-                current_claims = len(await db.pool.fetch("SELECT id FROM claims WHERE airdrop_id = $1", airdrop_id))
-                if current_claims >= airdrop['max_claims']:
+            if reason == CLAIM_ALREADY_CLAIMED:
+                existing_claim = outcome['existing_claim']
+                if existing_claim:
+                    status_text = "✅ Completed" if existing_claim['status'] == 'completed' else "⏳ Processing"
                     await query.edit_message_text(
-                        "❌ **Airdrop Full**\n\n"
-                        "This airdrop has reached its maximum number of claims.\n\n"
-                        "Check `/airdrops` for other available airdrops.",
+                        f"ℹ️ **Already Claimed**\n\n"
+                        f"You have already claimed this airdrop.\n\n"
+                        f"**Status:** {status_text}\n"
+                        f"**Claimed:** {existing_claim['claimed_at'].strftime('%Y-%m-%d %H:%M UTC')}\n\n"
+                        f"Use `/myclaims` to view all your claims.",
                         parse_mode='Markdown'
                     )
                     return
             
-            # Create claim
-            claim_id = await db.create_claim(
-                telegram_id=telegram_id,
-                airdrop_id=airdrop_id,
-                wallet_address=user['wallet_address'],
-                amount=airdrop['amount_per_claim']
-            )
-            
             if claim_id:
-                # Calculate display amount
-                amount_display = airdrop['amount_per_claim'] / (10 ** airdrop['token_decimals'])
+                airdrop = outcome['airdrop']
+                
+                # Calculate display amount (the claim's amount: allowlists set it per wallet)
+                amount_display = outcome['amount'] / (10 ** airdrop['token_decimals'])
                 
                 await query.edit_message_text(
                     f"🎉 **Claim Successful!**\n\n"
@@ -435,11 +621,12 @@ class CallbackHandlers:
                 )
             else:
                 await query.edit_message_text(
-                    "❌ **Claim Failed**\n\n"
-                    "There was an error processing your claim. Please try again later.",
+                    CLAIM_REJECTION_MESSAGES.get(reason, CLAIM_REJECTION_MESSAGES[CLAIM_ERROR]),
                     parse_mode='Markdown'
                 )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error claiming airdrop: {e}")
             await query.answer("❌ Error processing claim.", show_alert=True)
@@ -0,0 +1,110 @@
+"""
+CSV exports for MochiDrop
+Streams rows into a gzip-compressed, spooled temporary file in fixed-size chunks
+"""
+
+import io
+import os
+import csv
+import gzip
+import asyncio
+import tempfile
+from datetime import datetime
+from typing import BinaryIO, Iterable, List, Sequence, Tuple
+
+from database_new import db
+
+# Compressed output stays in memory up to this size, then spills to a temp file
+SPOOL_MAX_MEMORY = int(os.getenv('EXPORT_SPOOL_MAX_MEMORY', str(8 * 1024 * 1024)))
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '5000'))
+
+USER_EXPORT_HEADER = [
+    'Telegram ID', 'Username', 'First Name', 'Role', 'Wallet Address',
+    'Registered At', 'Total Claims'
+]
+
+
+class GzipCsvSpool:
+    """CSV writer that compresses rows into a SpooledTemporaryFile.
+
+    Rows are formatted into a small text buffer; each chunk is then gzipped
+    into the spool. Only one chunk of text is held at a time, so memory stays
+    flat however many rows are written. The async methods run the gzip/file
+    work in the default executor so the event loop isn't blocked once the
+    spool has rolled over to disk.
+    """
+
+    def __init__(self, header: Sequence[str]):
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        self._gzip = gzip.GzipFile(fileobj=self.file, mode='wb')
+        self._text = io.StringIO()
+        self._writer = csv.writer(self._text)
+        self._writer.writerow(header)
+        self.rows = 0
+
+    def _take_chunk(self) -> bytes:
+        data = self._text.getvalue().encode('utf-8')
+        self._text.seek(0)
+        self._text.truncate()
+        return data
+
+    def write_rows(self, rows: Iterable[Sequence]):
+        """Format and compress rows (blocking; for use off the event loop)"""
+        before = self._text.tell()
+        for row in rows:
+            self._writer.writerow(row)
+            self.rows += 1
+        if self._text.tell() != before:
+            self._gzip.write(self._take_chunk())
+
+    async def write_rows_async(self, rows: List[Sequence]):
+        """Format rows and compress them in the executor"""
+        for row in rows:
+            self._writer.writerow(row)
+        self.rows += len(rows)
+        data = self._take_chunk()
+        await asyncio.get_running_loop().run_in_executor(None, self._gzip.write, data)
+
+    def finish(self) -> BinaryIO:
+        """Close the gzip stream and return the spool rewound for reading (blocking).
+
+        The caller uploads the file as is and closes it afterwards, so the
+        export is never copied into a single bytes object.
+        """
+        self._gzip.write(self._take_chunk())
+        self._gzip.close()
+        self.file.seek(0)
+        return self.file
+
+    async def finish_async(self) -> BinaryIO:
+        return await asyncio.get_running_loop().run_in_executor(None, self.finish)
+
+    def close(self):
+        """Discard the spool without finishing it"""
+        self.file.close()
+
+
+def export_filename(prefix: str) -> str:
+    return f"{prefix}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv.gz"
+
+
+async def export_users_csv() -> Tuple[BinaryIO, int]:
+    """Export every user as gzip-compressed CSV; returns (file, row count), and the caller closes the file"""
+    spool = GzipCsvSpool(USER_EXPORT_HEADER)
+    batches = db.iter_user_export_rows(EXPORT_CHUNK_ROWS)
+    try:
+        async for batch in batches:
+            await spool.write_rows_async([
+                (
+                    user['telegram_id'], user['username'], user['first_name'], user['role'],
+                    user['wallet_address'], user['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
+                    user['total_claims']
+                )
+                for user in batch
+            ])
+        return await spool.finish_async(), spool.rows
+    except BaseException:
+        spool.close()
+        raise
+    finally:
+        await batches.aclose()
@@ -1,5 +1,9 @@
 -- MochiDrop Database Schema
 -- Role-based Solana Airdrop Management System
+--
+-- This is the current schema. migrate.py loads it into an empty database and
+-- marks every file in migrations/ as applied; existing databases are brought
+-- up to date by those migrations instead. Keep the two in step.
 
 -- Users table with role-based access
 CREATE TABLE users (
@@ -9,7 +13,7 @@ CREATE TABLE users (
     first_name VARCHAR(255),
     last_name VARCHAR(255),
     role VARCHAR(20) DEFAULT 'receiver' CHECK (role IN ('admin', 'receiver')),
-    wallet_address VARCHAR(44), -- Solana wallet address (base58)
+    wallet_address BYTEA CHECK (octet_length(wallet_address) = 32), -- Solana wallet address (raw 32 bytes)
     is_active BOOLEAN DEFAULT true,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -29,33 +33,55 @@ CREATE TABLE airdrops (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
     description TEXT,
-    token_mint VARCHAR(44) NOT NULL, -- SPL token mint address
+    token_mint BYTEA NOT NULL CHECK (octet_length(token_mint) = 32), -- SPL token mint address (raw 32 bytes)
     token_symbol VARCHAR(10),
     token_decimals INTEGER DEFAULT 9,
     total_amount BIGINT NOT NULL, -- Total tokens allocated (in smallest unit)
     amount_per_claim BIGINT NOT NULL, -- Tokens per user claim
     max_claims INTEGER, -- Maximum number of claims allowed
     current_claims INTEGER DEFAULT 0,
-    admin_wallet VARCHAR(44) NOT NULL, -- Admin wallet funding the airdrop
+    admin_wallet BYTEA CHECK (octet_length(admin_wallet) = 32), -- Admin wallet funding the airdrop (raw 32 bytes)
     status VARCHAR(20) DEFAULT 'active' CHECK (status IN ('draft', 'active', 'paused', 'completed', 'cancelled')),
     start_date TIMESTAMP,
     end_date TIMESTAMP,
     created_by BIGINT REFERENCES users(telegram_id),
+    allowlist_only BOOLEAN NOT NULL DEFAULT false, -- Only wallets in airdrop_allowlist may claim
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- User claims tracking
+-- Per-airdrop allowlists, bulk-loaded with COPY (see allowlist.py). Claims on
+-- an allowlist_only airdrop check the user's wallet here by primary key.
+CREATE TABLE airdrop_allowlist (
+    airdrop_id INTEGER NOT NULL REFERENCES airdrops(id) ON DELETE CASCADE,
+    wallet_address BYTEA NOT NULL CHECK (octet_length(wallet_address) = 32), -- Allowed wallet (raw 32 bytes)
+    amount BIGINT CHECK (amount > 0), -- Per-wallet claim amount (NULL = airdrop's amount_per_claim)
+    PRIMARY KEY (airdrop_id, wallet_address)
+);
+
+-- User claims tracking, partitioned by airdrop_id range (see ensure_claims_partition)
 CREATE TABLE claims (
-    id SERIAL PRIMARY KEY,
-    airdrop_id INTEGER REFERENCES airdrops(id),
+    id SERIAL,
+    airdrop_id INTEGER NOT NULL REFERENCES airdrops(id),
     user_id BIGINT REFERENCES users(telegram_id),
     amount BIGINT NOT NULL, -- Amount claimed (in smallest unit)
-    transaction_signature VARCHAR(88), -- Solana transaction signature
+    transaction_signature BYTEA CHECK (octet_length(transaction_signature) = 64), -- Solana transaction signature (raw 64 bytes)
     status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'completed', 'failed')),
     claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     processed_at TIMESTAMP,
+    PRIMARY KEY (id, airdrop_id),
     UNIQUE(airdrop_id, user_id) -- One claim per user per airdrop
+) PARTITION BY RANGE (airdrop_id);
+
+-- Sharded claim counters: each airdrop's claim slots are split across
+-- several rows so concurrent claimers don't queue on the airdrops row.
+-- airdrops.current_claims is rolled up from these periodically.
+CREATE TABLE airdrop_claim_counters (
+    airdrop_id INTEGER REFERENCES airdrops(id),
+    shard SMALLINT NOT NULL,
+    claims INTEGER NOT NULL DEFAULT 0,
+    capacity INTEGER, -- Slots assigned to this shard (NULL = unlimited)
+    PRIMARY KEY (airdrop_id, shard)
 );
 
 -- Admin wallets for airdrop management
@@ -69,29 +95,212 @@ CREATE TABLE admin_wallets (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Transaction logs for audit trail
+-- Transaction logs for audit trail, partitioned by month
 CREATE TABLE transaction_logs (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     airdrop_id INTEGER REFERENCES airdrops(id),
-    claim_id INTEGER REFERENCES claims(id),
-    from_wallet VARCHAR(44),
-    to_wallet VARCHAR(44),
+    claim_id INTEGER, -- claims.id (not a foreign key: logs outlive archived claim partitions)
+    from_wallet BYTEA, -- Raw 32-byte addresses
+    to_wallet BYTEA,
     amount BIGINT,
-    transaction_signature VARCHAR(88),
+    transaction_signature BYTEA, -- Raw 64-byte signature
     status VARCHAR(20) DEFAULT 'pending',
     error_message TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Claims are partitioned by airdrop_id range, so UNIQUE(airdrop_id, user_id)
+-- still holds and every per-airdrop query (the claim statement, claim lookups)
+-- touches a single partition. Each partition holds this many airdrops.
+CREATE OR REPLACE FUNCTION claims_partition_size()
+RETURNS INTEGER AS $$
+    SELECT 100;
+$$ language 'sql' IMMUTABLE;
+
+-- Create the claims partition covering an airdrop (called when it is created,
+-- and when an airdrop becomes claimable again), re-attaching it if it was
+-- detached for archiving. Serialized per range so concurrent callers don't race.
+CREATE OR REPLACE FUNCTION ensure_claims_partition(p_airdrop_id INTEGER)
+RETURNS TEXT AS $$
+DECLARE
+    range_start INTEGER := (p_airdrop_id / claims_partition_size()) * claims_partition_size();
+    partition_name TEXT := format('claims_a%s', range_start);
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_inherits
+        WHERE inhrelid = to_regclass(partition_name) AND inhparent = 'claims'::regclass
+    ) THEN
+        PERFORM pg_advisory_xact_lock(hashtext('claims_partition'), range_start);
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF claims FOR VALUES FROM (%s) TO (%s)',
+                partition_name, range_start, range_start + claims_partition_size()
+            );
+        ELSIF NOT EXISTS (
+            SELECT 1 FROM pg_inherits
+            WHERE inhrelid = to_regclass(partition_name) AND inhparent = 'claims'::regclass
+        ) THEN
+            EXECUTE format(
+                'ALTER TABLE claims ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)',
+                partition_name, range_start, range_start + claims_partition_size()
+            );
+        END IF;
+    END IF;
+    RETURN partition_name;
+END;
+$$ language 'plpgsql';
+
+-- Create monthly transaction_logs partitions from the current month through
+-- months_ahead months ahead
+CREATE OR REPLACE FUNCTION ensure_transaction_log_partitions(months_ahead INTEGER)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    month_start TIMESTAMP;
+    partition_name TEXT;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(date_trunc('month', LOCALTIMESTAMP),
+                               date_trunc('month', LOCALTIMESTAMP) + make_interval(months => months_ahead),
+                               INTERVAL '1 month')
+    LOOP
+        partition_name := format('transaction_logs_%s', to_char(month_start, 'YYYYMM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF transaction_logs FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_start + INTERVAL '1 month'
+            );
+            RETURN NEXT partition_name;
+        END IF;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+-- Detach transaction_logs partitions whose month ended before cutoff. The
+-- detached tables keep their data for archiving (pg_dump -t <name>) and
+-- dropping; returns their names.
+CREATE OR REPLACE FUNCTION detach_transaction_log_partitions(cutoff TIMESTAMP)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    partition_name TEXT;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'transaction_logs'::regclass
+        AND c.relname ~ '^transaction_logs_\d{6}$'
+        AND to_timestamp(substring(c.relname FROM '\d{6}$'), 'YYYYMM')::TIMESTAMP + INTERVAL '1 month' <= cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE transaction_logs DETACH PARTITION %I', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ language 'plpgsql';
 
--- Indexes for performance
-CREATE INDEX idx_users_telegram_id ON users(telegram_id);
-CREATE INDEX idx_users_role ON users(role);
-CREATE INDEX idx_airdrops_status ON airdrops(status);
+-- Detach claims partitions whose whole airdrop range is allocated and every
+-- airdrop in it was completed or cancelled before cutoff. Airdrops that are
+-- merely past their end date keep their partition, since they can still be
+-- extended or reactivated. The range's airdrops are row-locked first, so a
+-- concurrent status change either lands before the check or waits for the
+-- detach and then re-attaches the partition (see claims_partition_on_reopen).
+-- Rollups and claim summaries keep their totals; returns the detached names.
+CREATE OR REPLACE FUNCTION detach_claims_partitions(cutoff TIMESTAMP)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    range_start INTEGER;
+    partition_name TEXT;
+BEGIN
+    FOR partition_name, range_start IN
+        SELECT c.relname, substring(c.relname FROM '\d+$')::INTEGER
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'claims'::regclass
+        AND c.relname ~ '^claims_a\d+$'
+        ORDER BY 2
+    LOOP
+        CONTINUE WHEN (SELECT COALESCE(MAX(id), 0) FROM airdrops) < range_start + claims_partition_size();
+        -- Row locks before the range lock: an UPDATE holds its row while
+        -- the reopen trigger takes the range lock, so the reverse could deadlock
+        PERFORM 1 FROM airdrops
+        WHERE id >= range_start AND id < range_start + claims_partition_size()
+        FOR SHARE;
+        PERFORM pg_advisory_xact_lock(hashtext('claims_partition'), range_start);
+        CONTINUE WHEN EXISTS (
+            SELECT 1 FROM airdrops
+            WHERE id >= range_start AND id < range_start + claims_partition_size()
+            AND NOT (status IN ('completed', 'cancelled') AND updated_at < cutoff)
+        );
+        EXECUTE format('ALTER TABLE claims DETACH PARTITION %I', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+-- An airdrop leaving completed/cancelled needs its claims partition back
+CREATE OR REPLACE FUNCTION claims_partition_on_reopen()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM ensure_claims_partition(NEW.id);
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+SELECT ensure_transaction_log_partitions(3);
+
+-- Indexes for performance (UNIQUE columns already have their own index)
+CREATE INDEX idx_users_role_created_at ON users(role, created_at DESC);
+CREATE INDEX idx_airdrops_status_window ON airdrops(status, start_date, end_date);
 CREATE INDEX idx_airdrops_created_by ON airdrops(created_by);
-CREATE INDEX idx_claims_airdrop_user ON claims(airdrop_id, user_id);
-CREATE INDEX idx_claims_status ON claims(status);
+CREATE INDEX idx_claims_user_history ON claims(user_id, claimed_at DESC, id DESC);
+CREATE INDEX idx_claims_pending ON claims(claimed_at, id) WHERE status = 'pending';
 CREATE INDEX idx_admin_sessions_telegram_id ON admin_sessions(telegram_id);
-CREATE INDEX idx_admin_sessions_token ON admin_sessions(session_token);
+CREATE INDEX idx_admin_wallets_active ON admin_wallets(telegram_id) WHERE is_active;
+CREATE UNIQUE INDEX idx_users_wallet_address ON users(wallet_address) WHERE wallet_address IS NOT NULL;
+CREATE INDEX idx_claims_transaction_signature ON claims(transaction_signature) WHERE transaction_signature IS NOT NULL;
+CREATE INDEX idx_transaction_logs_signature ON transaction_logs(transaction_signature) WHERE transaction_signature IS NOT NULL;
+
+-- Base58 (Bitcoin/Solana alphabet) to raw bytes, for backfills and ad-hoc
+-- lookups such as WHERE wallet_address = base58_decode('...')
+CREATE OR REPLACE FUNCTION base58_decode(encoded TEXT)
+RETURNS BYTEA AS $$
+DECLARE
+    alphabet CONSTANT TEXT := '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz';
+    num NUMERIC := 0;
+    digit INTEGER;
+    result BYTEA := '';
+    leading_zeros INTEGER := 0;
+BEGIN
+    FOR i IN 1..length(encoded) LOOP
+        digit := strpos(alphabet, substr(encoded, i, 1)) - 1;
+        IF digit < 0 THEN
+            RAISE EXCEPTION 'invalid base58 string: %', encoded;
+        END IF;
+        num := num * 58 + digit;
+    END LOOP;
+    WHILE num > 0 LOOP
+        result := decode(lpad(to_hex(mod(num, 256)::INTEGER), 2, '0'), 'hex') || result;
+        num := div(num, 256);
+    END LOOP;
+    WHILE leading_zeros < length(encoded) AND substr(encoded, leading_zeros + 1, 1) = '1' LOOP
+        leading_zeros := leading_zeros + 1;
+    END LOOP;
+    RETURN decode(repeat('00', leading_zeros), 'hex') || result;
+END;
+$$ language 'plpgsql' IMMUTABLE STRICT;
+
+-- base58_decode that returns NULL for invalid input or the wrong length
+CREATE OR REPLACE FUNCTION try_base58_decode(encoded TEXT, expected_length INTEGER)
+RETURNS BYTEA AS $$
+DECLARE
+    result BYTEA;
+BEGIN
+    result := base58_decode(encoded);
+    RETURN CASE WHEN octet_length(result) = expected_length THEN result END;
+EXCEPTION WHEN raise_exception THEN
+    RETURN NULL;
+END;
+$$ language 'plpgsql' IMMUTABLE STRICT;
 
 -- Triggers for updated_at timestamps
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -106,4 +315,201 @@ CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 CREATE TRIGGER update_airdrops_updated_at BEFORE UPDATE ON airdrops
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
\ No newline at end of file
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Rollup tables kept current by triggers, so dashboards read a handful of
+-- rows instead of counting whole tables. Counters written on every insert
+-- are spread over 8 shard rows (row id % 8) so concurrent inserts don't all
+-- lock the same rollup row; readers SUM across shards.
+CREATE TABLE user_rollups (
+    role VARCHAR(20) NOT NULL,
+    shard SMALLINT NOT NULL,
+    total BIGINT NOT NULL DEFAULT 0,
+    with_wallet BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (role, shard)
+);
+
+CREATE TABLE airdrop_status_rollups (
+    status VARCHAR(20) PRIMARY KEY,
+    total BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE claim_rollups (
+    airdrop_id INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    shard SMALLINT NOT NULL,
+    claims BIGINT NOT NULL DEFAULT 0,
+    amount BIGINT NOT NULL DEFAULT 0, -- Sum of claim amounts (in smallest unit)
+    PRIMARY KEY (airdrop_id, status, shard)
+);
+
+CREATE TABLE activity_hourly (
+    bucket TIMESTAMP NOT NULL, -- Start of the hour
+    shard SMALLINT NOT NULL,
+    new_users BIGINT NOT NULL DEFAULT 0, -- Receivers registered in this hour
+    claims BIGINT NOT NULL DEFAULT 0, -- Claims made in this hour
+    PRIMARY KEY (bucket, shard)
+);
+
+-- Per-user claim totals by token, so /myclaims can show a summary without
+-- scanning the user's whole history
+CREATE TABLE user_claim_summaries (
+    user_id BIGINT NOT NULL,
+    token_mint BYTEA NOT NULL,
+    token_symbol VARCHAR(20),
+    claims BIGINT NOT NULL DEFAULT 0,
+    amount BIGINT NOT NULL DEFAULT 0, -- Sum of claim amounts (in smallest unit)
+    PRIMARY KEY (user_id, token_mint)
+);
+
+CREATE OR REPLACE FUNCTION rollup_users()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO user_rollups (role, shard, total, with_wallet)
+        VALUES (OLD.role, OLD.id % 8, -1, CASE WHEN OLD.wallet_address IS NOT NULL THEN -1 ELSE 0 END)
+        ON CONFLICT (role, shard) DO UPDATE SET
+            total = user_rollups.total + EXCLUDED.total,
+            with_wallet = user_rollups.with_wallet + EXCLUDED.with_wallet;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO user_rollups (role, shard, total, with_wallet)
+        VALUES (NEW.role, NEW.id % 8, 1, CASE WHEN NEW.wallet_address IS NOT NULL THEN 1 ELSE 0 END)
+        ON CONFLICT (role, shard) DO UPDATE SET
+            total = user_rollups.total + EXCLUDED.total,
+            with_wallet = user_rollups.with_wallet + EXCLUDED.with_wallet;
+    END IF;
+    IF TG_OP = 'INSERT' AND NEW.role = 'receiver' THEN
+        INSERT INTO activity_hourly (bucket, shard, new_users)
+        VALUES (date_trunc('hour', NEW.created_at), NEW.id % 8, 1)
+        ON CONFLICT (bucket, shard) DO UPDATE SET new_users = activity_hourly.new_users + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION rollup_airdrops()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE airdrop_status_rollups SET total = total - 1 WHERE status = OLD.status;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO airdrop_status_rollups (status, total) VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET total = airdrop_status_rollups.total + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION rollup_claims()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO claim_rollups (airdrop_id, status, shard, claims, amount)
+        VALUES (OLD.airdrop_id, OLD.status, OLD.id % 8, -1, -OLD.amount)
+        ON CONFLICT (airdrop_id, status, shard) DO UPDATE SET
+            claims = claim_rollups.claims + EXCLUDED.claims,
+            amount = claim_rollups.amount + EXCLUDED.amount;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO claim_rollups (airdrop_id, status, shard, claims, amount)
+        VALUES (NEW.airdrop_id, NEW.status, NEW.id % 8, 1, NEW.amount)
+        ON CONFLICT (airdrop_id, status, shard) DO UPDATE SET
+            claims = claim_rollups.claims + EXCLUDED.claims,
+            amount = claim_rollups.amount + EXCLUDED.amount;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO activity_hourly (bucket, shard, claims)
+        VALUES (date_trunc('hour', NEW.claimed_at), NEW.id % 8, 1)
+        ON CONFLICT (bucket, shard) DO UPDATE SET claims = activity_hourly.claims + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION summarize_user_claims()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE user_claim_summaries s SET claims = s.claims - 1, amount = s.amount - OLD.amount
+        FROM airdrops a
+        WHERE a.id = OLD.airdrop_id AND s.user_id = OLD.user_id AND s.token_mint = a.token_mint;
+    ELSE
+        INSERT INTO user_claim_summaries (user_id, token_mint, token_symbol, claims, amount)
+        SELECT NEW.user_id, a.token_mint, a.token_symbol, 1, NEW.amount
+        FROM airdrops a WHERE a.id = NEW.airdrop_id
+        ON CONFLICT (user_id, token_mint) DO UPDATE SET
+            claims = user_claim_summaries.claims + 1,
+            amount = user_claim_summaries.amount + EXCLUDED.amount;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER rollup_users_insert_delete AFTER INSERT OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION rollup_users();
+
+CREATE TRIGGER rollup_users_update AFTER UPDATE OF role, wallet_address ON users
+    FOR EACH ROW
+    WHEN (OLD.role IS DISTINCT FROM NEW.role
+          OR (OLD.wallet_address IS NULL) <> (NEW.wallet_address IS NULL))
+    EXECUTE FUNCTION rollup_users();
+
+CREATE TRIGGER rollup_airdrops_insert_delete AFTER INSERT OR DELETE ON airdrops
+    FOR EACH ROW EXECUTE FUNCTION rollup_airdrops();
+
+CREATE TRIGGER rollup_airdrops_update AFTER UPDATE OF status ON airdrops
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION rollup_airdrops();
+
+CREATE TRIGGER claims_partition_on_reopen AFTER UPDATE OF status ON airdrops
+    FOR EACH ROW
+    WHEN (NEW.status NOT IN ('completed', 'cancelled') AND OLD.status IN ('completed', 'cancelled'))
+    EXECUTE FUNCTION claims_partition_on_reopen();
+
+CREATE TRIGGER rollup_claims_insert_delete AFTER INSERT OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION rollup_claims();
+
+CREATE TRIGGER rollup_claims_update AFTER UPDATE OF status, amount ON claims
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.amount IS DISTINCT FROM NEW.amount)
+    EXECUTE FUNCTION rollup_claims();
+
+CREATE TRIGGER summarize_user_claims_insert_delete AFTER INSERT OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION summarize_user_claims();
+
+-- Rebuild every rollup from the base tables (backfill or repair):
+--   SELECT refresh_rollups();
+CREATE OR REPLACE FUNCTION refresh_rollups()
+RETURNS void AS $$
+BEGIN
+    LOCK TABLE users, airdrops, claims IN SHARE MODE;
+    TRUNCATE user_rollups, airdrop_status_rollups, claim_rollups, activity_hourly, user_claim_summaries;
+
+    INSERT INTO user_rollups (role, shard, total, with_wallet)
+    SELECT role, id % 8, COUNT(*), COUNT(wallet_address)
+    FROM users GROUP BY role, id % 8;
+
+    INSERT INTO airdrop_status_rollups (status, total)
+    SELECT status, COUNT(*) FROM airdrops GROUP BY status;
+
+    INSERT INTO claim_rollups (airdrop_id, status, shard, claims, amount)
+    SELECT airdrop_id, status, id % 8, COUNT(*), COALESCE(SUM(amount), 0)
+    FROM claims GROUP BY airdrop_id, status, id % 8;
+
+    INSERT INTO activity_hourly (bucket, shard, new_users, claims)
+    SELECT bucket, shard, SUM(new_users), SUM(claims)
+    FROM (
+        SELECT date_trunc('hour', created_at) AS bucket, id % 8 AS shard, 1 AS new_users, 0 AS claims
+        FROM users WHERE role = 'receiver'
+        UNION ALL
+        SELECT date_trunc('hour', claimed_at), id % 8, 0, 1 FROM claims
+    ) activity
+    GROUP BY bucket, shard;
+
+    INSERT INTO user_claim_summaries (user_id, token_mint, token_symbol, claims, amount)
+    SELECT c.user_id, a.token_mint, MAX(a.token_symbol), COUNT(*), COALESCE(SUM(c.amount), 0)
+    FROM claims c JOIN airdrops a ON a.id = c.airdrop_id
+    GROUP BY c.user_id, a.token_mint;
+END;
+$$ language 'plpgsql';
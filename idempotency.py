@@ -0,0 +1,85 @@
+"""
+Idempotent requests for MochiDrop
+Collapses duplicate submissions of the same operation into one execution
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class IdempotentRequests:
+    """Runs each idempotency key's operation once and shares the result.
+
+    A request whose key is already running waits on the same future instead of
+    starting new work. Once it finishes, the result is cached for window
+    seconds, so later duplicates get it straight from memory. Failures are
+    passed to every waiter but not cached, and neither is a result rejected by
+    the cache predicate, so a retry after either runs the operation again.
+    """
+
+    def __init__(self, window: float = 30.0, max_size: int = 10000):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._results = TTLCache(max_size=max_size, ttl=window)
+        self.executed = 0
+        self.joined = 0
+        self.cached = 0
+
+    async def run(self, key: Hashable, operation: Callable[[], Awaitable[Any]],
+                  cache: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, bool]:
+        """Return (result, duplicate); duplicate is True if another request did the work"""
+        result = self._results.get(key, _MISSING)
+        if result is not _MISSING:
+            self.cached += 1
+            return result, True
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.joined += 1
+            # shield: a cancelled duplicate must not cancel the shared operation
+            return await asyncio.shield(pending), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self.executed += 1
+        try:
+            result = await operation()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when no duplicate was waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if cache is None or cache(result):
+                self._results.set(key, result)
+            return result, False
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return in-flight count and executed/joined/cached counters"""
+        return {
+            'in_flight': len(self._in_flight),
+            'executed': self.executed,
+            'joined': self.joined,
+            'cached': self.cached,
+            'results': len(self._results)
+        }
+
+
+# Claim submissions, keyed on (user, airdrop)
+claim_requests = IdempotentRequests(
+    window=float(os.getenv('CLAIM_IDEMPOTENCY_WINDOW', '30')),
+    max_size=int(os.getenv('CLAIM_IDEMPOTENCY_CACHE_SIZE', '10000'))
+)
@@ -0,0 +1,215 @@
+-- Sharded claim counters, dashboard rollups and per-user claim summaries.
+-- Databases created from the original one-shot schema get these tables here;
+-- everything is re-runnable, and the rollups are backfilled at the end.
+
+-- Sharded claim counters: each airdrop's claim slots are split across
+-- several rows so concurrent claimers don't queue on the airdrops row.
+-- airdrops.current_claims is rolled up from these periodically.
+CREATE TABLE IF NOT EXISTS airdrop_claim_counters (
+    airdrop_id INTEGER REFERENCES airdrops(id),
+    shard SMALLINT NOT NULL,
+    claims INTEGER NOT NULL DEFAULT 0,
+    capacity INTEGER, -- Slots assigned to this shard (NULL = unlimited)
+    PRIMARY KEY (airdrop_id, shard)
+);
+
+-- Rollup tables kept current by triggers, so dashboards read a handful of
+-- rows instead of counting whole tables. Counters written on every insert
+-- are spread over 8 shard rows (row id % 8) so concurrent inserts don't all
+-- lock the same rollup row; readers SUM across shards.
+CREATE TABLE IF NOT EXISTS user_rollups (
+    role VARCHAR(20) NOT NULL,
+    shard SMALLINT NOT NULL,
+    total BIGINT NOT NULL DEFAULT 0,
+    with_wallet BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (role, shard)
+);
+
+CREATE TABLE IF NOT EXISTS airdrop_status_rollups (
+    status VARCHAR(20) PRIMARY KEY,
+    total BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS claim_rollups (
+    airdrop_id INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    shard SMALLINT NOT NULL,
+    claims BIGINT NOT NULL DEFAULT 0,
+    amount BIGINT NOT NULL DEFAULT 0, -- Sum of claim amounts (in smallest unit)
+    PRIMARY KEY (airdrop_id, status, shard)
+);
+
+CREATE TABLE IF NOT EXISTS activity_hourly (
+    bucket TIMESTAMP NOT NULL, -- Start of the hour
+    shard SMALLINT NOT NULL,
+    new_users BIGINT NOT NULL DEFAULT 0, -- Receivers registered in this hour
+    claims BIGINT NOT NULL DEFAULT 0, -- Claims made in this hour
+    PRIMARY KEY (bucket, shard)
+);
+
+-- Per-user claim totals by token, so /myclaims can show a summary without
+-- scanning the user's whole history
+CREATE TABLE IF NOT EXISTS user_claim_summaries (
+    user_id BIGINT NOT NULL,
+    token_mint VARCHAR(44) NOT NULL,
+    token_symbol VARCHAR(20),
+    claims BIGINT NOT NULL DEFAULT 0,
+    amount BIGINT NOT NULL DEFAULT 0, -- Sum of claim amounts (in smallest unit)
+    PRIMARY KEY (user_id, token_mint)
+);
+
+CREATE OR REPLACE FUNCTION rollup_users()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO user_rollups (role, shard, total, with_wallet)
+        VALUES (OLD.role, OLD.id % 8, -1, CASE WHEN OLD.wallet_address IS NOT NULL THEN -1 ELSE 0 END)
+        ON CONFLICT (role, shard) DO UPDATE SET
+            total = user_rollups.total + EXCLUDED.total,
+            with_wallet = user_rollups.with_wallet + EXCLUDED.with_wallet;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO user_rollups (role, shard, total, with_wallet)
+        VALUES (NEW.role, NEW.id % 8, 1, CASE WHEN NEW.wallet_address IS NOT NULL THEN 1 ELSE 0 END)
+        ON CONFLICT (role, shard) DO UPDATE SET
+            total = user_rollups.total + EXCLUDED.total,
+            with_wallet = user_rollups.with_wallet + EXCLUDED.with_wallet;
+    END IF;
+    IF TG_OP = 'INSERT' AND NEW.role = 'receiver' THEN
+        INSERT INTO activity_hourly (bucket, shard, new_users)
+        VALUES (date_trunc('hour', NEW.created_at), NEW.id % 8, 1)
+        ON CONFLICT (bucket, shard) DO UPDATE SET new_users = activity_hourly.new_users + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION rollup_airdrops()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE airdrop_status_rollups SET total = total - 1 WHERE status = OLD.status;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO airdrop_status_rollups (status, total) VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET total = airdrop_status_rollups.total + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION rollup_claims()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO claim_rollups (airdrop_id, status, shard, claims, amount)
+        VALUES (OLD.airdrop_id, OLD.status, OLD.id % 8, -1, -OLD.amount)
+        ON CONFLICT (airdrop_id, status, shard) DO UPDATE SET
+            claims = claim_rollups.claims + EXCLUDED.claims,
+            amount = claim_rollups.amount + EXCLUDED.amount;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO claim_rollups (airdrop_id, status, shard, claims, amount)
+        VALUES (NEW.airdrop_id, NEW.status, NEW.id % 8, 1, NEW.amount)
+        ON CONFLICT (airdrop_id, status, shard) DO UPDATE SET
+            claims = claim_rollups.claims + EXCLUDED.claims,
+            amount = claim_rollups.amount + EXCLUDED.amount;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO activity_hourly (bucket, shard, claims)
+        VALUES (date_trunc('hour', NEW.claimed_at), NEW.id % 8, 1)
+        ON CONFLICT (bucket, shard) DO UPDATE SET claims = activity_hourly.claims + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION summarize_user_claims()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE user_claim_summaries s SET claims = s.claims - 1, amount = s.amount - OLD.amount
+        FROM airdrops a
+        WHERE a.id = OLD.airdrop_id AND s.user_id = OLD.user_id AND s.token_mint = a.token_mint;
+    ELSE
+        INSERT INTO user_claim_summaries (user_id, token_mint, token_symbol, claims, amount)
+        SELECT NEW.user_id, a.token_mint, a.token_symbol, 1, NEW.amount
+        FROM airdrops a WHERE a.id = NEW.airdrop_id
+        ON CONFLICT (user_id, token_mint) DO UPDATE SET
+            claims = user_claim_summaries.claims + 1,
+            amount = user_claim_summaries.amount + EXCLUDED.amount;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS rollup_users_insert_delete ON users;
+CREATE TRIGGER rollup_users_insert_delete AFTER INSERT OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION rollup_users();
+
+DROP TRIGGER IF EXISTS rollup_users_update ON users;
+CREATE TRIGGER rollup_users_update AFTER UPDATE OF role, wallet_address ON users
+    FOR EACH ROW
+    WHEN (OLD.role IS DISTINCT FROM NEW.role
+          OR (OLD.wallet_address IS NULL) <> (NEW.wallet_address IS NULL))
+    EXECUTE FUNCTION rollup_users();
+
+DROP TRIGGER IF EXISTS rollup_airdrops_insert_delete ON airdrops;
+CREATE TRIGGER rollup_airdrops_insert_delete AFTER INSERT OR DELETE ON airdrops
+    FOR EACH ROW EXECUTE FUNCTION rollup_airdrops();
+
+DROP TRIGGER IF EXISTS rollup_airdrops_update ON airdrops;
+CREATE TRIGGER rollup_airdrops_update AFTER UPDATE OF status ON airdrops
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION rollup_airdrops();
+
+DROP TRIGGER IF EXISTS rollup_claims_insert_delete ON claims;
+CREATE TRIGGER rollup_claims_insert_delete AFTER INSERT OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION rollup_claims();
+
+DROP TRIGGER IF EXISTS rollup_claims_update ON claims;
+CREATE TRIGGER rollup_claims_update AFTER UPDATE OF status, amount ON claims
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.amount IS DISTINCT FROM NEW.amount)
+    EXECUTE FUNCTION rollup_claims();
+
+DROP TRIGGER IF EXISTS summarize_user_claims_insert_delete ON claims;
+CREATE TRIGGER summarize_user_claims_insert_delete AFTER INSERT OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION summarize_user_claims();
+
+-- Rebuild every rollup from the base tables (backfill or repair):
+--   SELECT refresh_rollups();
+CREATE OR REPLACE FUNCTION refresh_rollups()
+RETURNS void AS $$
+BEGIN
+    LOCK TABLE users, airdrops, claims IN SHARE MODE;
+    TRUNCATE user_rollups, airdrop_status_rollups, claim_rollups, activity_hourly, user_claim_summaries;
+
+    INSERT INTO user_rollups (role, shard, total, with_wallet)
+    SELECT role, id % 8, COUNT(*), COUNT(wallet_address)
+    FROM users GROUP BY role, id % 8;
+
+    INSERT INTO airdrop_status_rollups (status, total)
+    SELECT status, COUNT(*) FROM airdrops GROUP BY status;
+
+    INSERT INTO claim_rollups (airdrop_id, status, shard, claims, amount)
+    SELECT airdrop_id, status, id % 8, COUNT(*), COALESCE(SUM(amount), 0)
+    FROM claims GROUP BY airdrop_id, status, id % 8;
+
+    INSERT INTO activity_hourly (bucket, shard, new_users, claims)
+    SELECT bucket, shard, SUM(new_users), SUM(claims)
+    FROM (
+        SELECT date_trunc('hour', created_at) AS bucket, id % 8 AS shard, 1 AS new_users, 0 AS claims
+        FROM users WHERE role = 'receiver'
+        UNION ALL
+        SELECT date_trunc('hour', claimed_at), id % 8, 0, 1 FROM claims
+    ) activity
+    GROUP BY bucket, shard;
+
+    INSERT INTO user_claim_summaries (user_id, token_mint, token_symbol, claims, amount)
+    SELECT c.user_id, a.token_mint, MAX(a.token_symbol), COUNT(*), COALESCE(SUM(c.amount), 0)
+    FROM claims c JOIN airdrops a ON a.id = c.airdrop_id
+    GROUP BY c.user_id, a.token_mint;
+END;
+$$ language 'plpgsql';
+
+SELECT refresh_rollups();
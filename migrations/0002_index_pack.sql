@@ -0,0 +1,28 @@
+-- migrate: no-transaction
+-- Indexes for the queries the bot actually issues, built CONCURRENTLY so a
+-- running bot keeps reading and writing while they build. Each statement is
+-- run on its own; all of them are safe to re-run.
+
+-- users.telegram_id and claims(airdrop_id, user_id) are already UNIQUE, and
+-- admin_sessions.session_token is UNIQUE, so these only slow down writes
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_telegram_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_claims_airdrop_user;
+DROP INDEX CONCURRENTLY IF EXISTS idx_admin_sessions_token;
+
+-- /myclaims history pages: WHERE user_id = $1 ORDER BY claimed_at DESC, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_claims_user_history ON claims(user_id, claimed_at DESC, id DESC);
+
+-- Pending claims queue, oldest first; replaces the low-selectivity status index
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_claims_pending ON claims(claimed_at, id) WHERE status = 'pending';
+DROP INDEX CONCURRENTLY IF EXISTS idx_claims_status;
+
+-- Active airdrop catalog: WHERE status = 'active' AND start/end window
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_airdrops_status_window ON airdrops(status, start_date, end_date);
+DROP INDEX CONCURRENTLY IF EXISTS idx_airdrops_status;
+
+-- Admin user list: WHERE role = 'receiver' ORDER BY created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_role_created_at ON users(role, created_at DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_role;
+
+-- Admin wallet lookups: WHERE telegram_id = $1 AND is_active = true
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_admin_wallets_active ON admin_wallets(telegram_id) WHERE is_active;
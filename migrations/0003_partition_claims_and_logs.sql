@@ -0,0 +1,218 @@
+-- Partition claims by airdrop_id range and transaction_logs by month.
+-- Both tables are rebuilt and copied, holding an exclusive lock on them while
+-- it runs, so apply this with the bot stopped on databases with large history.
+
+-- Claims are partitioned by airdrop_id range, so UNIQUE(airdrop_id, user_id)
+-- still holds and every per-airdrop query (the claim statement, claim lookups)
+-- touches a single partition. Each partition holds this many airdrops.
+CREATE OR REPLACE FUNCTION claims_partition_size()
+RETURNS INTEGER AS $$
+    SELECT 100;
+$$ language 'sql' IMMUTABLE;
+
+-- Create the claims partition covering an airdrop (called when it is created)
+CREATE OR REPLACE FUNCTION ensure_claims_partition(p_airdrop_id INTEGER)
+RETURNS TEXT AS $$
+DECLARE
+    range_start INTEGER := (p_airdrop_id / claims_partition_size()) * claims_partition_size();
+    partition_name TEXT := format('claims_a%s', range_start);
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF claims FOR VALUES FROM (%s) TO (%s)',
+            partition_name, range_start, range_start + claims_partition_size()
+        );
+    END IF;
+    RETURN partition_name;
+END;
+$$ language 'plpgsql';
+
+-- Create monthly transaction_logs partitions from the current month through
+-- months_ahead months ahead
+CREATE OR REPLACE FUNCTION ensure_transaction_log_partitions(months_ahead INTEGER)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    month_start TIMESTAMP;
+    partition_name TEXT;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(date_trunc('month', LOCALTIMESTAMP),
+                               date_trunc('month', LOCALTIMESTAMP) + make_interval(months => months_ahead),
+                               INTERVAL '1 month')
+    LOOP
+        partition_name := format('transaction_logs_%s', to_char(month_start, 'YYYYMM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF transaction_logs FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_start + INTERVAL '1 month'
+            );
+            RETURN NEXT partition_name;
+        END IF;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+-- Detach transaction_logs partitions whose month ended before cutoff. The
+-- detached tables keep their data for archiving (pg_dump -t <name>) and
+-- dropping; returns their names.
+CREATE OR REPLACE FUNCTION detach_transaction_log_partitions(cutoff TIMESTAMP)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    partition_name TEXT;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'transaction_logs'::regclass
+        AND c.relname ~ '^transaction_logs_\d{6}$'
+        AND to_timestamp(substring(c.relname FROM '\d{6}$'), 'YYYYMM')::TIMESTAMP + INTERVAL '1 month' <= cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE transaction_logs DETACH PARTITION %I', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+-- Detach claims partitions whose whole airdrop range is allocated and every
+-- airdrop in it finished (completed/cancelled, or ended) before cutoff.
+-- Rollups and claim summaries keep their totals; returns the detached names.
+CREATE OR REPLACE FUNCTION detach_claims_partitions(cutoff TIMESTAMP)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    range_start INTEGER;
+    partition_name TEXT;
+BEGIN
+    FOR partition_name, range_start IN
+        SELECT c.relname, substring(c.relname FROM '\d+$')::INTEGER
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'claims'::regclass
+        AND c.relname ~ '^claims_a\d+$'
+        ORDER BY 2
+    LOOP
+        CONTINUE WHEN (SELECT COALESCE(MAX(id), 0) FROM airdrops) < range_start + claims_partition_size();
+        CONTINUE WHEN EXISTS (
+            SELECT 1 FROM airdrops
+            WHERE id >= range_start AND id < range_start + claims_partition_size()
+            AND NOT (
+                (status IN ('completed', 'cancelled') AND updated_at < cutoff)
+                OR end_date < cutoff
+            )
+        );
+        EXECUTE format('ALTER TABLE claims DETACH PARTITION %I', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+-- claims ----------------------------------------------------------------
+-- The partition key is airdrop_id, which the old table allowed to be NULL.
+-- A claim with no airdrop (or one whose airdrop is gone) has no partition to
+-- go to, so list them and stop rather than fail part-way through the copy.
+DO $$
+DECLARE
+    stray_claims TEXT;
+BEGIN
+    SELECT string_agg(format('%s (airdrop %s)', c.id, COALESCE(c.airdrop_id::TEXT, 'NULL')), ', ' ORDER BY c.id)
+    INTO stray_claims
+    FROM claims c
+    WHERE c.airdrop_id IS NULL
+    OR NOT EXISTS (SELECT 1 FROM airdrops a WHERE a.id = c.airdrop_id);
+
+    IF stray_claims IS NOT NULL THEN
+        RAISE EXCEPTION 'Claims without an existing airdrop cannot be partitioned: %', stray_claims
+            USING HINT = 'Assign these claims to their airdrop or delete them, then rerun the migration.';
+    END IF;
+END $$;
+
+-- transaction_logs.claim_id stops being a foreign key so archived claim
+-- partitions can be detached while their logs are kept
+ALTER TABLE transaction_logs DROP CONSTRAINT IF EXISTS transaction_logs_claim_id_fkey;
+
+ALTER TABLE claims RENAME TO claims_unpartitioned;
+ALTER TABLE claims_unpartitioned RENAME CONSTRAINT claims_pkey TO claims_unpartitioned_pkey;
+ALTER TABLE claims_unpartitioned RENAME CONSTRAINT claims_airdrop_id_user_id_key TO claims_unpartitioned_airdrop_id_user_id_key;
+DROP INDEX IF EXISTS idx_claims_user_history, idx_claims_pending, idx_claims_status, idx_claims_airdrop_user;
+ALTER SEQUENCE claims_id_seq OWNED BY NONE;
+
+CREATE TABLE claims (
+    id INTEGER NOT NULL DEFAULT nextval('claims_id_seq'),
+    airdrop_id INTEGER NOT NULL REFERENCES airdrops(id),
+    user_id BIGINT REFERENCES users(telegram_id),
+    amount BIGINT NOT NULL, -- Amount claimed (in smallest unit)
+    transaction_signature VARCHAR(88), -- Solana transaction signature
+    status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'completed', 'failed')),
+    claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP,
+    PRIMARY KEY (id, airdrop_id),
+    UNIQUE (airdrop_id, user_id) -- One claim per user per airdrop
+) PARTITION BY RANGE (airdrop_id);
+ALTER SEQUENCE claims_id_seq OWNED BY claims.id;
+
+SELECT ensure_claims_partition(id) FROM airdrops;
+INSERT INTO claims (id, airdrop_id, user_id, amount, transaction_signature, status, claimed_at, processed_at)
+SELECT id, airdrop_id, user_id, amount, transaction_signature, status, claimed_at, processed_at
+FROM claims_unpartitioned;
+DROP TABLE claims_unpartitioned;
+
+CREATE INDEX idx_claims_user_history ON claims(user_id, claimed_at DESC, id DESC);
+CREATE INDEX idx_claims_pending ON claims(claimed_at, id) WHERE status = 'pending';
+
+-- Created after the copy so the existing rows aren't counted twice
+CREATE TRIGGER rollup_claims_insert_delete AFTER INSERT OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION rollup_claims();
+
+CREATE TRIGGER rollup_claims_update AFTER UPDATE OF status, amount ON claims
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.amount IS DISTINCT FROM NEW.amount)
+    EXECUTE FUNCTION rollup_claims();
+
+CREATE TRIGGER summarize_user_claims_insert_delete AFTER INSERT OR DELETE ON claims
+    FOR EACH ROW EXECUTE FUNCTION summarize_user_claims();
+
+-- transaction_logs ------------------------------------------------------
+ALTER TABLE transaction_logs RENAME TO transaction_logs_unpartitioned;
+ALTER TABLE transaction_logs_unpartitioned RENAME CONSTRAINT transaction_logs_pkey TO transaction_logs_unpartitioned_pkey;
+ALTER SEQUENCE transaction_logs_id_seq OWNED BY NONE;
+
+CREATE TABLE transaction_logs (
+    id INTEGER NOT NULL DEFAULT nextval('transaction_logs_id_seq'),
+    airdrop_id INTEGER REFERENCES airdrops(id),
+    claim_id INTEGER, -- claims.id (not a foreign key: logs outlive archived claim partitions)
+    from_wallet VARCHAR(44),
+    to_wallet VARCHAR(44),
+    amount BIGINT,
+    transaction_signature VARCHAR(88),
+    status VARCHAR(20) DEFAULT 'pending',
+    error_message TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE transaction_logs_id_seq OWNED BY transaction_logs.id;
+
+DO $$
+DECLARE
+    month_start TIMESTAMP;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', COALESCE(MIN(created_at), LOCALTIMESTAMP)),
+            date_trunc('month', LOCALTIMESTAMP) - INTERVAL '1 month',
+            INTERVAL '1 month')
+        FROM transaction_logs_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF transaction_logs FOR VALUES FROM (%L) TO (%L)',
+            format('transaction_logs_%s', to_char(month_start, 'YYYYMM')),
+            month_start, month_start + INTERVAL '1 month'
+        );
+    END LOOP;
+END $$;
+SELECT ensure_transaction_log_partitions(3);
+
+INSERT INTO transaction_logs (id, airdrop_id, claim_id, from_wallet, to_wallet, amount, transaction_signature,
+                              status, error_message, created_at)
+SELECT id, airdrop_id, claim_id, from_wallet, to_wallet, amount, transaction_signature,
+       status, error_message, COALESCE(created_at, LOCALTIMESTAMP)
+FROM transaction_logs_unpartitioned;
+DROP TABLE transaction_logs_unpartitioned;
@@ -0,0 +1,115 @@
+-- Store Solana addresses (32 bytes) and transaction signatures (64 bytes) as
+-- raw bytea instead of base58 VARCHARs. DatabaseManager converts at its
+-- boundary. Values that aren't valid base58 of the right length (placeholder
+-- admin wallets, simulated signatures) become NULL, except token mints, which
+-- are required: the migration stops and lists any airdrop whose mint doesn't
+-- decode. Rewrites the affected tables under an exclusive lock.
+
+-- Base58 (Bitcoin/Solana alphabet) to raw bytes, for backfills and ad-hoc
+-- lookups such as WHERE wallet_address = base58_decode('...')
+CREATE OR REPLACE FUNCTION base58_decode(encoded TEXT)
+RETURNS BYTEA AS $$
+DECLARE
+    alphabet CONSTANT TEXT := '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz';
+    num NUMERIC := 0;
+    digit INTEGER;
+    result BYTEA := '';
+    leading_zeros INTEGER := 0;
+BEGIN
+    FOR i IN 1..length(encoded) LOOP
+        digit := strpos(alphabet, substr(encoded, i, 1)) - 1;
+        IF digit < 0 THEN
+            RAISE EXCEPTION 'invalid base58 string: %', encoded;
+        END IF;
+        num := num * 58 + digit;
+    END LOOP;
+    WHILE num > 0 LOOP
+        result := decode(lpad(to_hex(mod(num, 256)::INTEGER), 2, '0'), 'hex') || result;
+        num := div(num, 256);
+    END LOOP;
+    WHILE leading_zeros < length(encoded) AND substr(encoded, leading_zeros + 1, 1) = '1' LOOP
+        leading_zeros := leading_zeros + 1;
+    END LOOP;
+    RETURN decode(repeat('00', leading_zeros), 'hex') || result;
+END;
+$$ language 'plpgsql' IMMUTABLE STRICT;
+
+-- base58_decode that returns NULL for invalid input or the wrong length
+CREATE OR REPLACE FUNCTION try_base58_decode(encoded TEXT, expected_length INTEGER)
+RETURNS BYTEA AS $$
+DECLARE
+    result BYTEA;
+BEGIN
+    result := base58_decode(encoded);
+    RETURN CASE WHEN octet_length(result) = expected_length THEN result END;
+EXCEPTION WHEN raise_exception THEN
+    RETURN NULL;
+END;
+$$ language 'plpgsql' IMMUTABLE STRICT;
+
+-- token_mint stays NOT NULL, so an undecodable mint would abort the type
+-- change below with a bare not-null violation. Name the airdrops instead;
+-- fix or delete them and rerun. (user_claim_summaries mints come from airdrops.)
+-- admin_wallet becomes nullable, so bad values are only reported.
+DO $$
+DECLARE
+    bad_airdrops TEXT;
+BEGIN
+    SELECT string_agg(format('%s (%L)', id, token_mint), ', ' ORDER BY id)
+    INTO bad_airdrops
+    FROM airdrops
+    WHERE try_base58_decode(token_mint, 32) IS NULL;
+
+    IF bad_airdrops IS NOT NULL THEN
+        RAISE EXCEPTION 'Airdrops with a token_mint that is not a valid Solana address: %', bad_airdrops
+            USING HINT = 'Correct or delete these airdrops, then rerun the migration.';
+    END IF;
+
+    -- Placeholder admin wallets are expected; say which ones are cleared
+    -- (the bot fills them in again from admin_wallets at startup)
+    SELECT string_agg(id::TEXT, ', ' ORDER BY id)
+    INTO bad_airdrops
+    FROM airdrops
+    WHERE admin_wallet IS NOT NULL AND try_base58_decode(admin_wallet, 32) IS NULL;
+
+    IF bad_airdrops IS NOT NULL THEN
+        RAISE WARNING 'Clearing admin_wallet on airdrops % (not a valid Solana address)', bad_airdrops;
+    END IF;
+END $$;
+
+-- The trigger condition references wallet_address, which blocks the type change
+DROP TRIGGER IF EXISTS rollup_users_update ON users;
+
+ALTER TABLE users
+    ALTER COLUMN wallet_address TYPE BYTEA USING try_base58_decode(wallet_address, 32),
+    ADD CONSTRAINT users_wallet_address_length CHECK (octet_length(wallet_address) = 32);
+
+CREATE TRIGGER rollup_users_update AFTER UPDATE OF role, wallet_address ON users
+    FOR EACH ROW
+    WHEN (OLD.role IS DISTINCT FROM NEW.role
+          OR (OLD.wallet_address IS NULL) <> (NEW.wallet_address IS NULL))
+    EXECUTE FUNCTION rollup_users();
+
+ALTER TABLE airdrops
+    ALTER COLUMN admin_wallet DROP NOT NULL,
+    ALTER COLUMN token_mint TYPE BYTEA USING try_base58_decode(token_mint, 32),
+    ALTER COLUMN admin_wallet TYPE BYTEA USING try_base58_decode(admin_wallet, 32),
+    ADD CONSTRAINT airdrops_token_mint_length CHECK (octet_length(token_mint) = 32),
+    ADD CONSTRAINT airdrops_admin_wallet_length CHECK (octet_length(admin_wallet) = 32);
+
+ALTER TABLE user_claim_summaries
+    ALTER COLUMN token_mint TYPE BYTEA USING try_base58_decode(token_mint, 32);
+
+ALTER TABLE claims
+    ALTER COLUMN transaction_signature TYPE BYTEA USING try_base58_decode(transaction_signature, 64),
+    ADD CONSTRAINT claims_transaction_signature_length CHECK (octet_length(transaction_signature) = 64);
+
+ALTER TABLE transaction_logs
+    ALTER COLUMN from_wallet TYPE BYTEA USING try_base58_decode(from_wallet, 32),
+    ALTER COLUMN to_wallet TYPE BYTEA USING try_base58_decode(to_wallet, 32),
+    ALTER COLUMN transaction_signature TYPE BYTEA USING try_base58_decode(transaction_signature, 64);
+
+-- Wallet lookups and signature reconciliation
+CREATE INDEX IF NOT EXISTS idx_users_wallet_address ON users(wallet_address) WHERE wallet_address IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_claims_transaction_signature ON claims(transaction_signature) WHERE transaction_signature IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transaction_logs_signature ON transaction_logs(transaction_signature) WHERE transaction_signature IS NOT NULL;
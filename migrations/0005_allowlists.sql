@@ -0,0 +1,12 @@
+-- Per-airdrop allowlists. Lists are bulk-loaded with COPY (see allowlist.py);
+-- when airdrops.allowlist_only is set, the claim statement only accepts users
+-- whose registered wallet is on the list, with one primary-key lookup.
+
+ALTER TABLE airdrops ADD COLUMN IF NOT EXISTS allowlist_only BOOLEAN NOT NULL DEFAULT false;
+
+CREATE TABLE IF NOT EXISTS airdrop_allowlist (
+    airdrop_id INTEGER NOT NULL REFERENCES airdrops(id) ON DELETE CASCADE,
+    wallet_address BYTEA NOT NULL CHECK (octet_length(wallet_address) = 32), -- Allowed wallet (raw 32 bytes)
+    amount BIGINT CHECK (amount > 0), -- Per-wallet claim amount (NULL = airdrop's amount_per_claim)
+    PRIMARY KEY (airdrop_id, wallet_address)
+);
@@ -0,0 +1,23 @@
+-- ensure_claims_partition checked for the partition and then created it with
+-- no lock, so two airdrops created at once in the same id range raced and the
+-- loser failed with "relation already exists". Serialize creation per range
+-- with a transaction-scoped advisory lock and re-check under it.
+
+CREATE OR REPLACE FUNCTION ensure_claims_partition(p_airdrop_id INTEGER)
+RETURNS TEXT AS $$
+DECLARE
+    range_start INTEGER := (p_airdrop_id / claims_partition_size()) * claims_partition_size();
+    partition_name TEXT := format('claims_a%s', range_start);
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        PERFORM pg_advisory_xact_lock(hashtext('claims_partition'), range_start);
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF claims FOR VALUES FROM (%s) TO (%s)',
+                partition_name, range_start, range_start + claims_partition_size()
+            );
+        END IF;
+    END IF;
+    RETURN partition_name;
+END;
+$$ language 'plpgsql';
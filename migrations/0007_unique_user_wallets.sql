@@ -0,0 +1,29 @@
+-- The wallet-reuse check only read users.wallet_address, so two instances (or
+-- a stale wallet Bloom filter) could let two users register the same wallet.
+-- Make the index unique so the database refuses the second registration.
+--
+-- Existing duplicates are not resolved automatically: which account keeps the
+-- wallet is a support decision. The migration stops and lists them instead.
+
+DO $$
+DECLARE
+    duplicates TEXT;
+BEGIN
+    SELECT string_agg(format('\x%s (users %s)', encode(wallet_address, 'hex'), owners), '; ')
+    INTO duplicates
+    FROM (
+        SELECT wallet_address, string_agg(telegram_id::TEXT, ', ' ORDER BY telegram_id) AS owners
+        FROM users
+        WHERE wallet_address IS NOT NULL
+        GROUP BY wallet_address
+        HAVING COUNT(*) > 1
+    ) shared;
+
+    IF duplicates IS NOT NULL THEN
+        RAISE EXCEPTION 'Wallets registered to more than one user: %', duplicates
+            USING HINT = 'Clear wallet_address on all but one user of each wallet, then rerun the migration.';
+    END IF;
+END $$;
+
+DROP INDEX IF EXISTS idx_users_wallet_address;
+CREATE UNIQUE INDEX idx_users_wallet_address ON users(wallet_address) WHERE wallet_address IS NOT NULL;
@@ -0,0 +1,95 @@
+-- detach_claims_partitions also detached ranges whose airdrops had merely
+-- passed their end date, and nothing put a partition back, so claims for an
+-- airdrop that was extended or reactivated failed with "no partition of
+-- relation claims found for row". Only detach ranges whose airdrops are all
+-- completed or cancelled, and re-attach the partition when one is reopened.
+
+-- Create the claims partition covering an airdrop (called when it is created,
+-- and when an airdrop becomes claimable again), re-attaching it if it was
+-- detached for archiving. Serialized per range so concurrent callers don't race.
+CREATE OR REPLACE FUNCTION ensure_claims_partition(p_airdrop_id INTEGER)
+RETURNS TEXT AS $$
+DECLARE
+    range_start INTEGER := (p_airdrop_id / claims_partition_size()) * claims_partition_size();
+    partition_name TEXT := format('claims_a%s', range_start);
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_inherits
+        WHERE inhrelid = to_regclass(partition_name) AND inhparent = 'claims'::regclass
+    ) THEN
+        PERFORM pg_advisory_xact_lock(hashtext('claims_partition'), range_start);
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF claims FOR VALUES FROM (%s) TO (%s)',
+                partition_name, range_start, range_start + claims_partition_size()
+            );
+        ELSIF NOT EXISTS (
+            SELECT 1 FROM pg_inherits
+            WHERE inhrelid = to_regclass(partition_name) AND inhparent = 'claims'::regclass
+        ) THEN
+            EXECUTE format(
+                'ALTER TABLE claims ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)',
+                partition_name, range_start, range_start + claims_partition_size()
+            );
+        END IF;
+    END IF;
+    RETURN partition_name;
+END;
+$$ language 'plpgsql';
+
+-- Detach claims partitions whose whole airdrop range is allocated and every
+-- airdrop in it was completed or cancelled before cutoff. Airdrops that are
+-- merely past their end date keep their partition, since they can still be
+-- extended or reactivated. The range's airdrops are row-locked first, so a
+-- concurrent status change either lands before the check or waits for the
+-- detach and then re-attaches the partition (see claims_partition_on_reopen).
+-- Rollups and claim summaries keep their totals; returns the detached names.
+CREATE OR REPLACE FUNCTION detach_claims_partitions(cutoff TIMESTAMP)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    range_start INTEGER;
+    partition_name TEXT;
+BEGIN
+    FOR partition_name, range_start IN
+        SELECT c.relname, substring(c.relname FROM '\d+$')::INTEGER
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'claims'::regclass
+        AND c.relname ~ '^claims_a\d+$'
+        ORDER BY 2
+    LOOP
+        CONTINUE WHEN (SELECT COALESCE(MAX(id), 0) FROM airdrops) < range_start + claims_partition_size();
+        -- Row locks before the range lock: an UPDATE holds its row while
+        -- the reopen trigger takes the range lock, so the reverse could deadlock
+        PERFORM 1 FROM airdrops
+        WHERE id >= range_start AND id < range_start + claims_partition_size()
+        FOR SHARE;
+        PERFORM pg_advisory_xact_lock(hashtext('claims_partition'), range_start);
+        CONTINUE WHEN EXISTS (
+            SELECT 1 FROM airdrops
+            WHERE id >= range_start AND id < range_start + claims_partition_size()
+            AND NOT (status IN ('completed', 'cancelled') AND updated_at < cutoff)
+        );
+        EXECUTE format('ALTER TABLE claims DETACH PARTITION %I', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+-- An airdrop leaving completed/cancelled needs its claims partition back
+CREATE OR REPLACE FUNCTION claims_partition_on_reopen()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM ensure_claims_partition(NEW.id);
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS claims_partition_on_reopen ON airdrops;
+CREATE TRIGGER claims_partition_on_reopen AFTER UPDATE OF status ON airdrops
+    FOR EACH ROW
+    WHEN (NEW.status NOT IN ('completed', 'cancelled') AND OLD.status IN ('completed', 'cancelled'))
+    EXECUTE FUNCTION claims_partition_on_reopen();
+
+-- Airdrops that are claimable now but whose range was already detached
+SELECT ensure_claims_partition(id) FROM airdrops WHERE status NOT IN ('completed', 'cancelled');
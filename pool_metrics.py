@@ -0,0 +1,42 @@
+"""
+Connection pool metrics for MochiDrop
+Tracks acquire wait time, connections in use and acquire timeouts
+"""
+
+from typing import Any, Dict
+
+
+class PoolMetrics:
+    """Counters for DatabaseManager.acquire()"""
+
+    def __init__(self):
+        self.acquires = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_acquire(self, wait: float):
+        self.acquires += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def record_release(self):
+        self.in_use -= 1
+
+    def record_timeout(self, wait: float):
+        self.timeouts += 1
+        self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'acquires': self.acquires,
+            'timeouts': self.timeouts,
+            'in_use': self.in_use,
+            'peak_in_use': self.peak_in_use,
+            'avg_wait_ms': (self.total_wait / self.acquires * 1000) if self.acquires else 0.0,
+            'max_wait_ms': self.max_wait * 1000
+        }
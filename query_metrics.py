@@ -0,0 +1,198 @@
+"""
+Query metrics for MochiDrop
+Per-method latency histograms and a slow-query log with captured EXPLAIN plans
+"""
+
+import re
+import time
+import asyncio
+import inspect
+import logging
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from functools import wraps
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is unbounded)
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+MAX_LOGGED_SQL = 2000
+
+_WHITESPACE = re.compile(r'\s+')
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+_WRITES = re.compile(r'\b(INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles are estimated as bucket upper bounds"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed: float, failed: bool = False):
+        elapsed_ms = elapsed * 1000
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if failed:
+            self.errors += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound (ms) of the bucket holding the given fraction of calls, capped at the observed max"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return min(float(LATENCY_BUCKETS_MS[index]), self.max_ms)
+                return self.max_ms
+        return self.max_ms
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.count,
+            'errors': self.errors,
+            'avg_ms': (self.total_ms / self.count) if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max_ms
+        }
+
+
+def param_shape(args: Sequence[Any]) -> List[str]:
+    """Describe query parameters by type and size, without their values"""
+    shape = []
+    for arg in args:
+        if arg is None:
+            shape.append('null')
+        elif isinstance(arg, (bytes, str, list, tuple)):
+            shape.append(f"{type(arg).__name__}[{len(arg)}]")
+        else:
+            shape.append(type(arg).__name__)
+    return shape
+
+
+class QueryMetrics:
+    """Latency histograms per DatabaseManager method, plus a slow-query log.
+
+    Statements slower than threshold_ms are recorded in a ring buffer of the
+    last buffer_size entries with their SQL and parameter shape. When an
+    explain runner is set, a plan is captured for them in the background:
+    EXPLAIN (ANALYZE, BUFFERS) for reads, plain EXPLAIN for writes (which would
+    otherwise take locks and consume sequence values). One plan is captured at
+    a time, and the same SQL is explained at most once per explain_cooldown.
+    """
+
+    def __init__(self, threshold_ms: float = 200.0, buffer_size: int = 50,
+                 explain: bool = True, explain_cooldown: float = 60.0):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_cooldown = explain_cooldown
+        self.methods: Dict[str, LatencyHistogram] = {}
+        self.slow_queries: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self.slow_total = 0
+        self._explain_runner: Optional[Callable[[str, Sequence[Any], bool], Awaitable[str]]] = None
+        self._explained_at: Dict[str, float] = {}
+        self._explaining = False
+
+    def set_explain_runner(self, runner: Callable[[str, Sequence[Any], bool], Awaitable[str]]):
+        """Set the coroutine that returns a plan for (sql, args, analyze)"""
+        self._explain_runner = runner
+
+    def observe_method(self, name: str, elapsed: float, failed: bool = False):
+        histogram = self.methods.get(name)
+        if histogram is None:
+            histogram = self.methods[name] = LatencyHistogram()
+        histogram.record(elapsed, failed)
+
+    def observe_query(self, sql: str, args: Sequence[Any], elapsed: float):
+        """Record a statement's latency, logging it if it was slow"""
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        sql = _WHITESPACE.sub(' ', sql).strip()
+        entry = {
+            'at': datetime.utcnow(),
+            'elapsed_ms': elapsed_ms,
+            'sql': sql[:MAX_LOGGED_SQL],
+            'params': param_shape(args),
+            'plan': None
+        }
+        self.slow_queries.append(entry)
+        self.slow_total += 1
+        logger.warning(f"Slow query ({elapsed_ms:.0f} ms, params {entry['params']}): {entry['sql'][:200]}")
+
+        if self._should_explain(sql):
+            self._explaining = True
+            self._explained_at[sql] = time.monotonic()
+            asyncio.get_running_loop().create_task(self._capture_plan(entry, sql, list(args)))
+
+    def on_query(self, record):
+        """asyncpg query logger callback (Connection.add_query_logger)"""
+        # Plan captures are slow by design; don't log them as slow queries
+        if record.exception is None and not record.query.lstrip().upper().startswith('EXPLAIN'):
+            self.observe_query(record.query, record.args or (), record.elapsed)
+
+    def _should_explain(self, sql: str) -> bool:
+        if not self.explain or self._explain_runner is None or self._explaining:
+            return False
+        if not _EXPLAINABLE.match(sql):
+            return False
+        explained_at = self._explained_at.get(sql)
+        return explained_at is None or time.monotonic() - explained_at > self.explain_cooldown
+
+    async def _capture_plan(self, entry: Dict[str, Any], sql: str, args: List[Any]):
+        try:
+            entry['plan'] = await self._explain_runner(sql, args, not _WRITES.search(sql))
+        except Exception as e:
+            entry['plan'] = f"(EXPLAIN failed: {e})"
+        finally:
+            self._explaining = False
+
+    def method_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return latency stats per method, slowest p95 first"""
+        stats = {name: histogram.as_dict() for name, histogram in self.methods.items()}
+        return dict(sorted(stats.items(), key=lambda item: item[1]['p95_ms'], reverse=True))
+
+    def recent_slow_queries(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Return the most recent slow queries, newest first"""
+        return list(self.slow_queries)[-limit:][::-1]
+
+
+def instrument_methods(skip: Sequence[str] = ()):
+    """Class decorator timing every public coroutine method into self.query_metrics"""
+    def decorate(cls):
+        for name, func in list(vars(cls).items()):
+            if name.startswith('_') or name in skip or not inspect.iscoroutinefunction(func):
+                continue
+            setattr(cls, name, _timed(name, func))
+        return cls
+    return decorate
+
+
+def _timed(name: str, func):
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await func(self, *args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.query_metrics.observe_method(name, time.perf_counter() - started, failed)
+    return wrapper
@@ -0,0 +1,103 @@
+"""
+Claim slot allocator for MochiDrop
+In-memory first-come slot accounting for capped airdrops, in front of the claim statement
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AirdropSlots:
+    """Slot accounting for one capped airdrop"""
+
+    __slots__ = ('remaining', 'in_flight', 'claimed', 'rejected', 'deferred')
+
+    def __init__(self, remaining: int):
+        self.remaining = remaining
+        self.in_flight = 0
+        self.claimed = 0
+        self.rejected = 0
+        self.deferred = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            'remaining': self.remaining,
+            'in_flight': self.in_flight,
+            'claimed': self.claimed,
+            'rejected': self.rejected,
+            'deferred': self.deferred
+        }
+
+
+class SlotAllocator:
+    """Hands out claim slots for capped airdrops without touching the database.
+
+    reserve() is O(1): it takes one of the airdrop's remaining slots, or
+    reports the airdrop full once no slots remain and none are in flight.
+    While the last slots are still in flight the airdrop isn't known to be
+    full (most in-flight reservations by repeat tappers or ineligible users
+    are handed back), so those claimers go to the database. Every reservation is settled once the claim
+    statement has run: used, handed back, or (when the database itself said
+    full) dropped along with every other remaining slot. The database stays
+    authoritative; the local count never goes below the true number of free
+    slots, because reconciling only ever lowers it to what the database
+    reports. Other instances' claims therefore only make this one optimistic,
+    and their statements are rejected by the database as before.
+    """
+
+    def __init__(self):
+        self._airdrops: Dict[int, AirdropSlots] = {}
+
+    def reserve(self, airdrop_id: int) -> Optional[bool]:
+        """True if a slot was reserved, False if the airdrop is full, None if the database must decide.
+
+        None means the airdrop isn't tracked, or its last slots are in flight;
+        no reservation is held, so the caller doesn't settle.
+        """
+        slots = self._airdrops.get(airdrop_id)
+        if slots is None:
+            return None
+        if slots.remaining <= 0:
+            if slots.in_flight > 0:
+                slots.deferred += 1
+                return None
+            slots.rejected += 1
+            return False
+        slots.remaining -= 1
+        slots.in_flight += 1
+        return True
+
+    def settle(self, airdrop_id: int, used: bool, full: bool = False):
+        """Resolve a reservation: used by a claim, or handed back (dropping all slots if full)"""
+        slots = self._airdrops.get(airdrop_id)
+        if slots is None:
+            return
+        slots.in_flight -= 1
+        if used:
+            slots.claimed += 1
+        elif full:
+            slots.remaining = 0
+        else:
+            slots.remaining += 1
+
+    def reconcile(self, airdrop_id: int, free_slots: int):
+        """Start tracking an airdrop, or lower its count to the database's free slots"""
+        free_slots = max(free_slots, 0)
+        slots = self._airdrops.get(airdrop_id)
+        if slots is None:
+            self._airdrops[airdrop_id] = AirdropSlots(free_slots)
+            logger.info(f"Tracking claim slots for airdrop {airdrop_id}: {free_slots:,} free")
+        elif free_slots < slots.remaining:
+            slots.remaining = free_slots
+
+    def forget(self, airdrop_id: int):
+        """Stop tracking an airdrop; its claims go straight to the database"""
+        self._airdrops.pop(airdrop_id, None)
+
+    def tracked(self):
+        return list(self._airdrops)
+
+    def stats(self) -> Dict[int, Dict[str, int]]:
+        return {airdrop_id: slots.as_dict() for airdrop_id, slots in self._airdrops.items()}
@@ -3,19 +3,30 @@ from solana.rpc.async_api import AsyncClient
 from solana.rpc.commitment import Confirmed
 from solders.keypair import Keypair
 from solders.pubkey import Pubkey as PublicKey
+from solders.transaction_status import TransactionConfirmationStatus
 from solana.transaction import Transaction
 import base58
 import os
 from typing import Optional, Tuple
 import logging
+from spl.token.constants import TOKEN_PROGRAM_ID
+from spl.token.instructions import TransferParams, get_associated_token_address, transfer
+from blockhash_cache import blockhash_cache_for
+from ata_registry import ata_registry_for
+from transfer_packing import create_ata_idempotent
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sends of one transfer, each re-signed with a fresh blockhash after the previous one expired
+MAX_SEND_ATTEMPTS = int(os.getenv('SOLANA_MAX_SEND_ATTEMPTS', '3'))
+
 class SolanaHandler:
     def __init__(self, rpc_url: str, private_key: str, token_mint: str):
         self.rpc_url = rpc_url
         self.client = AsyncClient(rpc_url)
+        self.blockhashes = blockhash_cache_for(rpc_url)
+        self.ata_registry = ata_registry_for(rpc_url)
         
         # Convert private key from base58 to Keypair
         try:
@@ -70,7 +81,14 @@ class SolanaHandler:
             return 0.0
     
     async def send_tokens(self, recipient_address: str, amount: float) -> Tuple[bool, Optional[str]]:
-        """Send SPL tokens to recipient"""
+        """Send SPL tokens to recipient.
+
+        Returns (True, signature) once confirmed. A transaction that failed on
+        chain, or whose blockhash expired unconfirmed, had no effect, so it is
+        re-signed and resent, up to MAX_SEND_ATTEMPTS times. If confirmation times out before the blockhash
+        expires, returns (False, signature): the transfer may still land, so
+        check that signature before retrying.
+        """
         try:
             recipient_pubkey = PublicKey(recipient_address)
             
@@ -86,10 +104,9 @@ class SolanaHandler:
                 logger.error(f"Insufficient SOL for transaction fees. Available: {sol_balance}")
                 return False, None
             
-            # Get or create associated token account for recipient
-            recipient_token_account = await self._get_or_create_associated_token_account(recipient_pubkey)
-            if not recipient_token_account:
-                return False, None
+            # Recipient's associated token account, created in the same transaction if missing
+            recipient_token_account = get_associated_token_address(recipient_pubkey, self.token_mint)
+            missing_accounts = await self.ata_registry.find_missing([recipient_pubkey], self.token_mint)
             
             # Get sender's token account
             sender_token_accounts = await self.client.get_token_accounts_by_owner(
@@ -122,92 +139,79 @@ class SolanaHandler:
                 )
             )
             
-            # Create and send transaction
-            transaction = Transaction()
-            transaction.add(transfer_instruction)
-            
-            # Get recent blockhash
-            recent_blockhash = await self.client.get_latest_blockhash()
-            transaction.recent_blockhash = recent_blockhash.value.blockhash
-            
-            # Sign transaction
-            transaction.sign(self.keypair)
-            
-            # Send transaction
-            response = await self.client.send_transaction(transaction)
-            
-            if response.value:
-                logger.info(f"Transaction sent successfully: {response.value}")
-                
-                # Wait for confirmation
-                await self._wait_for_confirmation(response.value)
-                return True, str(response.value)
-            else:
-                logger.error("Failed to send transaction")
-                return False, None
-                
-        except Exception as e:
-            logger.error(f"Error sending tokens: {e}")
-            return False, None
-    
-    async def _get_or_create_associated_token_account(self, recipient_pubkey: PublicKey) -> Optional[PublicKey]:
-        """Get or create associated token account for recipient"""
-        try:
-            from spl.token.instructions import get_associated_token_address
-            
-            # Calculate associated token account address
-            associated_token_account = get_associated_token_address(
-                recipient_pubkey,
-                self.token_mint
-            )
-            
-            # Check if account exists
-            account_info = await self.client.get_account_info(associated_token_account)
-            
-            if account_info.value is None:
-                # Account doesn't exist, create it
-                from spl.token.instructions import create_associated_token_account
-                
-                create_instruction = create_associated_token_account(
-                    payer=self.wallet_pubkey,
-                    owner=recipient_pubkey,
-                    mint=self.token_mint
-                )
-                
+            for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+                # Create and send transaction
                 transaction = Transaction()
-                transaction.add(create_instruction)
+                if missing_accounts:
+                    transaction.add(create_ata_idempotent(self.wallet_pubkey, recipient_pubkey, self.token_mint))
+                transaction.add(transfer_instruction)
                 
                 # Get recent blockhash
-                recent_blockhash = await self.client.get_latest_blockhash()
-                transaction.recent_blockhash = recent_blockhash.value.blockhash
+                recent_blockhash = await self.blockhashes.get()
+                transaction.recent_blockhash = recent_blockhash.blockhash
                 
-                # Sign and send
+                # Sign transaction
                 transaction.sign(self.keypair)
+                
+                # Send transaction
                 response = await self.client.send_transaction(transaction)
                 
-                if response.value:
-                    await self._wait_for_confirmation(response.value)
-                    logger.info(f"Created associated token account: {associated_token_account}")
-                else:
-                    logger.error("Failed to create associated token account")
-                    return None
-            
-            return associated_token_account
-            
+                if not response.value:
+                    logger.error("Failed to send transaction")
+                    return False, None
+                
+                logger.info(f"Transaction sent successfully: {response.value}")
+                
+                # Wait for confirmation
+                confirmed = await self._wait_for_confirmation(
+                    response.value, recent_blockhash.last_valid_block_height
+                )
+                if confirmed:
+                    self.ata_registry.mark_existing([recipient_token_account])
+                    return True, str(response.value)
+                if confirmed is None:
+                    return False, str(response.value)
+                logger.warning(f"Re-signing transfer to {recipient_address} (attempt {attempt} did not land)")
+            
+            logger.error(f"Transfer to {recipient_address} not confirmed after {MAX_SEND_ATTEMPTS} attempts")
+            return False, None
+                
         except Exception as e:
-            logger.error(f"Error with associated token account: {e}")
-            return None
+            logger.error(f"Error sending tokens: {e}")
+            return False, None
     
-    async def _wait_for_confirmation(self, signature: str, max_retries: int = 30):
-        """Wait for transaction confirmation"""
+    async def _wait_for_confirmation(self, signature: str, last_valid_block_height: Optional[int] = None,
+                                     max_retries: int = 45) -> Optional[bool]:
+        """Wait for transaction confirmation.
+
+        Returns True once confirmed, False once it has failed on chain or its
+        blockhash has expired unconfirmed (either way it had no effect and can
+        be re-signed), or None on timeout, when it may still land. The default
+        wait outlasts a blockhash's lifetime, so with last_valid_block_height
+        a timeout is rare.
+        """
         for i in range(max_retries):
             try:
+                # Height before the status: a None status then means the
+                # transaction hadn't landed by this height, not by a later one
+                block_height = self.blockhashes.block_height
                 response = await self.client.get_signature_statuses([signature])
-                if response.value and response.value[0]:
-                    status = response.value[0]
-                    if status.confirmation_status == "confirmed" or status.confirmation_status == "finalized":
-                        logger.info(f"Transaction confirmed: {signature}")
-                        return True
+                status = response.value[0] if response.value else None
+                if status is None and last_valid_block_height is not None \
+                        and self.blockhashes.is_expired(last_valid_block_height, block_height):
+                    # Last look before re-signing, through the full history
+                    response = await self.client.get_signature_statuses([signature], search_transaction_history=True)
+                    status = response.value[0] if response.value else None
+                    if status is None:
+                        logger.warning(f"Transaction expired unconfirmed and must be re-signed: {signature}")
+                        return False
+                if status and status.confirmation_status in (TransactionConfirmationStatus.Confirmed,
+                                                             TransactionConfirmationStatus.Finalized):
+                    if status.err is not None:
+                        logger.error(f"Transaction failed: {signature}: {status.err}")
+                        return False
+                    logger.info(f"Transaction confirmed: {signature}")
+                    return True
                 
                 await asyncio.sleep(2)  # Wait 2 seconds before retry
                 
@@ -216,7 +220,7 @@ class SolanaHandler:
                 await asyncio.sleep(2)
         
         logger.warning(f"Transaction confirmation timeout: {signature}")
-        return False
+        return None
     
     async def validate_wallet_address(self, address: str) -> bool:
         """Validate if the provided address is a valid Solana wallet"""
@@ -23,6 +23,12 @@ from spl.token.async_client import AsyncToken
 from spl.token.constants import TOKEN_PROGRAM_ID
 from spl.token.instructions import get_associated_token_address
 import aiohttp
+from audit_log import transaction_log_writer
+from transfer_packing import PackedTransfer, TransferPacker, sol_transfer, spl_transfer
+from transaction_pipeline import TransactionPipeline
+from blockhash_cache import blockhash_cache_for
+from ata_registry import ata_registry_for
+from database_new import db
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +38,8 @@ class SolanaWalletManager:
     def __init__(self):
         self.rpc_url = os.getenv('SOLANA_RPC_URL', 'https://api.devnet.solana.com')
         self.client = AsyncClient(self.rpc_url)
+        self.blockhashes = blockhash_cache_for(self.rpc_url)
+        self.ata_registry = ata_registry_for(self.rpc_url)
         self.encryption_key = self._get_or_create_encryption_key()
         self.fernet = Fernet(self.encryption_key)
         
@@ -149,6 +157,12 @@ class SolanaWalletManager:
         except Exception:
             return False
     
+    def address_from_private_key(self, private_key: str) -> Optional[str]:
+        """Derive the wallet address of a base58 private key (None if the key is invalid)"""
+        if not self.validate_private_key(private_key):
+            return None
+        return str(Keypair.from_bytes(base58.b58decode(private_key)).pubkey())
+    
     async def get_sol_balance(self, wallet_address: str) -> float:
         """Get SOL balance for a wallet"""
         try:
@@ -204,12 +218,16 @@ class SolanaWalletManager:
         
         return balances
     
-    async def send_sol(self, from_private_key: str, to_address: str, amount: float) -> Optional[str]:
+    async def send_sol(self, from_private_key: str, to_address: str, amount: float,
+                       airdrop_id: int = None, claim_id: int = None) -> Optional[str]:
         """Send SOL from one wallet to another"""
+        from_wallet = None
+        lamports = None
         try:
             # Create keypair from private key
             private_key_bytes = base58.b58decode(from_private_key)
             from_keypair = Keypair.from_bytes(private_key_bytes)
+            from_wallet = str(from_keypair.pubkey())
             
             # Create destination pubkey
             to_pubkey = Pubkey.from_string(to_address)
@@ -227,17 +245,17 @@ class SolanaWalletManager:
             )
             
             # Get recent blockhash
-            recent_blockhash = await self.client.get_latest_blockhash()
+            recent_blockhash = await self.blockhashes.get()
             
             # Create transaction
             message = Message.new_with_blockhash(
                 [transfer_instruction],
                 from_keypair.pubkey(),
-                recent_blockhash.value.blockhash
+                recent_blockhash.blockhash
             )
             
             transaction = Transaction.new_unsigned(message)
-            transaction.sign([from_keypair], recent_blockhash.value.blockhash)
+            transaction.sign([from_keypair], recent_blockhash.blockhash)
             
             # Send transaction
             response = await self.client.send_transaction(
@@ -247,21 +265,37 @@ class SolanaWalletManager:
             
             if response.value:
                 logger.info(f"SOL transfer successful: {response.value}")
+                transaction_log_writer.log_transfer(
+                    from_wallet, to_address, lamports, 'completed', str(response.value),
+                    airdrop_id=airdrop_id, claim_id=claim_id
+                )
                 return str(response.value)
             
+            transaction_log_writer.log_transfer(
+                from_wallet, to_address, lamports, 'failed', error_message='No signature returned',
+                airdrop_id=airdrop_id, claim_id=claim_id
+            )
             return None
         
         except Exception as e:
             logger.error(f"Error sending SOL: {e}")
+            transaction_log_writer.log_transfer(
+                from_wallet, to_address, lamports, 'failed', error_message=str(e),
+                airdrop_id=airdrop_id, claim_id=claim_id
+            )
             return None
     
     async def send_spl_token(self, from_private_key: str, to_address: str, 
-                           token_mint: str, amount: float, decimals: int = 6) -> Optional[str]:
+                           token_mint: str, amount: float, decimals: int = 6,
+                           airdrop_id: int = None, claim_id: int = None) -> Optional[str]:
         """Send SPL tokens from one wallet to another"""
+        from_wallet = None
+        token_amount = None
         try:
             # Create keypair from private key
             private_key_bytes = base58.b58decode(from_private_key)
             from_keypair = Keypair.from_bytes(private_key_bytes)
+            from_wallet = str(from_keypair.pubkey())
             
             # Create pubkeys
             to_pubkey = Pubkey.from_string(to_address)
@@ -283,22 +317,36 @@ class SolanaWalletManager:
             to_token_account = get_associated_token_address(to_pubkey, mint_pubkey)
             
             # Transfer tokens
+            recent_blockhash = await self.blockhashes.get()
             response = await token_client.transfer(
                 source=from_token_account,
                 dest=to_token_account,
                 owner=from_keypair,
                 amount=token_amount,
-                multi_signers=None
+                multi_signers=None,
+                recent_blockhash=recent_blockhash.blockhash
             )
             
             if response.value:
                 logger.info(f"SPL token transfer successful: {response.value}")
+                transaction_log_writer.log_transfer(
+                    from_wallet, to_address, token_amount, 'completed', str(response.value),
+                    airdrop_id=airdrop_id, claim_id=claim_id
+                )
                 return str(response.value)
             
+            transaction_log_writer.log_transfer(
+                from_wallet, to_address, token_amount, 'failed', error_message='No signature returned',
+                airdrop_id=airdrop_id, claim_id=claim_id
+            )
             return None
         
         except Exception as e:
             logger.error(f"Error sending SPL token: {e}")
+            transaction_log_writer.log_transfer(
+                from_wallet, to_address, token_amount, 'failed', error_message=str(e),
+                airdrop_id=airdrop_id, claim_id=claim_id
+            )
             return None
     
     async def get_token_info(self, token_mint: str) -> Optional[Dict]:
@@ -347,34 +395,88 @@ class SolanaWalletManager:
     
     async def batch_send_tokens(self, from_private_key: str, recipients: List[Dict], 
                               token_mint: str = None, decimals: int = 6) -> Dict[str, str]:
-        """Send tokens to multiple recipients in batch"""
+        """Send tokens to multiple recipients, packing as many transfers as fit into each transaction.
+
+        Packed transactions go through a TransactionPipeline, so several are
+        in flight at once. Recipients with no token account for the mint get
+        an idempotent create instruction in the same transaction as their
+        transfer. Recipients carrying a claim_id (and its airdrop_id) have
+        their claim marked completed or failed as their transaction settles.
+        Returns each recipient address mapped to the signature of the
+        transaction that paid it, or "FAILED"/"ERROR".
+        """
         results = {}
         
+        try:
+            from_keypair = Keypair.from_bytes(base58.b58decode(from_private_key))
+            mint_pubkey = Pubkey.from_string(token_mint) if token_mint else None
+        except Exception as e:
+            logger.error(f"Error preparing batch send: {e}")
+            return {recipient.get('address', 'unknown'): "ERROR" for recipient in recipients}
+        
+        missing_accounts = {}
+        if mint_pubkey:
+            owners = []
+            for recipient in recipients:
+                try:
+                    owners.append(Pubkey.from_string(recipient['address']))
+                except Exception:
+                    pass  # Reported when its transfer is built below
+            missing_accounts = await self.ata_registry.find_missing(owners, mint_pubkey)
+            if missing_accounts:
+                logger.info(f"Creating {len(missing_accounts)} token accounts alongside their transfers")
+        
+        packer = TransferPacker(from_keypair.pubkey())
+        transfers = []
         for recipient in recipients:
             try:
-                to_address = recipient['address']
-                amount = recipient['amount']
-                
-                if token_mint:
-                    # Send SPL token
-                    tx_hash = await self.send_spl_token(
-                        from_private_key, to_address, token_mint, amount, decimals
-                    )
+                if mint_pubkey:
+                    transfers.append(spl_transfer(
+                        from_keypair.pubkey(), recipient, mint_pubkey,
+                        int(recipient['amount'] * (10 ** decimals)), decimals,
+                        create_account=Pubkey.from_string(recipient['address']) in missing_accounts
+                    ))
                 else:
-                    # Send SOL
-                    tx_hash = await self.send_sol(from_private_key, to_address, amount)
-                
-                results[to_address] = tx_hash if tx_hash else "FAILED"
-                
-                # Small delay between transactions to avoid rate limiting
-                await asyncio.sleep(0.5)
-            
+                    transfers.append(sol_transfer(
+                        from_keypair.pubkey(), recipient, int(recipient['amount'] * 1_000_000_000)
+                    ))
             except Exception as e:
                 logger.error(f"Error in batch send to {recipient.get('address', 'unknown')}: {e}")
                 results[recipient.get('address', 'unknown')] = "ERROR"
         
+        from_wallet = str(from_keypair.pubkey())
+        pipeline = TransactionPipeline(
+            self.client, from_keypair, packer, self.blockhashes,
+            on_result=lambda packed, signature, error: self._record_transfer(
+                from_wallet, packed, signature, error, mint_pubkey
+            )
+        )
+        results.update(await pipeline.run(transfers))
+        
         return results
     
+    async def _record_transfer(self, from_wallet: str, packed: PackedTransfer, signature: Optional[str],
+                               error: Optional[str], mint: Optional[Pubkey] = None):
+        """Audit one recipient's transfer and settle its claim as soon as the transaction does"""
+        recipient = packed.recipient
+        status = 'completed' if signature else 'failed'
+        if mint:
+            token_account = get_associated_token_address(Pubkey.from_string(recipient['address']), mint)
+            if signature:
+                self.ata_registry.mark_existing([token_account])
+            else:
+                self.ata_registry.forget(token_account)
+        if signature:
+            logger.info(f"Transfer to {recipient['address']} confirmed: {signature}")
+        else:
+            logger.error(f"Transfer to {recipient['address']} failed: {error}")
+        transaction_log_writer.log_transfer(
+            from_wallet, recipient['address'], packed.amount, status, signature, error_message=error,
+            airdrop_id=recipient.get('airdrop_id'), claim_id=recipient.get('claim_id')
+        )
+        if recipient.get('claim_id'):
+            await db.update_claim_status(recipient['claim_id'], recipient['airdrop_id'], status, signature)
+    
     async def get_transaction_status(self, tx_hash: str) -> Dict:
         """Get the status of a transaction"""
         try:
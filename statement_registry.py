@@ -0,0 +1,135 @@
+"""
+Prepared statement registry for MochiDrop
+Hot queries are registered by name, prepared once per pool connection and timed per statement
+"""
+
+import time
+import weakref
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+
+class StatementStats:
+    """Execution counters for one registered statement"""
+
+    __slots__ = ('calls', 'errors', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float, failed: bool = False):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if failed:
+            self.errors += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_ms': (self.total_time / self.calls * 1000) if self.calls else 0.0,
+            'max_ms': self.max_time * 1000,
+            'total_ms': self.total_time * 1000
+        }
+
+
+def _raw_connection(conn):
+    """pool.acquire() hands out a PoolConnectionProxy; prepared statements belong to the connection behind it"""
+    return getattr(conn, '_con', conn)
+
+
+class PreparedStatementRegistry:
+    """Registry of named hot statements.
+
+    In the default mode every statement is prepared when a pool connection is
+    set up (pass prepare_connection as the pool's init callback) and executed
+    through its PreparedStatement. In pgbouncer mode (transaction pooling)
+    server-side prepared statements can't be relied on across transactions,
+    so statements run as plain queries on a pool created with
+    statement_cache_size=0. Both modes record per-statement counts and latency.
+
+    observer, if given, is called with (sql, args, elapsed) after each
+    successful PreparedStatement execution; asyncpg's query loggers don't see
+    those, while plain queries (pgbouncer mode) already reach them.
+    """
+
+    def __init__(self, pgbouncer_mode: bool = False,
+                 observer: Optional[Callable[[str, Sequence[Any], float], None]] = None):
+        self.pgbouncer_mode = pgbouncer_mode
+        self.observer = observer
+        self._sql: Dict[str, str] = {}
+        self._stats: Dict[str, StatementStats] = {}
+        self._prepared: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def register(self, name: str, sql: str):
+        """Register a statement under name"""
+        self._sql[name] = sql
+        self._stats.setdefault(name, StatementStats())
+
+    async def prepare_connection(self, conn: asyncpg.Connection):
+        """Prepare every registered statement on a new connection (pool init callback)"""
+        if self.pgbouncer_mode:
+            return
+        prepared = self._prepared.setdefault(_raw_connection(conn), {})
+        for name, sql in self._sql.items():
+            prepared[name] = await conn.prepare(sql)
+        logger.debug(f"Prepared {len(prepared)} statements on new connection")
+
+    async def _statement(self, conn, name: str):
+        """Return the connection's prepared statement for name, preparing it if missing"""
+        prepared = self._prepared.setdefault(_raw_connection(conn), {})
+        statement = prepared.get(name)
+        if statement is None:
+            statement = prepared[name] = await conn.prepare(self._sql[name])
+        return statement
+
+    def _forget(self, conn, name: str):
+        prepared = self._prepared.get(_raw_connection(conn))
+        if prepared:
+            prepared.pop(name, None)
+
+    async def _run(self, conn, name: str, method: str, args: tuple):
+        stats = self._stats[name]
+        started = time.perf_counter()
+        failed = False
+        try:
+            if self.pgbouncer_mode:
+                return await getattr(conn, method)(self._sql[name], *args)
+
+            statement = await self._statement(conn, name)
+            try:
+                return await getattr(statement, method)(*args)
+            except asyncpg.InvalidCachedStatementError:
+                # Schema changed under the statement; prepare it again once
+                self._forget(conn, name)
+                statement = await self._statement(conn, name)
+                return await getattr(statement, method)(*args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.record(elapsed, failed)
+            if self.observer and not failed and not self.pgbouncer_mode:
+                self.observer(self._sql[name], args, elapsed)
+
+    async def fetch(self, conn, name: str, *args) -> List[asyncpg.Record]:
+        return await self._run(conn, name, 'fetch', args)
+
+    async def fetchrow(self, conn, name: str, *args) -> Optional[asyncpg.Record]:
+        return await self._run(conn, name, 'fetchrow', args)
+
+    async def fetchval(self, conn, name: str, *args) -> Any:
+        return await self._run(conn, name, 'fetchval', args)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-statement execution counts and latencies"""
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
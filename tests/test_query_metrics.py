@@ -0,0 +1,31 @@
+"""Tests for query_metrics.LatencyHistogram"""
+
+from query_metrics import LatencyHistogram
+
+
+def test_percentiles_never_exceed_the_observed_max():
+    histogram = LatencyHistogram()
+    for _ in range(10):
+        histogram.record(0.0005)
+
+    stats = histogram.as_dict()
+    assert stats['p50_ms'] == stats['p95_ms'] == stats['max_ms'] == 0.5
+
+
+def test_percentiles_are_bucket_upper_bounds():
+    histogram = LatencyHistogram()
+    for elapsed in [0.003] * 90 + [0.2] * 9 + [0.3]:
+        histogram.record(elapsed)
+
+    assert histogram.percentile(0.5) == 5
+    assert histogram.percentile(0.95) == 250
+    assert histogram.percentile(1.0) == 300
+    assert round(histogram.as_dict()['max_ms']) == 300
+
+
+def test_slowest_bucket_reports_the_max():
+    histogram = LatencyHistogram()
+    histogram.record(30.0, failed=True)
+
+    assert histogram.percentile(0.99) == 30_000
+    assert histogram.errors == 1
@@ -0,0 +1,78 @@
+"""Tests for slot_allocator: the local count may be optimistic but never falsely full"""
+
+from slot_allocator import SlotAllocator
+
+
+def tracked(free_slots, airdrop_id=1):
+    slots = SlotAllocator()
+    slots.reconcile(airdrop_id, free_slots)
+    return slots
+
+
+def test_untracked_airdrop_defers_to_the_database():
+    assert SlotAllocator().reserve(1) is None
+
+
+def test_reserves_until_slots_run_out():
+    slots = tracked(2)
+
+    assert slots.reserve(1) is True
+    assert slots.reserve(1) is True
+    stats = slots.stats()[1]
+    assert (stats['remaining'], stats['in_flight']) == (0, 2)
+
+
+def test_defers_while_the_last_slots_are_in_flight():
+    slots = tracked(1)
+    assert slots.reserve(1) is True
+
+    # A's claim may still be handed back, so B is not told "full"
+    assert slots.reserve(1) is None
+    assert slots.stats()[1]['deferred'] == 1
+
+    slots.settle(1, used=True)
+    assert slots.reserve(1) is False
+    assert slots.stats()[1]['rejected'] == 1
+
+
+def test_handed_back_slot_is_reused():
+    slots = tracked(1)
+    assert slots.reserve(1) is True
+
+    slots.settle(1, used=False)
+
+    assert slots.reserve(1) is True
+
+
+def test_database_full_drops_every_remaining_slot():
+    slots = tracked(5)
+    assert slots.reserve(1) is True
+
+    slots.settle(1, used=False, full=True)
+
+    assert slots.stats()[1]['remaining'] == 0
+    assert slots.reserve(1) is False
+
+
+def test_reconcile_only_lowers_the_count():
+    slots = tracked(10)
+
+    slots.reconcile(1, 4)
+    assert slots.stats()[1]['remaining'] == 4
+
+    slots.reconcile(1, 8)
+    assert slots.stats()[1]['remaining'] == 4
+
+    slots.reconcile(1, -3)
+    assert slots.stats()[1]['remaining'] == 0
+
+
+def test_settle_after_forget_is_ignored():
+    slots = tracked(1)
+    assert slots.reserve(1) is True
+
+    slots.forget(1)
+    slots.settle(1, used=True)
+
+    assert slots.tracked() == []
+    assert slots.reserve(1) is None
@@ -0,0 +1,211 @@
+"""Tests for transaction_pipeline: expiry, re-signing and retries must never pay twice"""
+
+import time
+import asyncio
+from types import SimpleNamespace
+
+from solders.hash import Hash
+from solders.keypair import Keypair
+from solders.transaction import Transaction
+from solders.transaction_status import TransactionConfirmationStatus
+from solana.rpc.core import RPCException
+
+from blockhash_cache import MAX_PROCESSING_AGE, BlockhashCache, RecentBlockhash
+from transaction_pipeline import TransactionPipeline
+from transfer_packing import TransferPacker, sol_transfer
+
+
+class FakeBlockhashes(BlockhashCache):
+    """BlockhashCache with no RPC: a new blockhash per get() at the block height the test sets"""
+
+    def __init__(self):
+        super().__init__('http://127.0.0.1:8899')
+        self._block_height = 1_000
+
+    def _touch(self):
+        pass
+
+    async def get(self) -> RecentBlockhash:
+        return RecentBlockhash(Hash.new_unique(), self._block_height + MAX_PROCESSING_AGE, time.monotonic())
+
+    def expire_everything(self):
+        self._block_height += 10 * MAX_PROCESSING_AGE
+
+
+class FakeClient:
+    """Records sends and answers getSignatureStatuses from what the test says has landed"""
+
+    def __init__(self, blockhashes: FakeBlockhashes):
+        self.blockhashes = blockhashes
+        self.sent = []
+        self.landed = {}  # signature -> on-chain error (None = success)
+        self.lagging = set()  # landed, but only visible through the history search
+        self.history_lookups = []
+        self.on_send = lambda signature, attempt: True  # returns whether the transaction lands
+        self.before_statuses = lambda signatures, history: None
+
+    async def send_raw_transaction(self, raw, opts=None):
+        signature = Transaction.from_bytes(raw).signatures[0]
+        self.sent.append(signature)
+        if self.on_send(signature, len(self.sent)):
+            self.landed[signature] = None
+        return SimpleNamespace(value=signature)
+
+    async def get_signature_statuses(self, signatures, search_transaction_history=False):
+        if search_transaction_history:
+            self.history_lookups.extend(signatures)
+        hidden = self.before_statuses(signatures, search_transaction_history) or set()
+        statuses = []
+        for signature in signatures:
+            visible = signature in self.landed and signature not in hidden and (
+                search_transaction_history or signature not in self.lagging
+            )
+            statuses.append(SimpleNamespace(
+                confirmation_status=TransactionConfirmationStatus.Confirmed, err=self.landed[signature]
+            ) if visible else None)
+        return SimpleNamespace(value=statuses)
+
+
+def run_pipeline(count=1, setup=None, max_attempts=3):
+    payer = Keypair()
+    blockhashes = FakeBlockhashes()
+    client = FakeClient(blockhashes)
+    if setup:
+        setup(client, blockhashes)
+    settled = []
+
+    async def on_result(packed, signature, error):
+        settled.append((packed.recipient['address'], signature, error))
+
+    pipeline = TransactionPipeline(
+        client, payer, TransferPacker(payer.pubkey(), compute_unit_price=0, max_transfers=0), blockhashes,
+        on_result=on_result, max_in_flight=4, confirm_interval=0.001, max_attempts=max_attempts
+    )
+    transfers = [sol_transfer(payer.pubkey(), {'address': str(Keypair().pubkey())}, 1_000) for _ in range(count)]
+
+    async def run():
+        return await asyncio.wait_for(pipeline.run(transfers), timeout=5)
+
+    return asyncio.run(run()), client, settled
+
+
+def test_confirmed_transfers_are_sent_once():
+    results, client, settled = run_pipeline(count=3)
+
+    assert len(client.sent) == 1
+    assert set(results.values()) == {str(client.sent[0])}
+    assert len(settled) == 3
+
+
+def test_expired_transaction_is_resigned_and_resent():
+    def setup(client, blockhashes):
+        def on_send(signature, attempt):
+            if attempt == 1:
+                blockhashes.expire_everything()
+                return False
+            return True
+        client.on_send = on_send
+
+    results, client, _ = run_pipeline(setup=setup)
+
+    assert len(client.sent) == 2
+    assert client.sent[0] != client.sent[1]
+    assert list(results.values()) == [str(client.sent[1])]
+    # The first signature was looked up in the history before it was given up
+    assert client.sent[0] in client.history_lookups
+
+
+def test_height_moving_during_the_status_check_does_not_resend():
+    # The transaction lands in its last valid block, but the status check runs
+    # before the node reports it and the cached height moves past the block
+    # while that check is in flight
+    def setup(client, blockhashes):
+        checks = []
+
+        def before_statuses(signatures, history):
+            checks.append(signatures)
+            if len(checks) == 1:
+                blockhashes.expire_everything()
+                return set(signatures)
+        client.before_statuses = before_statuses
+
+    results, client, _ = run_pipeline(setup=setup)
+
+    assert len(client.sent) == 1
+    assert list(results.values()) == [str(client.sent[0])]
+
+
+def test_landed_transaction_found_in_history_is_not_resent():
+    def setup(client, blockhashes):
+        def on_send(signature, attempt):
+            client.lagging.add(signature)
+            blockhashes.expire_everything()
+            return True
+        client.on_send = on_send
+
+    results, client, _ = run_pipeline(setup=setup)
+
+    assert len(client.sent) == 1
+    assert client.history_lookups == [client.sent[0]]
+    assert list(results.values()) == [str(client.sent[0])]
+
+
+def test_gives_up_after_max_attempts():
+    def setup(client, blockhashes):
+        def on_send(signature, attempt):
+            blockhashes.expire_everything()
+            return False
+        client.on_send = on_send
+
+    results, client, settled = run_pipeline(setup=setup, max_attempts=3)
+
+    assert len(client.sent) == 3
+    assert list(results.values()) == ["FAILED"]
+    assert settled[0][1] is None and "3 attempts" in settled[0][2]
+
+
+def test_ambiguous_send_error_is_settled_by_signature():
+    def setup(client, blockhashes):
+        send = client.send_raw_transaction
+
+        async def send_then_time_out(raw, opts=None):
+            await send(raw, opts)
+            raise TimeoutError("response lost")
+        client.send_raw_transaction = send_then_time_out
+
+    results, client, _ = run_pipeline(setup=setup)
+
+    assert len(client.sent) == 1
+    assert list(results.values()) == [str(client.sent[0])]
+
+
+def test_preflight_rejection_splits_the_group():
+    def setup(client, blockhashes):
+        send = client.send_raw_transaction
+
+        async def reject_first(raw, opts=None):
+            if not client.sent:
+                client.sent.append(Transaction.from_bytes(raw).signatures[0])
+                raise RPCException("Transaction simulation failed")
+            return await send(raw, opts)
+        client.send_raw_transaction = reject_first
+
+    results, client, _ = run_pipeline(count=2, setup=setup)
+
+    assert len(client.sent) == 3
+    assert str(client.sent[0]) not in results.values()
+    assert sorted(results.values()) == sorted(str(signature) for signature in client.sent[1:])
+
+
+def test_failed_single_transfer_is_reported_not_resent():
+    def setup(client, blockhashes):
+        def on_send(signature, attempt):
+            client.landed[signature] = 'InsufficientFundsForRent'
+            return False
+        client.on_send = on_send
+
+    results, client, settled = run_pipeline(setup=setup)
+
+    assert len(client.sent) == 1
+    assert list(results.values()) == ["FAILED"]
+    assert "InsufficientFundsForRent" in settled[0][2]
@@ -0,0 +1,96 @@
+"""Tests for transfer_packing: every packed group must fit one transaction"""
+
+from solders.hash import Hash
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.transaction import Transaction
+
+from transfer_packing import (
+    COMPUTE_BUDGET_UNITS, CREATE_ATA_UNITS, MAX_COMPUTE_UNITS, PACKET_DATA_SIZE, TRANSFER_CHECKED_UNITS,
+    PackedTransfer, TransferPacker, ata_creation, sol_transfer, spl_transfer
+)
+
+PAYER = Keypair().pubkey()
+MINT = Keypair().pubkey()
+
+
+def recipients(count):
+    return [{'address': str(Keypair().pubkey())} for _ in range(count)]
+
+
+def serialized_size(packer, group):
+    return len(bytes(Transaction.new_unsigned(packer.build_message(group, Hash.default()))))
+
+
+def test_groups_fit_the_packet_limit_and_are_full():
+    packer = TransferPacker(PAYER, compute_unit_price=0, max_transfers=0)
+    transfers = [spl_transfer(PAYER, r, MINT, 1_000, 9, create_account=True) for r in recipients(40)]
+
+    groups = packer.pack(transfers)
+
+    assert len(groups) > 1
+    for index, group in enumerate(groups):
+        assert serialized_size(packer, group) <= PACKET_DATA_SIZE
+        if index < len(groups) - 1:
+            # The next transfer would not have fit, so no group is split early
+            assert not packer.fits(group + [groups[index + 1][0]])
+
+
+def test_pack_keeps_every_transfer_in_order():
+    packer = TransferPacker(PAYER, compute_unit_price=0, max_transfers=0)
+    transfers = [sol_transfer(PAYER, r, 5_000) for r in recipients(60)]
+
+    groups = packer.pack(transfers)
+
+    assert [packed for group in groups for packed in group] == transfers
+
+
+def test_max_transfers_caps_group_size():
+    packer = TransferPacker(PAYER, compute_unit_price=0, max_transfers=3)
+    transfers = [sol_transfer(PAYER, r, 5_000) for r in recipients(7)]
+
+    assert [len(group) for group in packer.pack(transfers)] == [3, 3, 1]
+
+
+def test_compute_limit_splits_groups():
+    packer = TransferPacker(PAYER, compute_unit_price=0, max_transfers=0)
+    heavy = [
+        PackedTransfer(r, [], MAX_COMPUTE_UNITS // 2, 0) for r in recipients(3)
+    ]
+
+    # Two halves plus the compute budget instruction exceed the limit
+    assert not packer.fits(heavy[:2])
+    assert [len(group) for group in packer.pack(heavy)] == [1, 1, 1]
+
+
+def test_oversized_single_transfer_still_gets_its_own_group():
+    packer = TransferPacker(PAYER, compute_unit_price=0, max_transfers=0)
+    transfers = [PackedTransfer(r, [], MAX_COMPUTE_UNITS, 0) for r in recipients(2)]
+
+    assert [len(group) for group in packer.pack(transfers)] == [1, 1]
+
+
+def test_compute_unit_limit_matches_the_transfers():
+    packer = TransferPacker(PAYER, compute_unit_price=5, max_transfers=0)
+    transfers = [
+        spl_transfer(PAYER, r, MINT, 1, 6, create_account=True) for r in recipients(2)
+    ] + [ata_creation(PAYER, r, MINT) for r in recipients(1)]
+
+    message = packer.build_message(transfers, Hash.default())
+
+    expected = 2 * (TRANSFER_CHECKED_UNITS + CREATE_ATA_UNITS) + CREATE_ATA_UNITS + 2 * COMPUTE_BUDGET_UNITS
+    limit_instruction = message.instructions[0]
+    assert int.from_bytes(bytes(limit_instruction.data)[1:5], 'little') == expected
+    # SetComputeUnitLimit, SetComputeUnitPrice, then 2 + 2 + 1 transfer instructions
+    assert len(message.instructions) == 7
+
+
+def test_create_account_adds_an_idempotent_create():
+    owner = Keypair().pubkey()
+    packed = spl_transfer(PAYER, {'address': str(owner)}, MINT, 1, 6, create_account=True)
+
+    create = packed.instructions[0]
+    assert bytes(create.data) == bytes([1])
+    assert create.accounts[2].pubkey == owner
+    assert packed.compute_units == TRANSFER_CHECKED_UNITS + CREATE_ATA_UNITS
+    assert isinstance(create.accounts[3].pubkey, Pubkey)
@@ -0,0 +1,267 @@
+"""
+Pipelined transaction submission for MochiDrop
+Keeps a bounded window of signed transactions in flight while earlier ones confirm
+"""
+
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from solders.keypair import Keypair
+from solders.signature import Signature
+from solders.transaction import Transaction
+from solders.transaction_status import TransactionConfirmationStatus
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Confirmed
+from solana.rpc.core import RPCException
+from solana.rpc.types import TxOpts
+
+from blockhash_cache import BlockhashCache
+from transfer_packing import PackedTransfer, TransferPacker
+
+logger = logging.getLogger(__name__)
+
+MAX_IN_FLIGHT = int(os.getenv('SOLANA_MAX_IN_FLIGHT', '8'))
+CONFIRM_INTERVAL = float(os.getenv('SOLANA_CONFIRM_INTERVAL', '0.5'))
+MAX_SEND_ATTEMPTS = int(os.getenv('SOLANA_MAX_SEND_ATTEMPTS', '3'))
+
+# getSignatureStatuses accepts at most this many signatures per call
+SIGNATURE_STATUS_BATCH = 256
+
+ResultCallback = Callable[[PackedTransfer, Optional[str], Optional[str]], Awaitable[None]]
+
+
+class PipelineJob:
+    """A packed group of transfers and the transaction currently carrying it"""
+
+    __slots__ = ('transfers', 'transaction', 'signature', 'last_valid_block_height', 'attempts')
+
+    def __init__(self, transfers: List[PackedTransfer], attempts: int = 0):
+        self.transfers = transfers
+        self.transaction: Optional[Transaction] = None
+        self.signature: Optional[Signature] = None
+        self.last_valid_block_height: Optional[int] = None
+        self.attempts = attempts
+
+
+class TransactionPipeline:
+    """Build, sign, submit and confirm packed transfers as overlapping stages.
+
+    Up to max_in_flight transactions are submitted but unconfirmed at any
+    time; submitters wait for a free slot, while one confirmer polls the
+    statuses of everything in flight in batched getSignatureStatuses calls.
+    Each recipient's result goes to on_result as soon as its transaction
+    settles, not when the whole run ends.
+
+    Failed transactions had no effect, so they are safe to redo: a group
+    rejected at preflight or failing on chain is split in half and requeued
+    (isolating bad recipients), and a transaction whose blockhash expired
+    unconfirmed is re-signed with a fresh blockhash, up to max_attempts.
+    Blockhashes, and the block height that tells when one has expired, come
+    from the shared BlockhashCache rather than an RPC call per transaction.
+    A non-zero min_interval spaces submissions at least that many seconds
+    apart, for background jobs that shouldn't compete with live sends.
+    """
+
+    def __init__(self, client: AsyncClient, payer: Keypair, packer: TransferPacker,
+                 blockhashes: BlockhashCache, on_result: Optional[ResultCallback] = None, max_in_flight: int = MAX_IN_FLIGHT,
+                 confirm_interval: float = CONFIRM_INTERVAL, max_attempts: int = MAX_SEND_ATTEMPTS,
+                 min_interval: float = 0.0):
+        self.client = client
+        self.payer = payer
+        self.packer = packer
+        self.blockhashes = blockhashes
+        self.on_result = on_result
+        self.max_in_flight = max_in_flight
+        self.confirm_interval = confirm_interval
+        self.max_attempts = max_attempts
+        self.min_interval = min_interval
+        self._pace_lock = asyncio.Lock()
+        self._next_submit = 0.0
+        self._queue: "asyncio.Queue[PipelineJob]" = asyncio.Queue()
+        self._window = asyncio.Semaphore(max_in_flight)
+        self._in_flight: Dict[Signature, PipelineJob] = {}
+        self._outstanding = 0
+        self._done = asyncio.Event()
+        self.results: Dict[str, str] = {}
+
+    async def run(self, transfers: List[PackedTransfer]) -> Dict[str, str]:
+        """Send every transfer; returns each recipient address mapped to its signature or "FAILED\""""
+        for group in self.packer.pack(transfers):
+            self._enqueue(PipelineJob(group))
+        if not self._outstanding:
+            return self.results
+
+        workers = [asyncio.create_task(self._submit_loop()) for _ in range(self.max_in_flight)]
+        workers.append(asyncio.create_task(self._confirm_loop()))
+        try:
+            await self._done.wait()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return self.results
+
+    def _enqueue(self, job: PipelineJob):
+        self._outstanding += 1
+        self._queue.put_nowait(job)
+
+    async def _finish(self, job: PipelineJob, signature: Optional[str], error: Optional[str] = None):
+        """Report every recipient in a settled job"""
+        for packed in job.transfers:
+            self.results[packed.recipient['address']] = signature or "FAILED"
+            if self.on_result:
+                try:
+                    await self.on_result(packed, signature, error)
+                except Exception as e:
+                    logger.error(f"Error recording transfer result for {packed.recipient['address']}: {e}")
+        self._settle()
+
+    def _settle(self):
+        self._outstanding -= 1
+        if self._outstanding == 0:
+            self._done.set()
+
+    def _retry(self, job: PipelineJob, reason: str) -> bool:
+        """Split a failed multi-transfer job in half and requeue both; False for a single transfer"""
+        if len(job.transfers) > 1:
+            middle = len(job.transfers) // 2
+            logger.warning(f"Packed transfer of {len(job.transfers)} failed, splitting: {reason}")
+            self._enqueue(PipelineJob(job.transfers[:middle], job.attempts))
+            self._enqueue(PipelineJob(job.transfers[middle:], job.attempts))
+            self._settle()
+            return True
+        return False
+
+    async def _pace(self):
+        """Wait for this submission's turn when submissions are rate limited"""
+        if not self.min_interval:
+            return
+        async with self._pace_lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_submit - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_submit = loop.time() + self.min_interval
+
+    # Stages
+    async def _sign(self, job: PipelineJob):
+        """Sign the job's transaction with a fresh blockhash"""
+        latest = await self.blockhashes.get()
+        message = self.packer.build_message(job.transfers, latest.blockhash)
+        transaction = Transaction.new_unsigned(message)
+        transaction.sign([self.payer], latest.blockhash)
+        job.transaction = transaction
+        job.signature = transaction.signatures[0]
+        job.last_valid_block_height = latest.last_valid_block_height
+        job.attempts += 1
+
+    async def _submit(self, job: PipelineJob):
+        """Send without waiting for confirmation; the confirmer takes it from here.
+
+        Only a preflight rejection takes the job back out of flight. After any
+        other error the transaction may still have been delivered, so it stays
+        in flight and the confirmer settles it by its signature: confirmed,
+        failed on chain, or expired with its blockhash.
+        """
+        self._in_flight[job.signature] = job
+        try:
+            await self.client.send_raw_transaction(
+                bytes(job.transaction),
+                opts=TxOpts(skip_confirmation=True, preflight_commitment=Confirmed)
+            )
+        except RPCException:
+            self._in_flight.pop(job.signature, None)
+            raise
+
+    async def _submit_loop(self):
+        while True:
+            job = await self._queue.get()
+            await self._window.acquire()
+            await self._pace()
+            try:
+                await self._sign(job)
+            except Exception as e:
+                self._window.release()
+                logger.error(f"Error signing packed transfer: {e}")
+                await self._finish(job, None, str(e))
+                continue
+            try:
+                await self._submit(job)
+            except RPCException as e:
+                # Rejected at preflight: nothing was sent
+                self._window.release()
+                if not self._retry(job, str(e)):
+                    await self._finish(job, None, str(e))
+            except Exception as e:
+                # The transaction may or may not have reached the cluster; leave it
+                # in flight (holding its window slot) for the confirmer to settle
+                logger.warning(f"Error submitting packed transfer {job.signature}, awaiting its status: {e}")
+
+    async def _confirm_loop(self):
+        while True:
+            await asyncio.sleep(self.confirm_interval)
+            if not self._in_flight:
+                continue
+            try:
+                await self._check_in_flight()
+            except Exception as e:
+                logger.warning(f"Error checking transaction statuses: {e}")
+
+    async def _check_in_flight(self):
+        signatures = list(self._in_flight)
+        for start in range(0, len(signatures), SIGNATURE_STATUS_BATCH):
+            batch = signatures[start:start + SIGNATURE_STATUS_BATCH]
+            # Height before the statuses: a None status then means the
+            # transaction hadn't landed by this height, not by a later one
+            block_height = self.blockhashes.block_height
+            statuses = (await self.client.get_signature_statuses(batch)).value
+            expired = []
+            for signature, status in zip(batch, statuses):
+                job = self._in_flight.get(signature)
+                if job is None:
+                    continue
+                if status is None:
+                    if self.blockhashes.is_expired(job.last_valid_block_height, block_height):
+                        expired.append(signature)
+                    continue
+                await self._settle_status(job, status)
+
+            if expired:
+                # Last look before resending: the full history, in case the
+                # node that answered above had not caught up with the chain
+                statuses = (await self.client.get_signature_statuses(
+                    expired, search_transaction_history=True
+                )).value
+                for signature, status in zip(expired, statuses):
+                    job = self._in_flight.get(signature)
+                    if job is None:
+                        continue
+                    if status is None:
+                        await self._expired(job)
+                    else:
+                        await self._settle_status(job, status)
+
+    async def _settle_status(self, job: PipelineJob, status):
+        """Settle a job whose transaction has landed, once its status is confirmed"""
+        if status.confirmation_status not in (TransactionConfirmationStatus.Confirmed,
+                                              TransactionConfirmationStatus.Finalized):
+            return
+        del self._in_flight[job.signature]
+        self._window.release()
+        if status.err is None:
+            await self._finish(job, str(job.signature))
+        elif not self._retry(job, str(status.err)):
+            await self._finish(job, None, f"Transaction failed: {status.err}")
+
+    async def _expired(self, job: PipelineJob):
+        """The blockhash expired before the transaction landed, so it never will: re-sign and resend"""
+        del self._in_flight[job.signature]
+        self._window.release()
+        if job.attempts >= self.max_attempts:
+            await self._finish(job, None, f"Not confirmed after {job.attempts} attempts")
+            return
+        logger.warning(f"Transaction {job.signature} expired unconfirmed, re-signing")
+        self._outstanding -= 1
+        self._enqueue(job)
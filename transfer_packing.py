@@ -0,0 +1,152 @@
+"""
+Transfer packing for MochiDrop
+Packs many recipients' transfer instructions into as few transactions as fit
+"""
+
+import os
+import logging
+from typing import Any, Dict, List, Sequence
+
+from solders.compute_budget import set_compute_unit_limit, set_compute_unit_price
+from solders.hash import Hash
+from solders.instruction import AccountMeta, Instruction
+from solders.message import Message
+from solders.pubkey import Pubkey
+from solders.system_program import ID as SYSTEM_PROGRAM_ID, TransferParams, transfer
+from solders.transaction import Transaction
+from spl.token.constants import ASSOCIATED_TOKEN_PROGRAM_ID, TOKEN_PROGRAM_ID
+from spl.token.instructions import TransferCheckedParams, get_associated_token_address, transfer_checked
+
+logger = logging.getLogger(__name__)
+
+# Largest serialized transaction the network accepts (IPv6 MTU minus headers)
+PACKET_DATA_SIZE = 1232
+# Per-transaction compute ceiling and account lock limit
+MAX_COMPUTE_UNITS = 1_400_000
+MAX_ACCOUNT_LOCKS = 64
+
+# Compute units budgeted per instruction (measured cost plus headroom)
+SYSTEM_TRANSFER_UNITS = 300
+TRANSFER_CHECKED_UNITS = 6_500
+CREATE_ATA_UNITS = 32_000
+COMPUTE_BUDGET_UNITS = 150
+
+PRIORITY_FEE_MICROLAMPORTS = int(os.getenv('SOLANA_PRIORITY_FEE_MICROLAMPORTS', '0'))
+MAX_TRANSFERS_PER_TRANSACTION = int(os.getenv('SOLANA_MAX_TRANSFERS_PER_TX', '0'))  # 0 = as many as fit
+
+
+class PackedTransfer:
+    """One recipient's instructions, with the compute units they need"""
+
+    __slots__ = ('recipient', 'instructions', 'compute_units', 'amount')
+
+    def __init__(self, recipient: Dict[str, Any], instructions: List[Instruction], compute_units: int, amount: int):
+        self.recipient = recipient
+        self.instructions = instructions
+        self.compute_units = compute_units
+        self.amount = amount
+
+
+def sol_transfer(payer: Pubkey, recipient: Dict[str, Any], lamports: int) -> PackedTransfer:
+    """System transfer of lamports to recipient['address']"""
+    instruction = transfer(TransferParams(
+        from_pubkey=payer, to_pubkey=Pubkey.from_string(recipient['address']), lamports=lamports
+    ))
+    return PackedTransfer(recipient, [instruction], SYSTEM_TRANSFER_UNITS, lamports)
+
+
+def create_ata_idempotent(payer: Pubkey, owner: Pubkey, mint: Pubkey) -> Instruction:
+    """Associated token program CreateIdempotent: creates owner's ATA for mint, or does nothing if it exists"""
+    return Instruction(
+        ASSOCIATED_TOKEN_PROGRAM_ID,
+        bytes([1]),
+        [
+            AccountMeta(payer, is_signer=True, is_writable=True),
+            AccountMeta(get_associated_token_address(owner, mint), is_signer=False, is_writable=True),
+            AccountMeta(owner, is_signer=False, is_writable=False),
+            AccountMeta(mint, is_signer=False, is_writable=False),
+            AccountMeta(SYSTEM_PROGRAM_ID, is_signer=False, is_writable=False),
+            AccountMeta(TOKEN_PROGRAM_ID, is_signer=False, is_writable=False),
+        ]
+    )
+
+
+def ata_creation(payer: Pubkey, recipient: Dict[str, Any], mint: Pubkey) -> PackedTransfer:
+    """Create recipient['address']'s token account for mint on its own, with no transfer"""
+    instruction = create_ata_idempotent(payer, Pubkey.from_string(recipient['address']), mint)
+    return PackedTransfer(recipient, [instruction], CREATE_ATA_UNITS, 0)
+
+
+def spl_transfer(payer: Pubkey, recipient: Dict[str, Any], mint: Pubkey, amount: int, decimals: int,
+                 create_account: bool = False) -> PackedTransfer:
+    """transfer_checked from the payer's associated token account to the recipient's,
+    creating the recipient's account first in the same transaction if create_account is set"""
+    owner = Pubkey.from_string(recipient['address'])
+    instructions = [create_ata_idempotent(payer, owner, mint)] if create_account else []
+    instructions.append(transfer_checked(TransferCheckedParams(
+        program_id=TOKEN_PROGRAM_ID,
+        source=get_associated_token_address(payer, mint),
+        mint=mint,
+        dest=get_associated_token_address(owner, mint),
+        owner=payer,
+        amount=amount,
+        decimals=decimals
+    )))
+    compute_units = TRANSFER_CHECKED_UNITS + (CREATE_ATA_UNITS if create_account else 0)
+    return PackedTransfer(recipient, instructions, compute_units, amount)
+
+
+class TransferPacker:
+    """Groups transfers into transactions under the size, compute and account limits.
+
+    Each transaction starts with a SetComputeUnitLimit sized to its transfers
+    (and a SetComputeUnitPrice when a priority fee is configured), so packed
+    transactions don't reserve the default 200k units per instruction. Size is
+    measured on the real serialized transaction with a placeholder blockhash
+    and signature, which have the same length as the real ones.
+    """
+
+    def __init__(self, payer: Pubkey, compute_unit_price: int = PRIORITY_FEE_MICROLAMPORTS,
+                 max_transfers: int = MAX_TRANSFERS_PER_TRANSACTION):
+        self.payer = payer
+        self.compute_unit_price = compute_unit_price
+        self.max_transfers = max_transfers
+
+    def _compute_units(self, transfers: Sequence[PackedTransfer]) -> int:
+        budget_instructions = 2 if self.compute_unit_price else 1
+        return sum(t.compute_units for t in transfers) + budget_instructions * COMPUTE_BUDGET_UNITS
+
+    def build_message(self, transfers: Sequence[PackedTransfer], blockhash: Hash) -> Message:
+        """Message paying from payer with a compute budget sized to the transfers"""
+        instructions = [set_compute_unit_limit(min(self._compute_units(transfers), MAX_COMPUTE_UNITS))]
+        if self.compute_unit_price:
+            instructions.append(set_compute_unit_price(self.compute_unit_price))
+        for packed in transfers:
+            instructions.extend(packed.instructions)
+        return Message.new_with_blockhash(instructions, self.payer, blockhash)
+
+    def fits(self, transfers: Sequence[PackedTransfer]) -> bool:
+        """True if the transfers fit in one transaction"""
+        if self.max_transfers and len(transfers) > self.max_transfers:
+            return False
+        if self._compute_units(transfers) > MAX_COMPUTE_UNITS:
+            return False
+        message = self.build_message(transfers, Hash.default())
+        if len(message.account_keys) > MAX_ACCOUNT_LOCKS:
+            return False
+        return len(bytes(Transaction.new_unsigned(message))) <= PACKET_DATA_SIZE
+
+    def pack(self, transfers: Sequence[PackedTransfer]) -> List[List[PackedTransfer]]:
+        """Split transfers, in order, into groups that each fit one transaction"""
+        groups: List[List[PackedTransfer]] = []
+        current: List[PackedTransfer] = []
+        for packed in transfers:
+            if current and not self.fits(current + [packed]):
+                groups.append(current)
+                current = []
+            current.append(packed)
+        if current:
+            groups.append(current)
+        if groups:
+            logger.info(f"Packed {len(transfers)} transfers into {len(groups)} transactions")
+        return groups
@@ -1,16 +1,102 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
-from auth_middleware import require_role
-from database_new import db
+from auth_middleware import require_receiver
+from database_new import (
+    db, DatabaseBusyError, WalletTakenError, CLAIM_NOT_FOUND, CLAIM_ALREADY_CLAIMED, CLAIM_INACTIVE,
+    CLAIM_NOT_STARTED, CLAIM_ENDED, CLAIM_FULL, CLAIM_NOT_ALLOWLISTED, CLAIM_ERROR
+)
 from solana_handler_simple import SolanaHandler
+from idempotency import claim_requests
 import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Tuple
 
 logger = logging.getLogger(__name__)
 
+CLAIMS_PAGE_SIZE = 10
+
+# /myclaims page buttons carry a (claimed_at, id) cursor in their callback data:
+# "myclaims:<n|p>:<microseconds since epoch>:<claim id>" (well under Telegram's 64 bytes)
+_EPOCH = datetime(1970, 1, 1)
+
+def _encode_claims_cursor(direction: str, cursor) -> str:
+    claimed_at, claim_id = cursor
+    return f"myclaims:{direction}:{(claimed_at - _EPOCH) // timedelta(microseconds=1)}:{claim_id}"
+
+def _decode_claims_cursor(data: str):
+    _, direction, micros, claim_id = data.split(':')
+    return direction, (_EPOCH + timedelta(microseconds=int(micros)), int(claim_id))
+
+async def submit_claim(telegram_id: int, airdrop_id: int) -> Tuple[Dict[str, Any], bool]:
+    """Claim an airdrop once per (user, airdrop), however often it is submitted.
+
+    Returns (outcome, duplicate). Concurrent duplicates (double taps, /claim
+    while a button claim is running) wait for the first submission instead of
+    doing their own database work. Stable outcomes (a claim was made, or the
+    user had already claimed) are replayed from memory for the idempotency
+    window; rejections that depend on time or state (not started, full,
+    inactive...) are not, so a retry re-checks. The outcome holds claim_id, reason,
+    and on success the airdrop and the amount recorded (the wallet's allowlist
+    amount if it has one), or the existing claim if already claimed.
+    """
+    async def claim() -> Dict[str, Any]:
+        # Take a slot and create the claim in one atomic statement; status,
+        # date window, max_claims and duplicate checks all happen there
+        claim_id, reason, amount = await db.create_claim(airdrop_id, telegram_id)
+        outcome = {'claim_id': claim_id, 'reason': reason, 'amount': amount, 'airdrop': None, 'existing_claim': None}
+        if claim_id:
+            outcome['airdrop'] = await db.get_airdrop(airdrop_id)
+        elif reason == CLAIM_ALREADY_CLAIMED:
+            outcome['existing_claim'] = await db.get_user_claim(telegram_id, airdrop_id)
+        return outcome
+    
+    return await claim_requests.run(
+        ('claim', telegram_id, airdrop_id), claim,
+        cache=lambda outcome: bool(outcome['claim_id']) or outcome['reason'] == CLAIM_ALREADY_CLAIMED
+    )
+
 # Conversation states
 WAITING_FOR_WALLET_ADDRESS = 1
 WAITING_FOR_NEW_WALLET_ADDRESS = 2
 
+# User-facing replies for rejected claims, keyed by create_claim reason
+CLAIM_REJECTION_MESSAGES = {
+    CLAIM_NOT_FOUND: "❌ **Airdrop Not Found**\n\nThis airdrop doesn't exist.",
+    CLAIM_ALREADY_CLAIMED: (
+        "ℹ️ **Already Claimed**\n\n"
+        "You have already claimed this airdrop.\n"
+        "Each user can only claim once per airdrop.\n\n"
+        "Use `/myclaims` to view all your claims."
+    ),
+    CLAIM_INACTIVE: (
+        "⏸️ **Airdrop Not Available**\n\n"
+        "This airdrop is not currently accepting claims."
+    ),
+    CLAIM_NOT_STARTED: (
+        "⏳ **Airdrop Not Started**\n\n"
+        "This airdrop hasn't opened yet. Check back soon!"
+    ),
+    CLAIM_ENDED: (
+        "⌛ **Airdrop Ended**\n\n"
+        "This airdrop's claim window has closed.\n\n"
+        "Check `/airdrops` for other available airdrops."
+    ),
+    CLAIM_NOT_ALLOWLISTED: (
+        "📋 **Not on the Allowlist**\n\n"
+        "This airdrop is limited to an allowlist and your registered wallet isn't on it.\n\n"
+        "Check `/mywallet` to make sure you registered the right wallet."
+    ),
+    CLAIM_FULL: (
+        "🔒 **Airdrop Full**\n\n"
+        "This airdrop has reached its maximum number of claims.\n"
+        "Better luck next time! 🍀"
+    ),
+    CLAIM_ERROR: (
+        "❌ **Claim Failed**\n\n"
+        "There was an error processing your claim. Please try again later."
+    ),
+}
+
 class UserHandlers:
     """Handlers for user (receiver) commands"""
     
@@ -101,12 +187,33 @@ class UserHandlers:
                         "There was an error creating your account. Please try again."
                     )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in start command: {e}")
             await update.message.reply_text("❌ An error occurred. Please try again.")
     
 
     
+    async def _wallet_taken(self, update: Update, wallet_address: str, telegram_id: int) -> bool:
+        """Reply and return True if another user already registered this wallet"""
+        # Fast path for new wallets; update_user_wallet still raises
+        # WalletTakenError for any owner the filter hasn't seen yet
+        if not db.wallet_might_be_registered(wallet_address):
+            return False
+        owner = await db.get_wallet_owner(wallet_address)
+        if owner is None or owner == telegram_id:
+            return False
+        await self._reply_wallet_taken(update)
+        return True
+    
+    async def _reply_wallet_taken(self, update: Update):
+        await update.message.reply_text(
+            "⚠️ **Wallet Already Registered**\n\n"
+            "This wallet address is already linked to another account.\n"
+            "Please send a different Solana wallet address."
+        )
+    
     async def receive_wallet_address(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Receive and validate wallet address"""
         try:
@@ -115,7 +222,7 @@ class UserHandlers:
             first_name = update.effective_user.first_name or "User"
             
             # Validate wallet address
-            if not self.solana_handler.validate_wallet_address(wallet_address):
+            if not await self.solana_handler.validate_wallet_address(wallet_address):
                 await update.message.reply_text(
                     "❌ **Invalid Wallet Address**\n\n"
                     "Please provide a valid Solana wallet address.\n"
@@ -128,8 +235,15 @@ class UserHandlers:
                 )
                 return WAITING_FOR_WALLET_ADDRESS
             
+            if await self._wallet_taken(update, wallet_address, telegram_id):
+                return WAITING_FOR_WALLET_ADDRESS
+            
             # Update user with wallet address
-            success = await db.update_user_wallet(telegram_id, wallet_address)
+            try:
+                success = await db.update_user_wallet(telegram_id, wallet_address)
+            except WalletTakenError:
+                await self._reply_wallet_taken(update)
+                return WAITING_FOR_WALLET_ADDRESS
             
             if success:
                 keyboard = [
@@ -164,12 +278,14 @@ class UserHandlers:
                 )
                 return WAITING_FOR_WALLET_ADDRESS
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving wallet address: {e}")
             await update.message.reply_text("❌ An error occurred. Please try again.")
             return WAITING_FOR_WALLET_ADDRESS
     
-    @require_role('receiver')
+    @require_receiver
     async def airdrops_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /airdrops command - browse available airdrops"""
         try:
@@ -210,11 +326,14 @@ class UserHandlers:
             
             await update.message.reply_text(message, parse_mode='Markdown')
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in airdrops command: {e}")
             await update.message.reply_text("❌ An error occurred while fetching airdrops.")
     
-
+    @require_receiver
+    async def claim_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /claim command - claim airdrop tokens"""
         try:
             # Check if airdrop ID provided
@@ -236,7 +355,8 @@ class UserHandlers:
                 return
             
             telegram_id = update.effective_user.id
-            user = await db.get_user(telegram_id)
+            # Set by require_role; falls back to the (cached) lookup
+            user = context.user_data.get('user_info') or await db.get_user(telegram_id)
             
             # Check if user has wallet connected
             if not user or not user['wallet_address']:
@@ -247,35 +367,14 @@ class UserHandlers:
                 )
                 return
             
-            # Get airdrop details
-            airdrop = await db.get_airdrop(airdrop_id)
-            if not airdrop:
-                await update.message.reply_text("❌ Airdrop not found.")
-                return
-            
-            # Check airdrop status
-            if airdrop['status'] != 'active':
-                await update.message.reply_text(
-                    f"⏸️ **Airdrop Not Available**\n\n"
-                    f"This airdrop is currently **{airdrop['status']}** and not accepting claims."
-                )
-                return
-            
-            # Check if max claims reached
-            if airdrop['max_claims'] and airdrop['current_claims'] >= airdrop['max_claims']:
-                await update.message.reply_text(
-                    "🔒 **Airdrop Full**\n\n"
-                    "This airdrop has reached its maximum number of claims.\n"
-                    "Better luck next time! 🍀"
-                )
-                return
-            
-            # Create claim
-            claim_id = await db.create_claim(airdrop_id, telegram_id, airdrop['amount_per_claim'])
+            outcome, duplicate = await submit_claim(telegram_id, airdrop_id)
+            claim_id, reason = outcome['claim_id'], outcome['reason']
             
             if claim_id:
-                # Format amount display
-                amount_display = f"{airdrop['amount_per_claim'] / (10 ** airdrop['token_decimals']):.2f}"
+                airdrop = outcome['airdrop']
+                
+                # Format amount display (the claim's amount: allowlists set it per wallet)
+                amount_display = f"{outcome['amount'] / (10 ** airdrop['token_decimals']):.2f}"
                 
                 await update.message.reply_text(
                     f"🎉 **Claim Submitted Successfully!**\n\n"
@@ -290,26 +389,29 @@ class UserHandlers:
                 )
                 
                 # TODO: Trigger actual token transfer in background
-                # For now, we'll mark it as completed immediately (simulation)
-                await db.update_claim_status(claim_id, 'completed', 'simulated_tx_signature_' + str(claim_id))
+                # For now, we'll mark it as completed immediately (simulation, no signature)
+                if not duplicate:
+                    await db.update_claim_status(claim_id, airdrop_id, 'completed')
                 
             else:
                 await update.message.reply_text(
-                    "❌ **Claim Failed**\n\n"
-                    "You may have already claimed this airdrop, or there was an error.\n"
-                    "Each user can only claim once per airdrop."
+                    CLAIM_REJECTION_MESSAGES.get(reason, CLAIM_REJECTION_MESSAGES[CLAIM_ERROR]),
+                    parse_mode='Markdown'
                 )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in claim command: {e}")
             await update.message.reply_text("❌ An error occurred while processing your claim.")
     
-    @require_role('receiver')
+    @require_receiver
     async def mywallet_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /mywallet command - view/update wallet"""
         try:
             telegram_id = update.effective_user.id
-            user = await db.get_user(telegram_id)
+            # Set by require_role; falls back to the (cached) lookup
+            user = context.user_data.get('user_info') or await db.get_user(telegram_id)
             
             if not user or not user['wallet_address']:
                 keyboard = [
@@ -345,18 +447,21 @@ class UserHandlers:
                 parse_mode='Markdown'
             )
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in mywallet command: {e}")
             await update.message.reply_text("❌ An error occurred while fetching wallet info.")
     
-    @require_role('receiver')
+    @require_receiver
     async def myclaims_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /myclaims command - view claim history"""
         try:
             telegram_id = update.effective_user.id
-            claims = await db.get_user_claims(telegram_id)
+            summary = await db.get_user_claim_summary(telegram_id)
+            page = await db.get_user_claims_page(telegram_id, limit=CLAIMS_PAGE_SIZE)
             
-            if not claims:
+            if not page['claims']:
                 await update.message.reply_text(
                     "📋 **No Claims Yet**\n\n"
                     "You haven't made any airdrop claims yet.\n\n"
@@ -364,40 +469,84 @@ class UserHandlers:
                 )
                 return
             
-            message = "📋 **Your Claim History**\n\n"
+            message, reply_markup = self._format_claims_page(summary, page)
+            await update.message.reply_text(message, reply_markup=reply_markup, parse_mode='Markdown')
+        
+        except DatabaseBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in myclaims command: {e}")
+            await update.message.reply_text("❌ An error occurred while fetching your claims.")
+    
+    @require_receiver
+    async def myclaims_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle next/prev buttons on the /myclaims history"""
+        try:
+            query = update.callback_query
+            await query.answer()
             
-            for claim in claims[:10]:  # Show last 10 claims
-                # Format amount
-                amount_display = f"{claim['amount'] / (10 ** 9):.2f}"  # Assuming 9 decimals
-                
-                # Status emoji
-                status_emoji = {
-                    'pending': '⏳',
-                    'processing': '🔄',
-                    'completed': '✅',
-                    'failed': '❌'
-                }.get(claim['status'], '❓')
-                
-                message += (
-                    f"{status_emoji} **{claim['airdrop_name']}**\n"
-                    f"💰 {amount_display} {claim['token_symbol']}\n"
-                    f"📅 {claim['claimed_at'].strftime('%Y-%m-%d %H:%M')}\n"
-                    f"🆔 Claim ID: `{claim['id']}`\n"
-                )
-                
-                if claim['transaction_signature'] and claim['status'] == 'completed':
-                    message += f"🔗 TX: `{claim['transaction_signature'][:20]}...`\n"
-                
-                message += "\n"
+            telegram_id = update.effective_user.id
+            direction, cursor = _decode_claims_cursor(query.data)
+            if direction == 'n':
+                page = await db.get_user_claims_page(telegram_id, limit=CLAIMS_PAGE_SIZE, after=cursor)
+            else:
+                page = await db.get_user_claims_page(telegram_id, limit=CLAIMS_PAGE_SIZE, before=cursor)
             
-            if len(claims) > 10:
-                message += f"... and {len(claims) - 10} more claims"
+            if not page['claims']:
+                await query.answer("No more claims.", show_alert=True)
+                return
             
-            await update.message.reply_text(message, parse_mode='Markdown')
+            summary = await db.get_user_claim_summary(telegram_id)
+            message, reply_markup = self._format_claims_page(summary, page)
+            await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='Markdown')
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
-            logger.error(f"Error in myclaims command: {e}")
-            await update.message.reply_text("❌ An error occurred while fetching your claims.")
+            logger.error(f"Error in myclaims page callback: {e}")
+            await update.callback_query.answer("❌ Error loading claims.", show_alert=True)
+    
+    def _format_claims_page(self, summary: dict, page: dict):
+        """Render a claims page with the per-token summary and next/prev buttons"""
+        message = f"📋 **Your Claim History** ({summary['total_claims']} claims)\n\n"
+        
+        for token in summary['tokens']:
+            message += f"💰 {token['amount'] / (10 ** 9):.2f} {token['token_symbol']} from {token['claims']} claims\n"
+        if summary['tokens']:
+            message += "\n"
+        
+        for claim in page['claims']:
+            # Format amount
+            amount_display = f"{claim['amount'] / (10 ** 9):.2f}"  # Assuming 9 decimals
+            
+            # Status emoji
+            status_emoji = {
+                'pending': '⏳',
+                'processing': '🔄',
+                'completed': '✅',
+                'failed': '❌'
+            }.get(claim['status'], '❓')
+            
+            message += (
+                f"{status_emoji} **{claim['airdrop_name']}**\n"
+                f"💰 {amount_display} {claim['token_symbol']}\n"
+                f"📅 {claim['claimed_at'].strftime('%Y-%m-%d %H:%M')}\n"
+                f"🆔 Claim ID: `{claim['id']}`\n"
+            )
+            
+            if claim['transaction_signature'] and claim['status'] == 'completed':
+                message += f"🔗 TX: `{claim['transaction_signature'][:20]}...`\n"
+            
+            message += "\n"
+        
+        buttons = []
+        if page['prev']:
+            buttons.append(InlineKeyboardButton("⬅️ Newer", callback_data=_encode_claims_cursor('p', page['prev'])))
+        if page['next']:
+            buttons.append(InlineKeyboardButton("Older ➡️", callback_data=_encode_claims_cursor('n', page['next'])))
+        
+        reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+        return message, reply_markup
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command - show help information"""
@@ -423,7 +572,8 @@ class UserHandlers:
                     "• `/admin login <password>` - Admin authentication\n"
                     "• `/admin dashboard` - Admin control panel\n"
                     "• `/admin create_airdrop` - Create new airdrop\n"
-                    "• `/admin stats` - View statistics\n\n"
+                    "• `/admin stats` - View statistics\n"
+                    "• `/slowqueries [n]` - Query latency and slow query plans\n\n"
                 )
             
             message += (
@@ -441,6 +591,8 @@ class UserHandlers:
             
             await update.message.reply_text(message, parse_mode='Markdown')
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in help command: {e}")
             await update.message.reply_text("❌ An error occurred while loading help.")
@@ -461,6 +613,8 @@ class UserHandlers:
             )
             return WAITING_FOR_NEW_WALLET_ADDRESS
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error in update wallet: {e}")
             await update.message.reply_text("❌ Error starting wallet update.")
@@ -472,7 +626,7 @@ class UserHandlers:
             telegram_id = update.effective_user.id
             
             # Validate wallet address
-            if not self.solana_handler.validate_wallet_address(new_wallet_address):
+            if not await self.solana_handler.validate_wallet_address(new_wallet_address):
                 await update.message.reply_text(
                     "❌ **Invalid Wallet Address**\n\n"
                     "Please provide a valid Solana wallet address.\n"
@@ -491,8 +645,15 @@ class UserHandlers:
                 )
                 return ConversationHandler.END
             
+            if await self._wallet_taken(update, new_wallet_address, telegram_id):
+                return WAITING_FOR_NEW_WALLET_ADDRESS
+            
             # Update wallet address
-            success = await db.update_user_wallet(telegram_id, new_wallet_address)
+            try:
+                success = await db.update_user_wallet(telegram_id, new_wallet_address)
+            except WalletTakenError:
+                await self._reply_wallet_taken(update)
+                return WAITING_FOR_NEW_WALLET_ADDRESS
             
             if success:
                 await update.message.reply_text(
@@ -514,6 +675,8 @@ class UserHandlers:
                 )
                 return WAITING_FOR_NEW_WALLET_ADDRESS
         
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error receiving new wallet address: {e}")
             await update.message.reply_text("❌ An error occurred. Please try again.")